@@ -10,7 +10,7 @@ import shutil
 import doctest
 import numpy as np
 import cocoex as ex
-from cocoex import Suite
+from cocoex import Suite, runner
 from cocoex.utilities import about_equal
 import example_experiment
 
@@ -91,6 +91,7 @@ def run_doctests():
         print("  CAVEAT: doctest OF cocoex.interface IS, FOR SOME REASON, " +
               "INEFFECTIVE IN PYTHON 2 ")
     testmod(interface)
+    testmod(runner)
     testmod(example_experiment)
 
 
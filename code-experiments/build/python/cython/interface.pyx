@@ -1,7 +1,10 @@
 # -*- mode: cython -*-
 #cython: c_string_type=str, c_string_encoding=ascii
 from __future__ import absolute_import, division, print_function, unicode_literals
+import os
 import sys
+import json
+import hashlib
 import numpy as np
 cimport numpy as np
 
@@ -39,9 +42,9 @@ cdef extern from "coco.h":
     void coco_problem_free(coco_problem_t *problem)
 
     void coco_problem_get_initial_solution(coco_problem_t *problem, double *x)
-    void coco_evaluate_function(coco_problem_t *problem, const double *x, double *y)
-    void coco_evaluate_constraint(coco_problem_t *problem, const double *x, double *y)
-    void coco_recommend_solution(coco_problem_t *problem, const double *x)
+    void coco_evaluate_function(coco_problem_t *problem, const double *x, double *y) nogil
+    void coco_evaluate_constraint(coco_problem_t *problem, const double *x, double *y) nogil
+    void coco_recommend_solution(coco_problem_t *problem, const double *x) nogil
 
     int coco_logger_biobj_feed_solution(coco_problem_t *problem, const size_t evaluation, const double *y)
     coco_problem_t *coco_suite_get_problem_by_function_dimension_instance(coco_suite_t *suite, const size_t function,
@@ -66,6 +69,8 @@ cdef extern from "coco.h":
     int coco_problem_final_target_hit(const coco_problem_t *problem)
     void bbob_problem_best_parameter_print(const coco_problem_t *problem)
 
+    const char coco_version[]
+
 cdef bytes _bstring(s):
     if type(s) is bytes:
         return <bytes>s
@@ -76,6 +81,90 @@ cdef bytes _bstring(s):
 
 cdef coco_observer_t* _current_observer
 
+cdef void _evaluate_rows(coco_problem_t *problem, const double *x, double *y,
+                         double *c, size_t n, size_t dimension,
+                         size_t number_of_objectives, size_t number_of_constraints,
+                         bint feasible_only) nogil:
+    """evaluate the `n` rows of `x`, first the constraints into the rows
+    of `c` unless `c` is NULL, then the objectives into the rows of `y`
+    unless `y` is NULL or, with `feasible_only`, a constraint value is > 0"""
+    cdef size_t i, j
+    cdef bint feasible
+    for i in range(n):
+        feasible = True
+        if c != NULL and number_of_constraints > 0:
+            coco_evaluate_constraint(problem, x + i * dimension,
+                                     c + i * number_of_constraints)
+            if feasible_only:
+                for j in range(number_of_constraints):
+                    if not c[i * number_of_constraints + j] <= 0:
+                        feasible = False
+                        break
+        if y != NULL and feasible:
+            coco_evaluate_function(problem, x + i * dimension,
+                                   y + i * number_of_objectives)
+
+def _extension_stamp():
+    """return path, size and modification time of this compiled module,
+    which change when the suite definitions are rebuilt"""
+    try:
+        stat = os.stat(__file__)
+    except (NameError, OSError):
+        return b''
+    return ('%s %d %d' % (os.path.abspath(__file__), stat.st_size,
+                          int(stat.st_mtime))).encode('utf-8')
+
+def _suite_index_filename(folder, name, instance, options):
+    """return the file in `folder` caching the index of the suite"""
+    cdef bytes version = <const char *>coco_version
+    key = b'\n'.join((_bstring(name), _bstring(instance), _bstring(options), version,
+                      _extension_stamp()))
+    return os.path.join(folder, '%s-%s.json' % (
+        _bstring(name).decode('ascii'), hashlib.sha1(key).hexdigest()[:16]))
+
+def _load_suite_index(folder, name, instance, options):
+    """return the cached ``(indices, ids, names, dimensions,
+    number_of_objectives)`` lists of the suite or `None`"""
+    if not folder:
+        return None
+    try:
+        with open(_suite_index_filename(folder, name, instance, options)) as f:
+            index = json.load(f)
+        return ([int(i) for i in index['indices']],
+                [str(i) for i in index['ids']],
+                [str(n) for n in index['names']],
+                [int(d) for d in index['dimensions']],
+                [int(n) for n in index['number_of_objectives']])
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _save_suite_index(folder, name, instance, options, indices, ids, names,
+                      dimensions, number_of_objectives):
+    """write the index of the suite to `folder`, silently give up if this
+    is not possible"""
+    if not folder:
+        return
+    filename = _suite_index_filename(folder, name, instance, options)
+    tmp_filename = filename + '.%d' % os.getpid()
+    try:
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(tmp_filename, 'w') as f:
+            json.dump({'indices': list(indices), 'ids': list(ids),
+                       'names': list(names), 'dimensions': list(dimensions),
+                       'number_of_objectives': list(number_of_objectives)}, f)
+        if hasattr(os, 'replace'):  # atomic, also on Windows
+            os.replace(tmp_filename, filename)
+        else:  # Python 2
+            if os.path.exists(filename) and sys.platform.startswith('win'):
+                os.remove(filename)
+            os.rename(tmp_filename, filename)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
+
 cdef class Suite:
     """Suite of benchmark problems.
 
@@ -201,7 +290,12 @@ cdef class Suite:
         assert self.initialized
     cdef _initialize(self):
         """sweeps through `suite` to collect indices and id's to operate by
-        direct access in the remainder"""
+        direct access in the remainder.
+
+        The collected lists are cached in the folder given by the
+        attribute `index_cache_folder`, if any, such that the same suite
+        can be created again without constructing all problems.
+        """
         cdef np.npy_intp shape[1]  # probably completely useless
         cdef coco_suite_t* suite
         cdef coco_problem_t* p
@@ -228,6 +322,16 @@ If %s was not a typo, you can add the desired name to `known_suite_names`::
 This will crash Python, if the suite "my_name" does in fact not exist. You might
 also report back a missing name to https://github.com/numbbo/coco/issues
 """ % (self._name, str(known_suite_names), self._name))
+        cache_folder = getattr(self, 'index_cache_folder', None)
+        index = _load_suite_index(cache_folder, self._name, self._instance, self._options)
+        if index is not None:
+            self.suite = coco_suite(self._name, self._instance, self._options)
+            if self.suite == NULL:
+                raise NoSuchSuiteException("No suite with name '%s' found" % self._name)
+            (self._indices, self._ids, self._names, self._dimensions,
+             self._number_of_objectives) = index
+            self.initialized = True
+            return self
         try:
             suite = coco_suite(self._name, self._instance, self._options)
         except:
@@ -247,6 +351,9 @@ also report back a missing name to https://github.com/numbbo/coco/issues
             self._number_of_objectives.append(coco_problem_get_number_of_objectives(p))
         coco_suite_free(suite)
         self.suite = coco_suite(self._name, self._instance, self._options)
+        _save_suite_index(cache_folder, self._name, self._instance, self._options,
+                          self._indices, self._ids, self._names,
+                          self._dimensions, self._number_of_objectives)
         self.initialized = True
         return self
     def reset(self):
@@ -628,6 +735,17 @@ cdef class Problem:
     
     The main feature of a problem instance is that it is callable, returning the
     objective function value when called with a candidate solution as input.
+
+    Thread-safety: when the problem is not observed, the GIL is released
+    while the C code evaluates the objective function or the constraints,
+    see `__call__`, `constraint`, `evaluate_batch` and
+    `evaluate_batch_with_constraints`. Hence several threads can evaluate
+    in parallel, when each thread uses its own problem instance. The same
+    problem instance must not be used by several threads at the same time
+    and must not be `free`'d while it is evaluated. Observed problems are
+    evaluated with the GIL held, because the loggers use global state,
+    hence they can be used from several threads but are evaluated one at
+    a time.
     """
     cdef coco_problem_t* problem
     cdef np.ndarray y_values  # argument for coco_evaluate
@@ -680,6 +798,21 @@ cdef class Problem:
         self._largest_fvalues_of_interest = None
         self.initialized = True
         return self
+    cdef _evaluate(self, const double *x, double *y, double *c, size_t n,
+                   bint feasible_only=False):
+        """evaluate `n` rows with `_evaluate_rows`, with the GIL released
+        unless the problem is observed"""
+        cdef coco_problem_t *problem = self.problem
+        cdef size_t dimension = self._number_of_variables
+        cdef size_t number_of_objectives = self._number_of_objectives
+        cdef size_t number_of_constraints = self._number_of_constraints
+        if self._list_of_observers:  # loggers use global state
+            _evaluate_rows(problem, x, y, c, n, dimension, number_of_objectives,
+                           number_of_constraints, feasible_only)
+        else:
+            with nogil:
+                _evaluate_rows(problem, x, y, c, n, dimension, number_of_objectives,
+                               number_of_constraints, feasible_only)
     def constraint(self, x):
         """return constraint values for `x`. 
 
@@ -699,9 +832,8 @@ cdef class Problem:
         _x = x  # this is the final type conversion
         if self.problem is NULL:
             raise InvalidProblemException()
-        coco_evaluate_constraint(self.problem,
-                               <double *>np.PyArray_DATA(_x),
-                               <double *>np.PyArray_DATA(self.constraint_values))
+        self._evaluate(<double *>np.PyArray_DATA(_x), NULL,
+                       <double *>np.PyArray_DATA(self.constraint_values), 1)
         return np.array(self.constraint_values, copy=True)
     def recommend(self, arx):
         """Recommend a solution, return `None`.
@@ -909,7 +1041,8 @@ cdef class Problem:
 
     # def __call__(self, np.ndarray[double, ndim=1, mode="c"] x):
     def __call__(self, x):
-        """return objective function value of input `x`"""
+        """return objective function value of input `x`, see also
+        `evaluate_batch`"""
         cdef np.ndarray[double, ndim=1, mode="c"] _x
         assert self.initialized
         x = np.array(x, copy=False, dtype=np.double, order='C')
@@ -921,13 +1054,131 @@ cdef class Problem:
         _x = x  # this is the final type conversion
         if self.problem is NULL:
             raise InvalidProblemException()
-        coco_evaluate_function(self.problem,
-                               <double *>np.PyArray_DATA(_x),
-                               <double *>np.PyArray_DATA(self.y_values))
+        self._evaluate(<double *>np.PyArray_DATA(_x),
+                       <double *>np.PyArray_DATA(self.y_values), NULL, 1)
         if self._number_of_objectives == 1:
             return self.y_values[0]
         return np.array(self.y_values, copy=True)
 
+    def evaluate_batch(self, X):
+        """return objective function values of the rows of `X`.
+
+        `X` is a 2-D array-like of shape ``(n, number_of_variables)``.
+        Returns a 1-D array of ``n`` values for single-objective problems
+        and an array of shape ``(n, number_of_objectives)`` otherwise.
+        The rows are evaluated in their order within a single call into
+        the C code, such that observers see the same evaluations as when
+        calling ``[self(x) for x in X]``, however much faster for cheap
+        functions.
+
+        >>> import numpy as np
+        >>> import cocoex as ex
+        >>> problem = ex.Suite("bbob", "", "dimensions:2 instance_indices:1")[0]
+        >>> X = np.random.rand(5, 2)
+        >>> np.allclose(problem.evaluate_batch(X), [problem(x) for x in X])
+        True
+        >>> problem.evaluations
+        10
+
+        """
+        cdef np.ndarray[double, ndim=2, mode="c"] _X
+        cdef np.ndarray[double, ndim=2, mode="c"] _Y
+        assert self.initialized
+        X = np.array(X, copy=False, dtype=np.double, order='C', ndmin=2)
+        if X.ndim != 2 or X.shape[1] != self.number_of_variables:
+            raise ValueError(
+                "Shape, `np.shape(X)==%s`, of input `X` does " % str(np.shape(X)) +
+                "not match `(n, number_of_variables)` with `number_of_variables==%d`."
+                             % self.number_of_variables)
+        _X = X  # this is the final type conversion
+        if self.problem is NULL:
+            raise InvalidProblemException()
+        _Y = np.zeros((X.shape[0], self._number_of_objectives))
+        self._evaluate(<double *>np.PyArray_DATA(_X),
+                       <double *>np.PyArray_DATA(_Y), NULL, X.shape[0])
+        if self._number_of_objectives == 1:
+            return _Y[:, 0]
+        return _Y
+
+    def evaluate_with_constraints(self, x):
+        """return ``(f, c)``, objective function value and constraint
+        values of input `x`.
+
+        The same as ``c = self.constraint(x); f = self(x)``, but `x` is
+        converted only once. Both, `evaluations` and
+        `evaluations_constraints`, are incremented by one. Without
+        constraints, `c` is an empty array.
+
+        See also `evaluate_batch_with_constraints`.
+        """
+        x = np.array(x, copy=False, dtype=np.double, order='C')
+        if np.size(x) != self.number_of_variables:
+            raise ValueError(
+                "Dimension, `np.size(x)==%d`, of input `x` does " % np.size(x) +
+                "not match the problem dimension `number_of_variables==%d`."
+                             % self.number_of_variables)
+        F, C = self.evaluate_batch_with_constraints(x.reshape(1, -1))
+        return F[0], C[0]
+
+    def evaluate_batch_with_constraints(self, X, feasible_only=False):
+        """return ``(F, C)``, objective function values and constraint
+        values of the rows of `X`.
+
+        The rows are evaluated one after the other, each like
+        `evaluate_with_constraints`, within a single call into the C code.
+        `C` has shape ``(n, number_of_constraints)``, `F` has the same
+        shape as with `evaluate_batch`.
+
+        With ``feasible_only=True``, the objective function is only
+        evaluated when all constraint values are <= 0, otherwise the
+        objective function values are `nan` and `evaluations` is not
+        incremented. Hence, ::
+
+            F, C = problem.evaluate_batch_with_constraints(X, True)
+
+        replaces the typical loop ::
+
+            for x in X:
+                c = problem.constraint(x)
+                f = problem(x) if np.all(c <= 0) else np.nan
+
+        >>> import numpy as np
+        >>> import cocoex as ex
+        >>> ex.known_suite_names.append("bbob-constrained")
+        >>> problem = ex.Suite("bbob-constrained", "",
+        ...                    "dimensions:2 instance_indices:1")[0]
+        >>> ex.known_suite_names.remove("bbob-constrained")
+        >>> X = np.random.randn(5, 2)
+        >>> F, C = problem.evaluate_batch_with_constraints(X)
+        >>> np.allclose(C, [problem.constraint(x) for x in X])
+        True
+        >>> np.allclose(F, [problem(x) for x in X])
+        True
+        >>> problem.evaluations, problem.evaluations_constraints
+        (10, 10)
+
+        """
+        cdef np.ndarray[double, ndim=2, mode="c"] _X
+        cdef np.ndarray[double, ndim=2, mode="c"] _Y
+        cdef np.ndarray[double, ndim=2, mode="c"] _C
+        assert self.initialized
+        X = np.array(X, copy=False, dtype=np.double, order='C', ndmin=2)
+        if X.ndim != 2 or X.shape[1] != self.number_of_variables:
+            raise ValueError(
+                "Shape, `np.shape(X)==%s`, of input `X` does " % str(np.shape(X)) +
+                "not match `(n, number_of_variables)` with `number_of_variables==%d`."
+                             % self.number_of_variables)
+        _X = X  # this is the final type conversion
+        if self.problem is NULL:
+            raise InvalidProblemException()
+        _Y = np.nan * np.ones((X.shape[0], self._number_of_objectives))
+        _C = np.zeros((X.shape[0], self._number_of_constraints))
+        self._evaluate(<double *>np.PyArray_DATA(_X), <double *>np.PyArray_DATA(_Y),
+                       <double *>np.PyArray_DATA(_C), X.shape[0], feasible_only)
+        if self._number_of_objectives == 1:
+            return _Y[:, 0], _C
+        return _Y, _C
+
     @property
     def id(self):
         "id as string without spaces or weird characters"
@@ -18,6 +18,8 @@ f-evaluations::
 runs the first of 20 batches with maximal budget of
 1000 * dimension f-evaluations on the bbob-biobj suite.
 All batches must be run to generate a complete data set.
+To run all batches in parallel processes on a single machine and get a
+single data set, see `cocoex.runner`.
 
 Usage from a python shell:
 
@@ -16,6 +16,7 @@ A more complete example use case can be found in the `example_experiment.py`
 file.
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
+import os as _os
 from . import solvers, utilities
 try:
     from . import _interface
@@ -149,6 +150,12 @@ class Suite(_Suite):
 
     See also `Observer` and `example_experiment.py`.
     """
+    index_cache_folder = _os.path.join(_os.path.expanduser('~'), '.cocoex', 'cache')
+    """folder where the problem ids, names, dimensions and indices of
+    suites are cached, such that the creation of a `Suite` does not need
+    to construct each problem of the suite again. `None` switches the
+    cache off."""
+
     def __init__(self, suite_name, suite_instance, suite_options):
         """``suite_instance`` and ``suite_options`` can be empty strings."""
         # this __init__ defines the arguments for _Suite.__cinit__,
@@ -410,6 +417,17 @@ class Problem(_interface.Problem):
     
     The main feature of a problem instance is that it is callable, returning the
     objective function value when called with a candidate solution as input.
+
+    Thread-safety: when the problem is not observed, the GIL is released
+    while the C code evaluates the objective function or the constraints,
+    see `__call__`, `constraint`, `evaluate_batch` and
+    `evaluate_batch_with_constraints`. Hence several threads can evaluate
+    in parallel, when each thread uses its own problem instance. The same
+    problem instance must not be used by several threads at the same time
+    and must not be `free`'d while it is evaluated. Observed problems are
+    evaluated with the GIL held, because the loggers use global state,
+    hence they can be used from several threads but are evaluated one at
+    a time.
     """
     def __init__(self):
         super(Problem, self).__init__()
@@ -420,6 +438,83 @@ class Problem(_interface.Problem):
         """
         return super(Problem, self).constraint(x)
 
+    def evaluate_batch(self, X):
+        """return objective function values of the rows of `X`.
+
+        `X` is a 2-D array-like of shape ``(n, number_of_variables)``.
+        Returns a 1-D array of ``n`` values for single-objective problems
+        and an array of shape ``(n, number_of_objectives)`` otherwise.
+        The rows are evaluated in their order within a single call into
+        the C code, such that observers see the same evaluations as when
+        calling ``[self(x) for x in X]``, however much faster for cheap
+        functions.
+
+        >>> import numpy as np
+        >>> import cocoex as ex
+        >>> problem = ex.Suite("bbob", "", "dimensions:2 instance_indices:1")[0]
+        >>> X = np.random.rand(5, 2)
+        >>> np.allclose(problem.evaluate_batch(X), [problem(x) for x in X])
+        True
+        >>> problem.evaluations
+        10
+
+        """
+        return super(Problem, self).evaluate_batch(X)
+
+    def evaluate_with_constraints(self, x):
+        """return ``(f, c)``, objective function value and constraint
+        values of input `x`.
+
+        The same as ``c = self.constraint(x); f = self(x)``, but `x` is
+        converted only once. Both, `evaluations` and
+        `evaluations_constraints`, are incremented by one. Without
+        constraints, `c` is an empty array.
+
+        See also `evaluate_batch_with_constraints`.
+        """
+        return super(Problem, self).evaluate_with_constraints(x)
+
+    def evaluate_batch_with_constraints(self, X, feasible_only=False):
+        """return ``(F, C)``, objective function values and constraint
+        values of the rows of `X`.
+
+        The rows are evaluated one after the other, each like
+        `evaluate_with_constraints`, within a single call into the C code.
+        `C` has shape ``(n, number_of_constraints)``, `F` has the same
+        shape as with `evaluate_batch`.
+
+        With ``feasible_only=True``, the objective function is only
+        evaluated when all constraint values are <= 0, otherwise the
+        objective function values are `nan` and `evaluations` is not
+        incremented. Hence, ::
+
+            F, C = problem.evaluate_batch_with_constraints(X, True)
+
+        replaces the typical loop ::
+
+            for x in X:
+                c = problem.constraint(x)
+                f = problem(x) if np.all(c <= 0) else np.nan
+
+        >>> import numpy as np
+        >>> import cocoex as ex
+        >>> ex.known_suite_names.append("bbob-constrained")
+        >>> problem = ex.Suite("bbob-constrained", "",
+        ...                    "dimensions:2 instance_indices:1")[0]
+        >>> ex.known_suite_names.remove("bbob-constrained")
+        >>> X = np.random.randn(5, 2)
+        >>> F, C = problem.evaluate_batch_with_constraints(X)
+        >>> np.allclose(C, [problem.constraint(x) for x in X])
+        True
+        >>> np.allclose(F, [problem(x) for x in X])
+        True
+        >>> problem.evaluations, problem.evaluations_constraints
+        (10, 10)
+
+        """
+        return super(Problem, self).evaluate_batch_with_constraints(
+                X, feasible_only)
+
     def logger_biobj_feed_solution(self, evaluation, y):
         """Feed the given solution to logger_biobj in order to reconstruct its
         output.
@@ -0,0 +1,205 @@
+"""Run an experiment on a benchmark suite with several processes.
+
+The problems of the suite are distributed over a pool of worker
+processes, balanced by their expected cost ``dimension * budget``. Each
+worker writes to its own observer output folder. When all workers are
+done, the outputs are merged into a single result folder which has the
+same format as the output of a serial run, such that it can be
+post-processed as usual:
+
+>>> import os
+>>> from cocoex import runner
+>>> folder = runner.run("bbob", 10, processes=2,
+...                     suite_options="dimensions: 2,3 function_indices: 1-2",
+...                     observer_options="result_folder: doctest_runner")
+>>> sorted(os.listdir(folder))
+['bbobexp_f1_i1.info', 'bbobexp_f2_i1.info', 'data_f1', 'data_f2']
+>>> print(open(os.path.join(folder, 'bbobexp_f1_i1.info')).read())  # doctest: +ELLIPSIS
+suite = 'bbob', funcId = 1, DIM = 2, ...
+%
+data_f1/bbobexp_f1_DIM2_i1.dat, 1:20|..., 80:20|...
+suite = 'bbob', funcId = 1, DIM = 3, ...
+%
+data_f1/bbobexp_f1_DIM3_i1.dat, 1:30|..., 80:30|...
+
+All problems with the same function and dimension are run in the same
+worker in the order of the suite, because the observers write them into
+the same files.
+"""
+from __future__ import absolute_import, division, print_function
+import os
+import re
+import shutil
+import multiprocessing
+import numpy as np
+from . import solvers
+
+def random_search(problem, max_evals):
+    """default `optimize` argument of `run`, calls
+    `solvers.random_search` within the bounds of `problem`"""
+    solvers.random_search(problem, problem.lower_bounds,
+                          problem.upper_bounds, max_evals)
+
+def distribute(costs, number):
+    """return `number` lists of indices into `costs` such that the sums
+    of `costs` over the lists are about equal.
+
+    The most expensive remaining entry is added to the currently
+    cheapest list (longest processing time first). Each list is sorted.
+
+    >>> from cocoex.runner import distribute
+    >>> distribute([4, 3, 3, 2, 2, 2], 2)
+    [[0, 3, 4], [1, 2, 5]]
+    """
+    batches = [[] for _ in range(number)]
+    loads = [0] * number
+    for i in sorted(range(len(costs)), key=lambda i: -costs[i]):
+        k = loads.index(min(loads))
+        batches[k].append(i)
+        loads[k] += costs[i]
+    return [sorted(batch) for batch in batches]
+
+def run(suite_name, budget, optimize=random_search, processes=None,
+        suite_instance="", suite_options="",
+        observer_name=None, observer_options=""):
+    """benchmark `optimize` on the suite `suite_name` with `processes`
+    worker processes and return the name of the merged result folder.
+
+    ``optimize(problem, budget * problem.dimension)`` is called with each
+    observed problem and must be picklable, that is, defined on module
+    level. By default, `observer_name` is taken from `default_observers`
+    and `processes` is the number of CPUs. `observer_options` can be a
+    string or a `dict` and its ``result_folder`` determines the name of
+    the merged folder. The worker folders are removed after merging.
+
+    The random number generator of `numpy` is seeded anew in each
+    worker, otherwise all workers would use the same random numbers.
+    """
+    from . import Suite, Observer, default_observers
+    if observer_name is None:
+        observer_name = default_observers()[suite_name]
+    suite = Suite(suite_name, suite_instance, suite_options)
+    groups, keys = [], {}  # problem indices of each function and dimension
+    for index, id_ in enumerate(suite.ids()):
+        key = re.sub(r'_i\d+', '', id_)
+        if key not in keys:
+            keys[key] = len(groups)
+            groups.append([])
+        groups[keys[key]].append(index)
+    dimensions = [int(re.search(r'_d(\d+)', id_).group(1))
+                  for id_ in sorted(keys, key=keys.get)]
+    suite.free()
+    observer = Observer(observer_name, observer_options)
+    result_folder = _str(observer.result_folder)
+    del observer
+    batches = distribute([dimension * budget * len(group)
+                          for dimension, group in zip(dimensions, groups)],
+                         processes or multiprocessing.cpu_count())
+    jobs = []
+    for i, batch in enumerate(b for b in batches if b):
+        worker_folder = '%s_worker%03d' % (os.path.basename(result_folder), i + 1)
+        if isinstance(observer_options, dict):
+            options = dict(observer_options, result_folder=worker_folder)
+        else:  # the first occurrence of an option is used
+            options = 'result_folder: %s %s' % (worker_folder, observer_options)
+        jobs.append((suite_name, suite_instance, suite_options, observer_name,
+                     options, [index for k in batch for index in groups[k]],
+                     budget, optimize))
+    pool = multiprocessing.Pool(len(jobs))
+    try:
+        folders = pool.map(_run_batch, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    merge(folders, result_folder)
+    return result_folder
+
+def _run_batch(job):
+    """benchmark the problems of `job` in a worker process and return the
+    name of the output folder"""
+    from . import Suite, Observer
+    (suite_name, suite_instance, suite_options, observer_name,
+     observer_options, indices, budget, optimize) = job
+    np.random.seed()
+    suite = Suite(suite_name, suite_instance, suite_options)
+    observer = Observer(observer_name, observer_options)
+    for index in indices:
+        problem = suite.get_problem(index, observer)
+        optimize(problem, budget * problem.dimension)
+        problem.free()
+    folder = _str(observer.result_folder)
+    del observer
+    suite.free()
+    return folder
+
+def merge(folders, result_folder):
+    """merge the observer outputs in `folders` into `result_folder` and
+    remove `folders`.
+
+    The entries of the ``.info`` files are sorted by dimension and
+    function, like in a serial run. The other files are moved, or
+    appended to if the same file is in several `folders`. Hence the
+    problems of one function and dimension should be all in the same
+    folder.
+    """
+    info_files = {}
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            target_root = os.path.join(result_folder, os.path.relpath(root, folder))
+            if not os.path.isdir(target_root):
+                os.makedirs(target_root)
+            for name in files:
+                source, target = os.path.join(root, name), os.path.join(target_root, name)
+                if name.endswith('.info'):
+                    info_files.setdefault(target, []).append(source)
+                elif not os.path.exists(target):
+                    shutil.move(source, target)
+                else:
+                    with open(target, 'ab') as f, open(source, 'rb') as g:
+                        shutil.copyfileobj(g, f)
+    for target, sources in info_files.items():
+        texts = []
+        for source in sources:
+            with open(source) as f:
+                texts.append(f.read())
+        with open(target, 'w') as f:
+            f.write(_merge_info(texts))
+    for folder in folders:
+        shutil.rmtree(folder)
+
+def _info_entry_key(line):
+    """return ``(dimension, function)`` if `line` starts an entry of an
+    ``.info`` file of the ``bbob`` or ``bbob-biobj`` observer, else `None`
+    """
+    match = (re.match(r"(?:suite = [^,]*, )?funcId = *(\d+), DIM = *(\d+)", line) or
+             re.match(r"function = *(\d+), dim = *(\d+)", line))
+    return (int(match.group(2)), int(match.group(1))) if match else None
+
+def _merge_info(texts):
+    """return the ``.info`` file content of the merged `texts`.
+
+    If the entries of a non-empty text are not recognized, `texts` are
+    concatenated in the given order instead of dropping content:
+
+    >>> from cocoex.runner import _merge_info
+    >>> _merge_info(['x = 1\\n', 'x = 2'])
+    'x = 1\\nx = 2\\n'
+    """
+    if any(text.strip() and not any(_info_entry_key(line) for line in text.split('\n'))
+           for text in texts):
+        return ''.join(text if text.endswith('\n') or not text else text + '\n'
+                       for text in texts)
+    header, entries = None, []
+    for text in texts:
+        lines = text.split('\n')
+        starts = [i for i, line in enumerate(lines) if _info_entry_key(line)]
+        if header is None:
+            header = lines[:starts[0]] if starts else lines
+        for start, end in zip(starts, starts[1:] + [len(lines)]):
+            entries.append((_info_entry_key(lines[start]), lines[start:end]))
+    entries.sort(key=lambda entry: entry[0])
+    return '\n'.join(header + [line for _, entry in entries for line in entry])
+
+def _str(s):
+    """return `s` as `str`"""
+    return s.decode() if isinstance(s, bytes) else s
@@ -15,9 +15,18 @@ def random_search(fun, lbounds, ubounds, budget):
         chunk = int(max([1, min([budget, max_chunk_size])]))
         # about five times faster than "for k in range(budget):..."
         X = lbounds + (ubounds - lbounds) * np.random.rand(chunk, dim)
-        if fun.number_of_constraints > 0:
+        if fun.number_of_constraints > 0 and hasattr(fun, 'evaluate_batch_with_constraints'):
+            # objective values of infeasible rows are not evaluated
+            F, C = fun.evaluate_batch_with_constraints(X, feasible_only=True)
+            feasible = np.all(C <= 0, axis=1)
+            X, F = X[feasible], F[feasible]
+        elif fun.number_of_constraints > 0:
             C = [fun.constraint(x) for x in X]  # call constraints
-            F = [fun(x) for i, x in enumerate(X) if np.all(C[i] <= 0)]
+            feasible = np.array([np.all(c <= 0) for c in C], dtype=bool)
+            X = X[feasible]
+            F = [fun(x) for x in X]
+        elif hasattr(fun, 'evaluate_batch'):
+            F = fun.evaluate_batch(X)  # evaluates all rows in C
         else:
             F = [fun(x) for x in X]
         if fun.number_of_objectives == 1:
@@ -768,8 +768,6 @@ static void coco_problem_stacked_evaluate_function(coco_problem_t *problem, cons
 
   const size_t number_of_objectives_problem1 = coco_problem_get_number_of_objectives(data->problem1);
   const size_t number_of_objectives_problem2 = coco_problem_get_number_of_objectives(data->problem2);
-  double *cons_values = NULL;
-  int is_feasible;
     
   assert(coco_problem_get_number_of_objectives(problem)
       == number_of_objectives_problem1 + number_of_objectives_problem2);
@@ -782,13 +780,8 @@ static void coco_problem_stacked_evaluate_function(coco_problem_t *problem, cons
   /* Make sure that no feasible point has a function value lower
    * than the minimum's.
    */
-  if (problem->number_of_constraints > 0) {
-    cons_values = coco_allocate_vector(problem->number_of_constraints);
-    is_feasible = coco_is_feasible(problem, x, cons_values);
-    coco_free_memory(cons_values);   
-    if (is_feasible)
-      assert(y[0] + 1e-13 >= problem->best_value[0]);
-  }
+  if (problem->number_of_constraints > 0)
+    coco_assert_not_better_than_optimum(problem, x, y);
 }
 
 /**
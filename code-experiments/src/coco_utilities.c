@@ -983,6 +983,28 @@ static int coco_is_feasible(coco_problem_t *problem,
   return ret_val;
 }
 
+/**
+ * @brief Asserts that the objective value y[0] of a feasible x is not better than the optimal value.
+ *
+ * The feasibility of x is only checked when assertions are enabled, that is, when NDEBUG is not
+ * defined, because checking it evaluates the constraints once more.
+ *
+ * @param problem The given COCO problem.
+ * @param x Decision vector.
+ * @param y Objective vector of x.
+ */
+static void coco_assert_not_better_than_optimum(coco_problem_t *problem,
+                                                const double *x,
+                                                const double *y) {
+#ifndef NDEBUG
+  if (coco_problem_get_number_of_constraints(problem) > 0 && !coco_is_feasible(problem, x, NULL))
+    return;
+  assert(y[0] + 1e-13 >= problem->best_value[0]);
+#else
+  (void) problem; (void) x; (void) y; /* silence (C89) compilers */
+#endif
+}
+
 /**@}*/
 
 /***********************************************************************************************************/
@@ -18,35 +18,72 @@ To obtain more information on the use of this package from the python
 interpreter, type ``help(cocopp.cococommands)``, however remark that
 this info might not be entirely up-to-date.
 
+The submodules, `main`, the data archives and `__version__` are
+imported or created on first access, such that ``import cocopp``
+followed by `cocopp.load` does not import `matplotlib` (with Python
+3.7 or later).
+
 """
 
 from __future__ import absolute_import
 
-import matplotlib  # just to make sure the following is actually done first
-matplotlib.use('Agg')  # To avoid window popup and use without X forwarding
-del matplotlib
+import os
+import sys
+import importlib
+if sys.version_info[0] >= 3:
+    import importlib.util
+if 'matplotlib' in sys.modules:
+    import matplotlib  # just to make sure the following is actually done first
+    matplotlib.use('Agg')  # To avoid window popup and use without X forwarding
+    del matplotlib
+else:  # the same, when matplotlib is imported later
+    os.environ['MPLBACKEND'] = 'Agg'
 
-from numpy.random import seed as set_seed
+from .toolsstats import set_seed
 
 from .cococommands import *  # outdated
-from . import config
 from . import findfiles
 
-from .rungeneric import main as main
-
-import pkg_resources
-
 __all__ = [# 'main',  # import nothing with "from cocopp import *"
            ]
 
-__version__ = pkg_resources.require('cocopp')[0].version
-
-_data_archive = findfiles.COCODataArchive()
-data_archive = _data_archive  # this line will go away
-"depreciated"
-
-bbob = findfiles.COCOBBOBDataArchive()
-bbob_noisy = findfiles.COCOBBOBNoisyDataArchive()
-bbob_biobj = findfiles.COCOBBOBBiobjDataArchive()
-
-del absolute_import, pkg_resources
+_lazy_attributes = {
+    'main': lambda: importlib.import_module('.rungeneric', __name__).main,
+    'config': lambda: importlib.import_module('.config', __name__),
+    '__version__': lambda: importlib.import_module('pkg_resources').require('cocopp')[0].version,
+    '_data_archive': findfiles.COCODataArchive,
+    'data_archive': lambda: _lazy_attribute('_data_archive'),  # this line will go away
+    'bbob': findfiles.COCOBBOBDataArchive,
+    'bbob_noisy': findfiles.COCOBBOBNoisyDataArchive,
+    'bbob_biobj': findfiles.COCOBBOBBiobjDataArchive,
+}
+"""map names of module attributes to the function which creates them on
+first access, "data_archive" is depreciated"""
+
+
+def _lazy_attribute(name):
+    """create the module attribute `name` from `_lazy_attributes`"""
+    module = sys.modules[__name__]
+    if name not in vars(module):
+        setattr(module, name, _lazy_attributes[name]())
+    return vars(module)[name]
+
+
+def __getattr__(name):
+    """create lazy attributes and import submodules on first access"""
+    if name in _lazy_attributes:
+        return _lazy_attribute(name)
+    if importlib.util.find_spec('%s.%s' % (__name__, name)) is not None:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
+
+if sys.version_info < (3, 7):  # module __getattr__ is not supported
+    for _name in _lazy_attributes:
+        _lazy_attribute(_name)
+    del _name
+
+del absolute_import
@@ -27,6 +27,10 @@ if __name__ == "__main__":
     args = sys.argv[1:] if len(sys.argv) else []
     if not is_module:
         raise ValueError('try calling "python -m ..." instead of "python ..."')
+    if args and args[0] == 'serve':  # python -m cocopp serve [--port=N]
+        from . import serve
+        serve.main(args[1:])
+        sys.exit()
     res = rungeneric.main(args)
     if genericsettings.test:
         print(res)
@@ -0,0 +1,302 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark the post-processing on synthetic data.
+
+Generates data of an adjustable size in the format of the ``bbob``
+logger and times the hot paths of the post-processing: reading and
+aligning data, constructing `pproc.DataSet` instances, computing
+evaluations and aRTs, simulating run lengths, constructing reference
+algorithm data sets, drawing ECDF graphs and a full comparison of
+several algorithms. No data are downloaded.
+
+From the shell::
+
+    $ python -m cocopp.benchmark --algorithms=2 --functions=1-6 \\
+          --dimensions=2,5,20 --trials=15 --budget=1000 --output=new.json
+    $ python -m cocopp.benchmark --compare=old.json new.json
+
+writes the timings to :file:`new.json` and compares them with the
+timings of a previous run, for example from another commit.
+
+    >>> import os, tempfile
+    >>> from cocopp import benchmark
+    >>> folders = benchmark.generate_data(tempfile.mkdtemp(), algorithms=1,
+    ...                                   functions=[1], dimensions=[2],
+    ...                                   trials=3, budget=100)
+    >>> sorted(os.listdir(folders[0]))
+    ['bbobexp_f1.info', 'data_f1']
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import json
+import time
+import glob
+import getopt
+import shutil
+import platform
+import tempfile
+import subprocess
+import numpy as np
+
+from . import genericsettings, readalign, pproc, toolsstats, bestalg
+from . import rungenericmany, testbedsettings
+from .compall import pprldmany
+from .context import Context
+from .ppfig import Usage
+
+targets = [10 ** (i / 5.) for i in range(10, -41, -1)]
+"""target values for the timed computations"""
+
+
+def generate_data(folder, algorithms=2, functions=range(1, 7),
+                  dimensions=(2, 5, 20), trials=15, budget=1000, seed=1):
+    """write synthetic data of `algorithms` algorithms to `folder` and
+    return the list of the algorithm folders.
+
+    Each algorithm has `trials` runs on each of `functions` in each of
+    `dimensions`, of at most ``budget * dimension`` evaluations, in the
+    format of the ``bbob`` logger. The best function value of a run
+    decreases with a random rate, such that not all targets are reached.
+    """
+    rng = np.random.RandomState(seed)
+    folders = []
+    for ialg in range(algorithms):
+        algfolder = os.path.join(folder, 'ALG%d' % (ialg + 1))
+        folders.append(algfolder)
+        for f in functions:
+            datafolder = os.path.join(algfolder, 'data_f%d' % f)
+            if not os.path.isdir(datafolder):
+                os.makedirs(datafolder)
+            info_lines = []
+            for dim in dimensions:
+                runs = []
+                filename = 'bbobexp_f%d_DIM%d' % (f, dim)
+                with open(os.path.join(datafolder, filename + '.dat'), 'w') as dat, \
+                        open(os.path.join(datafolder, filename + '.tdat'), 'w') as tdat:
+                    for instance in range(1, trials + 1):
+                        maxevals = int(budget * dim * rng.uniform(0.5, 1))
+                        runs.append((instance, maxevals,
+                                     _write_run(dat, tdat, rng, dim, maxevals)))
+                info_lines += [
+                    "funcId = %d, DIM = %d, Precision = 1.000e-08, "
+                    "algId = 'ALG%d', suite = 'bbob'" % (f, dim, ialg + 1),
+                    '% synthetic data of cocopp.benchmark',
+                    ', '.join(['data_f%d/%s.dat' % (f, filename)] +
+                              ['%d:%d|%.1e' % run for run in runs])]
+            with open(os.path.join(algfolder, 'bbobexp_f%d.info' % f), 'w') as info:
+                info.write('\n'.join(info_lines) + '\n')
+    return folders
+
+
+def _write_run(dat, tdat, rng, dim, maxevals):
+    """write one run to the open files `dat` and `tdat` and return its
+    final distance to the optimum"""
+    header = ('%% f evaluations | g evaluations | best noise-free fitness - Fopt'
+              ' (%e) + sum g_i+ | measured fitness | best measured fitness or'
+              ' single-digit g-values | x1 | x2...\n' % 0)
+    dat.write(header)
+    tdat.write(header)
+    f0, rate = 10 ** rng.uniform(1, 3), rng.uniform(0.5, 3) / dim
+    evals = np.unique(np.round(np.logspace(0, np.log10(maxevals), 20 * dim)).astype(int))
+    fvalues = f0 * np.exp(-rate * np.log(evals) ** 1.5)
+    x = ' '.join(['0.0'] * dim)
+    next_target = 10 ** (np.ceil(5 * np.log10(fvalues[0])) / 5)
+    for e, fvalue in zip(evals, fvalues):
+        line = '%d 0 %+.9e %+.9e %+.9e %s\n' % (e, fvalue, fvalue, fvalue, x)
+        dat.write(line)
+        if fvalue <= next_target or e == evals[-1]:
+            tdat.write(line)
+            next_target = 10 ** (np.floor(5 * np.log10(max((fvalue, 1e-300)))) / 5 - 0.2)
+    return fvalues[-1]
+
+
+def _benchmark_context(folder):
+    """return a `Context` of the current state, where all figures are
+    drawn, no derived statistics are stored and reference algorithm data
+    are cached in `folder` rather than in the home folder of the user"""
+    context = Context()
+    with context:
+        genericsettings.skip_unchanged_outputs = False
+        genericsettings.derived_statistics_folder = ''
+        genericsettings.reference_algorithm_cache_folder = os.path.join(folder, 'cache')
+        genericsettings.verbose = False
+    return context
+
+
+def _reached_target(ds):
+    """return the median of the f-values in `ds` which at least one run
+    reaches, such that `toolsstats.drawSP_from_dataset` has successes"""
+    reached = ds.evals[np.any(np.isfinite(ds.evals[:, 1:]), axis=1), 0]
+    return reached[len(reached) // 2]
+
+
+def _best_time(function, repetitions):
+    """return the smallest wall time of `repetitions` calls of
+    `function`"""
+    times = []
+    for _ in range(repetitions):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def run(folder=None, repetitions=3, output=None, **data_parameters):
+    """generate data and return and optionally write to `output` a
+    `dict` with the timings in seconds of the benchmarked functions.
+
+    Each timing is the best of `repetitions` calls. The data are
+    written to `folder`, by default a temporary folder which is removed
+    again. `data_parameters` are passed to `generate_data`. The state of
+    the calling process is not changed, see `context.Context`.
+    """
+    remove_folder = folder is None
+    folder = folder or tempfile.mkdtemp()
+    timings = {}
+    try:
+        folders = generate_data(os.path.join(folder, 'data'), **data_parameters)
+        with _benchmark_context(folder):
+            testbedsettings.reset_current_testbed()
+            testbedsettings.load_current_testbed(
+                testbedsettings.get_testbed_from_suite('bbob'), pproc.TargetValues)
+            data_files = sorted(glob.glob(os.path.join(folders[0], '*', '*.dat')))
+            timings['readalign.split'] = _best_time(
+                lambda: [readalign.split([name]) for name in data_files], repetitions)
+            raw_data = [readalign.HMultiReader(readalign.split([name])[0])
+                        for name in data_files]
+            timings['readalign.align_data'] = _best_time(
+                lambda: [readalign.align_data(data, 0, 2, rewind_reader=True)
+                         for data in raw_data], repetitions)
+            dsList = [None]
+
+            def construct():
+                dsList[0] = pproc.DataSetList(folders)
+            timings['DataSet construction'] = _best_time(construct, repetitions)
+            dsList = dsList[0]
+            timings['DataSet.detEvals'] = _best_time(
+                lambda: [ds.detEvals(targets) for ds in dsList], repetitions)
+            timings['DataSet.detERT'] = _best_time(
+                lambda: [ds.detERT(targets) for ds in dsList], repetitions)
+            drawSP_targets = [_reached_target(ds) for ds in dsList]
+            timings['toolsstats.drawSP'] = _best_time(
+                lambda: [toolsstats.drawSP_from_dataset(ds, target, [50], samplesize=100)
+                         for ds, target in zip(dsList, drawSP_targets)], repetitions)
+            # keyed by algorithm name like in `pproc.processInputArgs`
+            dictAlg = dict((key[0], value) for key, value in dsList.dictByAlg().items())
+            timings['bestalg.BestAlgSet'] = _best_time(
+                lambda: bestalg.generate(dictAlg, 'benchmark', jobs=1), repetitions)
+            outputdir = os.path.join(folder, 'output')
+            if not os.path.isdir(outputdir):
+                os.makedirs(outputdir)
+            dim = max(dsList.dictByDim())
+            timings['pprldmany.main'] = _best_time(
+                lambda: pprldmany.main(pproc.dictAlgByDim(dictAlg)[dim],
+                                       outputdir=outputdir, info='benchmark'),
+                repetitions)
+        output_folders = (os.path.join(folder, 'ppdata%d' % i) for i in range(repetitions))
+        timings['rungenericmany'] = _best_time(
+            lambda: rungenericmany.main(['--no-svg', '-o', next(output_folders)] + folders,
+                                        context=_benchmark_context(folder)),
+            repetitions)
+    finally:
+        if remove_folder:
+            shutil.rmtree(folder, ignore_errors=True)
+    result = {'timings': timings,
+              'repetitions': repetitions,
+              'data': data_parameters,
+              'commit': _git_commit(),
+              'python': sys.version.split()[0],
+              'numpy': np.__version__,
+              'platform': platform.platform()}
+    if output:
+        with open(output, 'w') as file_:
+            json.dump(result, file_, indent=1, sort_keys=True)
+    return result
+
+
+def _git_commit():
+    """return the current commit of the source tree or `None`"""
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], stderr=devnull,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    """print the timings of the result files `old` and `new` side by
+    side with their ratio"""
+    with open(old) as file_:
+        old = json.load(file_)
+    with open(new) as file_:
+        new = json.load(file_)
+    print('%-24s %10s %10s %7s' % ('', 'old [s]', 'new [s]', 'ratio'))
+    for name in sorted(set(old['timings']) | set(new['timings'])):
+        t_old, t_new = old['timings'].get(name), new['timings'].get(name)
+        print('%-24s %10s %10s %7s' % (
+            name, '%.3f' % t_old if t_old is not None else '-',
+            '%.3f' % t_new if t_new is not None else '-',
+            '%.2f' % (t_new / t_old) if t_old and t_new is not None else '-'))
+
+
+def _int_list(s):
+    """return the integers of a string like ``'1-6,10'``"""
+    res = []
+    for part in s.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            res.extend(range(int(first), int(last) + 1))
+        else:
+            res.append(int(part))
+    return res
+
+
+def main(argv=None):
+    """run the benchmark from the command line, see the module
+    documentation.
+
+    Options are ``--algorithms=N``, ``--functions=LIST``,
+    ``--dimensions=LIST``, ``--trials=N``, ``--budget=N`` (evaluations
+    per dimension), ``--repetitions=N``, ``--output=FILE`` (default
+    :file:`cocopp-benchmark.json`) and ``--compare=OLDFILE``, where a
+    given argument is taken as new results file instead of running the
+    benchmark.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    try:
+        opts, args = getopt.getopt(argv, '', [
+            'algorithms=', 'functions=', 'dimensions=', 'trials=', 'budget=',
+            'repetitions=', 'output=', 'compare='])
+    except getopt.error as msg:
+        raise Usage(msg)
+    options = dict(opts)
+    if '--compare' in options and args:
+        compare(options['--compare'], args[0])
+        return
+    data_parameters = {}
+    for name, convert in (('algorithms', int), ('functions', _int_list),
+                          ('dimensions', _int_list), ('trials', int),
+                          ('budget', int)):
+        if '--' + name in options:
+            data_parameters[name] = convert(options['--' + name])
+    output = options.get('--output', 'cocopp-benchmark.json')
+    result = run(repetitions=int(options.get('--repetitions', 3)),
+                 output=output, **data_parameters)
+    for name, seconds in sorted(result['timings'].items()):
+        print('%-24s %8.3f s' % (name, seconds))
+    print('Results written to %s' % output)
+    if '--compare' in options:
+        compare(options['--compare'], output)
+
+
+if __name__ == '__main__':
+    main()
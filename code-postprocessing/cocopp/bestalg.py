@@ -24,11 +24,11 @@ import os
 import sys
 import pickle
 import gzip
+import hashlib
 import warnings
 import numpy as np
 import tarfile
 import pkg_resources
-from six import advance_iterator
 
 from . import readalign, pproc
 from .toolsdivers import print_done
@@ -38,6 +38,17 @@ from .pproc import DataSet
 
 bestAlgorithmEntries = {}
 
+_cache_format_version = 1
+"""increment when `BestAlgSet` or the cache content changes incompatibly"""
+_cache = {}
+"""path and content of the cache of the loaded reference algorithm"""
+_cache_in_memory = toolsdivers.LeastRecentlyUsedDict(20)
+"""the 20 most recently used loaded caches by file name, see
+`genericsettings.keep_data_in_memory`"""
+_reset_callbacks = []
+"""functions called without argument when the reference algorithm is
+reset or loaded, used to clear data derived from the previous one"""
+
 algs2009 = ("ALPS", "AMALGAM", "BAYEDA", "BFGS", "Cauchy-EDA", "BIPOP-CMA-ES",
             "CMA-ESPLUSSEL", "DASA", "DE-PSO", "DIRECT", "EDA-PSO",
             "FULLNEWUOA", "G3PCX", "GA", "GLOBAL", "iAMALGAM",
@@ -153,59 +164,45 @@ class BestAlgSet(DataSet):
                     for i in sortedAlgs)
         res = readalign.alignArrayData(readalign.HArrayMultiReader(erts))
 
-        resalgs = []
-        reserts = []
-        instance_numbers = []
-        # For each function value
-        for i in res:
-            # Find best algorithm
-            curerts = i[1:]
-            assert len((np.isnan(curerts) == False)) > 0
-            currentbestert = np.inf
-            currentbestalg = ''
-            for j, tmpert in enumerate(curerts):
-                if np.isnan(tmpert):
-                    continue  # TODO: don't disregard these entries
-                if tmpert == currentbestert:
-                    # TODO: what do we do in case of ties?
-                    # look at function values corresponding to the aRT?
-                    # Look at the function evaluations? the success ratio?
-                    pass
-                elif tmpert < currentbestert:
-                    currentbestert = tmpert
-                    currentbestalg = sortedAlgs[j]
-            reserts.append(currentbestert)
-            resalgs.append(currentbestalg)
-            sorted_instance_numbers = list(set(dict_alg[currentbestalg].instancenumbers))
-            sorted_instance_numbers.sort()
-            instance_numbers.append(sorted_instance_numbers)
-
-        dictiter = {}
-        dictcurLine = {}
-        resDataSet = []
-
-        # write down the #fevals to reach the function value.
-        for funval, alg in zip(res[:, 0], resalgs):
-            it = dictiter.setdefault(alg, iter(dict_alg[alg].evals))
-            curLine = dictcurLine.setdefault(alg, np.array([np.inf, 0]))
-            while curLine[0] > funval:
-                try:
-                    curLine = advance_iterator(it)
-                except StopIteration:
-                    break
-            dictcurLine[alg] = curLine.copy()
-            tmp = curLine.copy()
-            tmp[0] = funval
-            resDataSet.append(tmp)
+        # For each function value find the best algorithm, in case of ties
+        # the first one in sortedAlgs
+        # TODO: what do we do in case of ties?
+        # look at function values corresponding to the aRT?
+        # Look at the function evaluations? the success ratio?
+        # TODO: don't disregard NaN entries
+        ert_matrix = res[:, 1:]
+        assert not np.isnan(ert_matrix).all(axis=1).any()
+        ibest = np.nanargmin(ert_matrix, axis=1)
+        reserts = list(ert_matrix[np.arange(len(ibest)), ibest])
+        resalgs = [sortedAlgs[j] for j in ibest]
+        sorted_instance_numbers = dict(
+            (alg, sorted(set(dict_alg[alg].instancenumbers)))
+            for alg in set(resalgs))
+        instance_numbers = [list(sorted_instance_numbers[alg])
+                            for alg in resalgs]
+
+        # write down the #fevals to reach the function value, that is,
+        # the first evals line with a function value not larger than
+        # funval, or the last line
+        resDataSet = len(resalgs) * [None]
+        for j in sorted(set(ibest)):
+            rows = np.where(ibest == j)[0]
+            evals = dict_alg[sortedAlgs[j]].evals
+            # evals[:, 0] is decreasing, hence -evals[:, 0] is sorted
+            idx = np.searchsorted(-evals[:, 0], -res[rows, 0], side='left')
+            lines = evals[np.minimum(idx, len(evals) - 1)]  # a copy
+            lines[:, 0] = res[rows, 0]
+            for irow, line in zip(rows, lines):
+                resDataSet[irow] = line
 
         setalgs = set(resalgs)
         dictFunValsNoFail = {}
         for alg in setalgs:
-            for curline in dict_alg[alg].funvals:
-                if (curline[1:] == dict_alg[alg].finalfunvals).any():
-                    # only works because the funvals are monotonous
-                    break
-            dictFunValsNoFail[alg] = curline.copy()
+            funvals = dict_alg[alg].funvals
+            # only works because the funvals are monotonous
+            is_final = (funvals[:, 1:] == dict_alg[alg].finalfunvals).any(axis=1)
+            i_line = np.argmax(is_final) if is_final.any() else len(funvals) - 1
+            dictFunValsNoFail[alg] = funvals[i_line].copy()
 
         self.evals = resDataSet
         # evals is not a np array but a list of arrays because they may not
@@ -374,6 +371,10 @@ class BestAlgSet(DataSet):
 def reset_reference_algorithm():
     global bestAlgorithmEntries
     bestAlgorithmEntries = {}
+    save_reference_algorithm_cache()
+    _cache.clear()
+    for callback in _reset_callbacks:
+        callback()
 
 
 def load_reference_algorithm(best_algo_filename, force=False, relative_load=True):
@@ -401,6 +402,11 @@ def load_reference_algorithm(best_algo_filename, force=False, relative_load=True
     if not force and bestAlgorithmEntries:
         return bestAlgorithmEntries
 
+    save_reference_algorithm_cache()  # write pending items of the previous data
+    _cache.clear()
+    for callback in _reset_callbacks:
+        callback()
+
     # If the file or folder name is not specified then we skip the load.
     if not best_algo_filename:
         # print the following line only once to not mess the output:
@@ -441,12 +447,28 @@ def load_reference_algorithm(best_algo_filename, force=False, relative_load=True
         fid.close()
     else:
         algList = [os.path.join(best_alg_file_path, best_algo_filename)]
-        dsList, sortedAlgs, dictAlg = pproc.processInputArgs(algList)
-        bestAlgorithmEntries = generate(dictAlg, dsList[0].algId)
+        cached = _load_reference_algorithm_cache(algList[0])
+        if cached:
+            _cache.update(path=algList[0], content=cached)
+            bestAlgorithmEntries = cached['entries']
+            algId = cached['algId']
+            for alg, reference_values_hash in cached['reference_values']:
+                testbedsettings.update_reference_values(alg, reference_values_hash)
+        else:
+            dsList, sortedAlgs, dictAlg = pproc.processInputArgs(algList)
+            algId = dsList[0].algId
+            bestAlgorithmEntries = generate(dictAlg, algId)
+            dictByAlg = pproc.DataSetList(dsList).dictByAlg()
+            _cache.update(path=algList[0], content={
+                'entries': bestAlgorithmEntries,
+                'algId': algId,
+                'reference_values': [(key[0], value.get_reference_values_hash())
+                                     for key, value in dictByAlg.items()]})
+            _save_reference_algorithm_cache(_cache['path'], _cache['content'])
         # set reference_algorithm_displayname in testbedsetting if not present:
         if testbedsettings.current_testbed:
             if testbedsettings.current_testbed.reference_algorithm_displayname is None:
-                testbedsettings.current_testbed.reference_algorithm_displayname = dsList[0].algId
+                testbedsettings.current_testbed.reference_algorithm_displayname = algId
 
     print_done()
 
@@ -454,21 +476,152 @@ def load_reference_algorithm(best_algo_filename, force=False, relative_load=True
 
 
 
+def _reference_algorithm_cache_filename(path):
+    """return the cache file name for reference data in `path` or `None`.
+
+    The name depends on the absolute path, size and modification time
+    of `path`, on the current testbed, and on the versions of `cocopp`,
+    of the cache format and of Python, such that a changed data file or
+    software version never hits an outdated cache.
+    """
+    folder = genericsettings.reference_algorithm_cache_folder
+    # without testbed, reading the data is needed to set the testbed
+    if not folder or not testbedsettings.current_testbed:
+        return None
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = repr((path, stat.st_size, int(stat.st_mtime),
+                getattr(sys.modules.get(__package__), '__version__', None),
+                _cache_format_version, sys.version_info[0],
+                type(testbedsettings.current_testbed).__name__))
+    return os.path.join(os.path.expanduser(folder),
+                        'refalg-%s.pickle.gz' % hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def _load_reference_algorithm_cache(path):
+    """return the cached dictionary for reference data in `path` or `None`.
+
+    Any failure to read the cache is silently ignored.
+    """
+    filename = _reference_algorithm_cache_filename(path)
+    if filename in _cache_in_memory and genericsettings.keep_data_in_memory:
+        return _cache_in_memory.get(filename)
+    if not filename or not os.path.isfile(filename):
+        return None
+    try:
+        with gzip.open(filename, 'rb') as fid:
+            cached = pickle.load(fid)
+    except Exception:
+        return None
+    if not isinstance(cached, dict) or cached.get('version') != _cache_format_version:
+        return None
+    if genericsettings.keep_data_in_memory:
+        _cache_in_memory[filename] = cached
+    return cached
+
+
+def _save_reference_algorithm_cache(path, content):
+    """store dictionary `content` as cache for reference data in `path`.
+
+    Writes first to a temporary file to never leave a partially written
+    cache behind, failures are only reported as warning.
+    """
+    filename = _reference_algorithm_cache_filename(path)
+    if not filename:
+        return
+    content = dict(content, version=_cache_format_version)
+    if genericsettings.keep_data_in_memory:
+        _cache_in_memory[filename] = content
+    tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        folder = os.path.dirname(filename)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        with gzip.open(tmp_filename, 'wb') as fid:
+            pickle.dump(content, fid, pickle.HIGHEST_PROTOCOL)
+        toolsdivers.replace_file(tmp_filename, filename)
+    except Exception as e:
+        warnings.warn("could not write reference algorithm cache %s (%s)"
+                      % (filename, str(e)))
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+
+def get_reference_algorithm_cache_item(key):
+    """return the value stored with `key` along with the loaded
+    reference algorithm data or `None`.
+
+    Used to persist data derived from the reference algorithm, like
+    the run-length based target values in `pproc`.
+    """
+    return _cache.get('content', {}).get('items', {}).get(key)
+
+
+def set_reference_algorithm_cache_item(key, value, save=True):
+    """store `value` with `key` along with the loaded reference
+    algorithm data, see `get_reference_algorithm_cache_item`.
+
+    `key` and `value` must be picklable. With ``save=False``, the item
+    is only written to disk with the next call of
+    `save_reference_algorithm_cache`, which is done when other reference
+    data are loaded and at the end of `cocopp.main`. This avoids to
+    rewrite the whole cache file for each item.
+    """
+    if 'content' not in _cache:
+        return
+    _cache['content'].setdefault('items', {})[key] = value
+    _cache['modified'] = True
+    if save:
+        save_reference_algorithm_cache()
+
+
+def save_reference_algorithm_cache():
+    """write the cache of the loaded reference algorithm to disk if it
+    has been modified"""
+    if _cache.get('modified'):
+        _save_reference_algorithm_cache(_cache['path'], _cache['content'])
+        _cache['modified'] = False
+
+
 def usage():
     print(__doc__)  # same as: sys.modules[__name__].__doc__, was: main.__doc__
 
 
-def generate(dict_alg, algId):
+def generate(dict_alg, algId, jobs=None):
     """Generates dictionary of best algorithm data set.
+
+    The best algorithm data sets for the different (dimension, function)
+    pairs are computed with `jobs` processes, see
+    `toolsdivers.parallel_map`.
     """
 
     # dsList, sortedAlgs, dictAlg = processInputArgs(args)
-    res = {}
+    return dict(generate_items(dict_alg, algId, jobs))
+
+
+def generate_items(dict_alg, algId, jobs=None):
+    """return an iterator over ``((dim, funcId), BestAlgSet)`` pairs
+    sorted by key and computed with `jobs` processes.
+
+    Unlike `generate`, the pairs can be processed while the remaining
+    ones are computed.
+    """
+    tasks = []
     for f, i in pproc.dictAlgByFun(dict_alg).items():
         for d, j in pproc.dictAlgByDim(i).items():
-            tmp = BestAlgSet(j, algId)
-            res[(d, f)] = tmp
-    return res
+            tasks.append(((d, f), j, algId))
+    tasks.sort(key=lambda task: task[0])
+    return toolsdivers.parallel_map(_best_alg_set_item, tasks, jobs)
+
+
+def _best_alg_set_item(task):
+    """return ``(key, BestAlgSet(dict_alg, algId))`` for ``task == (key,
+    dict_alg, algId)``, used by `generate_items` in worker processes"""
+    key, dict_alg, algId = task
+    return key, BestAlgSet(dict_alg, algId)
 
 
 def deprecated_customgenerate(args=algs2009):
@@ -505,13 +658,16 @@ def deprecated_customgenerate(args=algs2009):
     print('done with writing pickle...')
 
 
-def custom_generate(args=algs2009, algId='bestCustomAlg', suite=None):
+def custom_generate(args=algs2009, algId='bestCustomAlg', suite=None,
+                    jobs=None):
     """Generates best algorithm data set from a given set of algorithms.
 
     It will create a folder named as algId in the current working directory
     corresponding to the bestalg dataSet of the algorithms listed in
     variable args. This folder is furthermore added to a `.tar.gz` file
-    of the same name.
+    of the same name. The data sets of the (dimension, function) pairs
+    are computed with `jobs` processes (default:
+    `genericsettings.jobs`) and written to disk as soon as available.
 
     This method is called from the python command line from a directory
     containing all necessary data folders::
@@ -538,9 +694,7 @@ def custom_generate(args=algs2009, algId='bestCustomAlg', suite=None):
         if genericsettings.verbose:
             print('Folder %s was created.' % output_dir)
 
-    result = generate(dictAlg, algId)
-
-    create_data_files(output_dir, result, suite)
+    create_data_files(output_dir, generate_items(dictAlg, algId, jobs), suite)
 
     tar = tarfile.open(output_dir + ".tar.gz", "w:gz")
     tar.add(output_dir)
@@ -552,13 +706,24 @@ def custom_generate(args=algs2009, algId='bestCustomAlg', suite=None):
 
 
 def create_data_files(output_dir, result, suite):
+    """write the data files of the best algorithm data sets in `result`
+    and the corresponding ``.info`` file to `output_dir`.
 
+    `result` is a dictionary or an iterable of ``((dim, funcId),
+    BestAlgSet)`` pairs, like `generate_items`, and is consumed only
+    once such that the data sets need not be kept in memory.
+    """
     info_filename = 'bbob-bestalg'
     filename_template = info_filename + '_f%02d_d%02d.%s'
     info_lines = []
     all_instances_used = []
     algorithms_used = []
-    for key, value in sorted(result.items()):
+    if isinstance(result, dict):
+        result = sorted(result.items())
+    is_biobjective = None
+    for key, value in result:
+        if is_biobjective is None:  # the first data set determines the testbed
+            is_biobjective = value.testbed == testbedsettings.default_testbed_bi
 
         # TODO: throw an error
         # if not len(value.target) == len(value.ert):
@@ -575,7 +740,7 @@ def create_data_files(output_dir, result, suite):
         target_list = value.target.tolist()
         instances_used = []
         for key_target, value_target in sorted(dict_evaluation.items()):
-            successful_runs, all_runs = result[(key[0], key[1])].get_success_ratio(value_target)
+            successful_runs, all_runs = value.get_success_ratio(value_target)
             target_index = target_list.index(value_target)
             alg_for_target = os.path.basename(value.algs[target_index])
             instances_used.append(value.instances[target_index])
@@ -593,7 +758,7 @@ def create_data_files(output_dir, result, suite):
             test_suite = suite
 
         algorithm_id = value.algId
-        if result[list(result.keys())[0]].testbed == testbedsettings.default_testbed_bi:
+        if is_biobjective:
             info_lines.append("function = %d, dim = %d, %s, %s"
                               % (key[1], key[0], filename_template % (key[1], key[0], 'dat'), instance_data))
         else:
@@ -614,7 +779,7 @@ def create_data_files(output_dir, result, suite):
             if algorithm not in algorithms_used:
                 algorithms_used.append(algorithm)
 
-    if result[list(result.keys())[0]].testbed == testbedsettings.default_testbed_bi:
+    if is_biobjective:
         header = "algorithm = '%s', indicator = 'hyp'" % algorithm_id
         if test_suite is not None:
             header += ", suite = '%s'" % test_suite
@@ -644,7 +809,7 @@ def write_to_file(filename, lines):
 
 
 def getAllContributingAlgorithmsToBest(algnamelist, target_lb=1e-8,
-                                       target_ub=1e2):
+                                       target_ub=1e2, jobs=None):
     """Computes first the artificial best algorithm from given algorithm list
        algnamelist, constructed by extracting for each target/function pair
        thalgorithm with best aRT among the given ones. Returns then the list
@@ -652,7 +817,8 @@ def getAllContributingAlgorithmsToBest(algnamelist, target_lb=1e-8,
        algorithm, separated by dimension, and sorted by importance (i.e. with
        respect to the number of target/function pairs where each algorithm is
        best). Only target/function pairs are taken into account where the target
-       is in between target_lb and target_ub.
+       is in between target_lb and target_ub. The best algorithm is computed
+       with `jobs` processes, see `custom_generate`.
        This method should be called from the python command line from a directory
        containing all necessary data folders::
 
@@ -671,7 +837,7 @@ def getAllContributingAlgorithmsToBest(algnamelist, target_lb=1e-8,
     """
 
     print("Generating best algorithm data from given algorithm list...")
-    custom_generate(algnamelist, algId='bestCustomAlg')
+    custom_generate(algnamelist, algId='bestCustomAlg', jobs=jobs)
     
 #    dsList, sortedAlgs, dictAlg = pproc.processInputArgs(('bestCustomAlg', ''))
 #    bestalgentries = generate(dictAlg, dsList[0].algId)
@@ -713,7 +879,7 @@ def getAllContributingAlgorithmsToBest(algnamelist, target_lb=1e-8,
 
 
 def extractBestAlgorithms(args=algs2009, f_factor=2,
-                          target_lb=1e-8, target_ub=1e22):
+                          target_lb=1e-8, target_ub=1e22, jobs=None):
     """Returns (and prints) per dimension a list of algorithms within
     algorithm list args that contains an algorithm if for any
         dimension/target/function pair this algorithm:
@@ -722,6 +888,9 @@ def extractBestAlgorithms(args=algs2009, f_factor=2,
         - there is no algorithm within a factor of f_factor of the best aRT
           and the current algorithm is the second best.
 
+    The (dimension, function) pairs are processed with `jobs` processes,
+    see `toolsdivers.parallel_map`.
+
     """
 
     # TODO: use pproc.TargetValues class as input target values
@@ -739,45 +908,27 @@ def extractBestAlgorithms(args=algs2009, f_factor=2,
 
     print('This may take a while (depending on the number of algorithms)')
 
+    dictAlgByDim = {}  # computing dictByDim for each target is expensive
+    tasks = []
+    for f, i in sorted(pproc.dictAlgByFun(dictAlg).items()):
+        for d, j in sorted(pproc.dictAlgByDim(i).items()):
+            alg_data = []
+            for astring in j:
+                if astring not in dictAlgByDim:
+                    dictAlgByDim[astring] = dictAlg[astring].dictByDim()
+                if d in dictAlgByDim[astring]:
+                    alg_data.append((astring, dictAlgByDim[astring][d][f - 1]))
+            tasks.append((f, d, j, alg_data, targets((f, d), discretize=True),
+                          f_factor))
+
+    last_dimension = dict((task[0], task[1]) for task in tasks)
     selectedAlgsPerProblem = {}
-    for f, i in pproc.dictAlgByFun(dictAlg).items():
-        for d, j in pproc.dictAlgByDim(i).items():
-
-            best = BestAlgSet(j)
-
-            selectedAlgsPerProblemDF = []
-            for i in range(0, len(best.target)):
-                t = best.target[i]
-                # if ((t <= target_ub) and (t >= target_lb)):
-                if toolsstats.in_approximately(t,
-                                               targets((f, d), discretize=True)):
-                    # add best for this target:
-                    selectedAlgsPerProblemDF.append(best.algs[i])
-
-                    # add second best or all algorithms that have an aRT
-                    # within a factor of f_factor of the best:
-                    secondbest_ERT = np.infty
-                    secondbest_str = ''
-                    secondbest_included = False
-                    for astring in j:
-                        currdictalg = dictAlg[astring].dictByDim()
-                        if d in currdictalg:
-                            curralgdata = currdictalg[d][f - 1]
-                            currERT = curralgdata.detERT([t])[0]
-                            if (astring != best.algs[i]):
-                                if (currERT < secondbest_ERT):
-                                    secondbest_ERT = currERT
-                                    secondbest_str = astring
-                                if (currERT <= best.detERT([t])[0] * f_factor):
-                                    selectedAlgsPerProblemDF.append(astring)
-                                    secondbest_included = True
-                    if not (secondbest_included) and (secondbest_str != ''):
-                        selectedAlgsPerProblemDF.append(secondbest_str)
-
-            if len(selectedAlgsPerProblemDF) > 0:
-                selectedAlgsPerProblem[(d, f)] = selectedAlgsPerProblemDF
-
-        print('pre-processing of function %d done.' % f)
+    for (f, d), selectedAlgsPerProblemDF in toolsdivers.parallel_map(
+            _select_algorithms, tasks, jobs):
+        if len(selectedAlgsPerProblemDF) > 0:
+            selectedAlgsPerProblem[(d, f)] = selectedAlgsPerProblemDF
+        if d == last_dimension[f]:
+            print('pre-processing of function %d done.' % f)
 
     print('loading of best algorithm(s) data done.')
 
@@ -809,6 +960,44 @@ def extractBestAlgorithms(args=algs2009, f_factor=2,
     return selectedalgsperdimension
 
 
+def _select_algorithms(task):
+    """return ``((funcId, dim), selected_algorithms)`` for one problem,
+    used by `extractBestAlgorithms` in worker processes.
+
+    ``task == (funcId, dim, dict_alg, alg_data, targets, f_factor)``,
+    where `alg_data` is a list of ``(algorithm name, DataSet)`` pairs.
+    """
+    f, d, j, alg_data, targets, f_factor = task
+    best = BestAlgSet(j)
+
+    selectedAlgsPerProblemDF = []
+    for i in range(0, len(best.target)):
+        t = best.target[i]
+        # if ((t <= target_ub) and (t >= target_lb)):
+        if toolsstats.in_approximately(t, targets):
+            # add best for this target:
+            selectedAlgsPerProblemDF.append(best.algs[i])
+
+            # add second best or all algorithms that have an aRT
+            # within a factor of f_factor of the best:
+            secondbest_ERT = np.infty
+            secondbest_str = ''
+            secondbest_included = False
+            for astring, curralgdata in alg_data:
+                currERT = curralgdata.detERT([t])[0]
+                if (astring != best.algs[i]):
+                    if (currERT < secondbest_ERT):
+                        secondbest_ERT = currERT
+                        secondbest_str = astring
+                    if (currERT <= best.detERT([t])[0] * f_factor):
+                        selectedAlgsPerProblemDF.append(astring)
+                        secondbest_included = True
+            if not (secondbest_included) and (secondbest_str != ''):
+                selectedAlgsPerProblemDF.append(secondbest_str)
+
+    return (f, d), selectedAlgsPerProblemDF
+
+
 def get_used_instance_list(instance_number_list):
 
     different_instances = []
@@ -20,7 +20,7 @@ except ImportError:
 
 import numpy as np 
 
-from .. import toolsstats, readalign, ppfigparam, testbedsettings, toolsdivers
+from .. import toolsstats, readalign, ppfigparam, testbedsettings, toolsdivers, profiling
 from ..toolsstats import ranksumtest
 from ..ppfig import save_figure, plotUnifLogXMarkers
 #try:
@@ -241,6 +241,7 @@ def annotate(entry0, entry1, dim, minfvalue=1e-8, nbtests=1):
                      zorder=20, markeredgewidth = 0.2 * linewidth,
                      transform=trans, clip_on=False)
 
+@profiling.profiled('ppfig2.main')
 def main(dsList0, dsList1, minfvalue=1e-8, outputdir=''):
     """Returns aRT1/aRT0 comparison figure."""
 
@@ -8,7 +8,7 @@ from __future__ import absolute_import
 import os
 import numpy
 import matplotlib.pyplot as plt
-from .. import toolsstats, pproc, toolsdivers
+from .. import toolsstats, pproc, toolsdivers, profiling
 from ..ppfig import save_figure, consecutiveNumbers, plotUnifLogXMarkers
 from pdb import set_trace
 from six import advance_iterator
@@ -338,6 +338,7 @@ def plotLogRel(indexEntries0, indexEntries1, isByInstance=True):
 
     return res#, fsolved, funcs
 
+@profiling.profiled('pprldistr2.main')
 def main(dsList0, dsList1, dim, targetsOfInterest=None,
          outputdir='', info='default'):
     """Generate figures of empirical cumulative distribution functions.
@@ -42,7 +42,7 @@ except ImportError:
     from matplotlib.transforms import blend_xy_sep_transform as blend
 from .. import genericsettings, htmldesc, ppfigparam, testbedsettings
 from ..ppfig import save_figure, getFontSize
-from .. import toolsdivers
+from .. import toolsdivers, profiling
 from .. import pproc
 from .. import captions
 
@@ -139,6 +139,7 @@ def beautify():
     #    plt.setp(line, color='b', marker='o', markersize=10)
     #set_trace()
 
+@profiling.profiled('ppscatter.main')
 def main(dsList0, dsList1, outputdir, settings):
     """Generate a scatter plot figure.
     
@@ -3,12 +3,13 @@
 """Creates aRTs and convergence figures for multiple algorithms."""
 from __future__ import absolute_import, print_function
 import os
+import sys
 import matplotlib.pyplot as plt
 import numpy
 import warnings
 from pdb import set_trace
 from .. import toolsdivers, toolsstats, bestalg, pproc, genericsettings, htmldesc, ppfigparam, ppfig
-from .. import testbedsettings
+from .. import testbedsettings, profiling
 from .. import captions
 from ..ppfig import save_figure, get_plotting_styles, getFontSize
 from ..pptex import color_to_latex, marker_to_latex, marker_to_html, writeLabels
@@ -419,6 +420,186 @@ def generateData(dataSet, target):
     return res
 
 
+def _plot_function(task):
+    """draw and save the scaling figure of a single function.
+
+    Called from `main` via `toolsdivers.parallel_map` with a tuple of
+    arguments, returns the algorithm list and line styles used for the
+    legend.
+    """
+    (f, dictFunc_f, target, plotting_style_list, default_styles,
+     sorted_algorithms, styles, funInfos, output_dir,
+     algorithms_with_data, algId) = task
+    filename = os.path.join(output_dir, 'ppfigs_f%03d' % (f))
+    key = toolsdivers.output_record_key(filename, task, sys.modules[__name__])
+    unchanged, legend_data = toolsdivers.load_output_record(
+        filename, key, ppfig.figure_file_names(filename))
+    if unchanged:
+        return legend_data
+
+    handles = []
+    for plotting_style in plotting_style_list:
+        algorithm_list = plotting_style.algorithm_list
+        line_styles = [d.copy() for d in default_styles]
+        fix_styles(plotting_style, line_styles)  #
+        for i, alg in enumerate(algorithm_list):
+            dictDim = dictFunc_f[alg].dictByDim()  # this does not look like the most obvious solution
+
+            #Collect data
+            dimert = []
+            ert = []
+            dimnbsucc = []
+            ynbsucc = []
+            nbsucc = []
+            dimmaxevals = []
+            maxevals = []
+            dimmedian = []
+            medianfes = []
+            for dim in sorted(dictDim):
+                assert len(dictDim[dim]) == 1
+                entry = dictDim[dim][0]
+                data = generateData(entry, target((f, dim))[0]) # TODO: here we might want a different target for each function
+                if 1 < 3 or data[2] == 0: # No success
+                    dimmaxevals.append(dim)
+                    maxevals.append(float(data[3])/dim)
+                if data[2] > 0:
+                    dimmedian.append(dim)
+                    medianfes.append(data[4]/dim)
+                    dimert.append(dim)
+                    ert.append(float(data[0])/dim)
+                    if data[1] < 1.:
+                        dimnbsucc.append(dim)
+                        ynbsucc.append(float(data[0])/dim)
+                        nbsucc.append('%d' % data[2])
+
+            # Draw lines
+            if 1 < 3:  # new version
+                # omit the line if a point in between is missing
+                for idim in range(len(dimert)):
+                    # plot line only if next dim < 2.1*dim (a hack)
+                    if idim < len(dimert) - 1 and dimert[idim + 1] < 2.1 * dimert[idim]:
+                        tmp = plt.plot(dimert[idim:idim+2], ert[idim:idim+2], **line_styles[i]) #label=alg, )
+                    else:  # plot remaining single points (some twice)
+                        tmp = plt.plot(dimert[idim], ert[idim], **line_styles[i]) #label=alg, )
+                    plt.setp(tmp[0], markeredgecolor=plt.getp(tmp[0], 'color'))
+            else:  # to be removed
+                tmp = plt.plot(dimert, ert, **line_styles[i]) #label=alg, )
+                plt.setp(tmp[0], markeredgecolor=plt.getp(tmp[0], 'color'))
+
+            # For legend
+            # tmp = plt.plot([], [], label=alg.replace('..' + os.sep, '').strip(os.sep), **line_styles[i])
+            algorithm_name = toolsdivers.str_to_latex(toolsdivers.strip_pathname1(alg))
+            if plotting_style.in_background:
+                algorithm_name = '_' + algorithm_name
+            tmp = plt.plot([], [], label=algorithm_name[:legend_text_max_len], **line_styles[i])
+            plt.setp(tmp[0], markersize=12.,
+                     markeredgecolor=plt.getp(tmp[0], 'color'))
+
+            if dimmaxevals:
+                tmp = plt.plot(dimmaxevals, maxevals, **line_styles[i])
+                plt.setp(tmp[0], markersize=20, #label=alg,
+                         markeredgecolor=plt.getp(tmp[0], 'color'),
+                         markeredgewidth=1,
+                         markerfacecolor='None', linestyle='None')
+
+            #tmp2 = plt.plot(dimmedian, medianfes, ls='', marker='+',
+            #               markersize=30, markeredgewidth=5,
+            #               markeredgecolor=plt.getp(tmp, 'color'))[0]
+            #for i, n in enumerate(nbsucc):
+            #    plt.text(dimnbsucc[i], numpy.array(ynbsucc[i])*1.85, n,
+            #             verticalalignment='bottom',
+            #             horizontalalignment='center')
+
+            if not plotting_style.in_background:
+                handles.append(tmp)
+                sorted_algorithms = plotting_style.algorithm_list
+                styles = line_styles
+
+    refalgentries = bestalg.load_reference_algorithm(testbedsettings.current_testbed.reference_algorithm_filename)
+
+    if refalgentries:        
+        refalgdata = []
+        dimrefalg = list(df[0] for df in refalgentries if df[1] == f)
+        dimrefalg.sort()
+        dimrefalg2 = []
+        for d in dimrefalg:
+            entry = refalgentries[(d, f)]
+            tmp = entry.detERT(target((f, d)))[0]
+            if numpy.isfinite(tmp):
+                refalgdata.append(float(tmp)/d)
+                dimrefalg2.append(d)
+
+        tmp = plt.plot(dimrefalg2, refalgdata, color=refcolor, linewidth=10,
+                       marker='d', markersize=25, markeredgecolor=refcolor, zorder=-1
+                       #label='best 2009', 
+                       )
+        handles.append(tmp)
+    
+    if show_significance: # plot significance-stars
+        xstar, ystar = [], []
+        dims = sorted(pproc.dictAlgByDim(dictFunc_f))
+        for i, dim in enumerate(dims):
+            datasets = pproc.dictAlgByDim(dictFunc_f)[dim]
+            assert all([len(datasets[ialg]) == 1 for ialg in sorted_algorithms if datasets[ialg]])
+            dsetlist =  [datasets[ialg][0] for ialg in sorted_algorithms if datasets[ialg]]
+            if len(dsetlist) > 1:
+                arzp, arialg = toolsstats.significance_all_best_vs_other(dsetlist, target((f, dim)))
+                if arzp[0][1] * len(dims) < show_significance:
+                    ert = dsetlist[arialg[0]].detERT(target((f, dim)))[0]
+                    if ert < numpy.inf: 
+                        xstar.append(dim)
+                        ystar.append(ert/dim)
+
+        plt.plot(xstar, ystar, '*',
+                 markerfacecolor='k',  # visible over light colors
+                 markeredgecolor='red',  # visible over dark colors
+                 markeredgewidth=0.7,
+                 markersize=styles[0]['markersize'])
+    
+    fontSize = getFontSize(funInfos.values())
+    if f in funInfos.keys():
+        plt.gca().set_title(funInfos[f], fontsize=0.9*fontSize)
+
+    functions_with_legend = testbedsettings.current_testbed.functions_with_legend
+    isLegend = False
+    if legend:
+        plotLegend(handles)
+    elif f in functions_with_legend and len(sorted_algorithms) < 1e6: # 6 elements at most in the boxed legend
+            isLegend = True
+
+    beautify(legend=isLegend, rightlegend=legend)
+
+    # bottom labels with #instances and type of targets:
+    infotext = ''
+    num_of_instances = []
+    for alg in algorithms_with_data:
+        if len(dictFunc_f[alg]) > 0:
+            num_of_instances.append(len((dictFunc_f[alg])[0].instancenumbers))
+        else:
+            warnings.warn('The data for algorithm %s and function %s are missing' % (alg, f))
+    # issue a warning if number of instances is inconsistant, otherwise
+    # display only the present number of instances, i.e. remove copies
+    if len(set(num_of_instances)) > 1:
+        warnings.warn('Number of instances inconsistent over all algorithms.')
+    num_of_instances = set(num_of_instances)
+    for n in num_of_instances:
+        infotext += '%d, ' % n
+
+    infotext = infotext.rstrip(', ')
+    infotext += ' instances\n'
+    infotext += 'target ' + target.label_name() + ': ' + target.label(0)
+    plt.text(plt.xlim()[0], plt.ylim()[0],
+             infotext, fontsize=fontsize, horizontalalignment="left",
+             verticalalignment="bottom")
+
+    save_figure(filename, algId)
+
+    plt.close()
+    toolsdivers.save_output_record(filename, key, (sorted_algorithms, styles))
+    return sorted_algorithms, styles
+
+
+@profiling.profiled('ppfigs.main')
 def main(dictAlg, html_file_prefix, sorted_algorithms=None, output_dir='ppdata', latex_commands_file=''):
     """From a DataSetList, returns figures showing the scaling: aRT/dim vs dim.
     
@@ -448,168 +629,13 @@ def main(dictAlg, html_file_prefix, sorted_algorithms=None, output_dir='ppdata',
     default_styles = [d.copy() for d in genericsettings.line_styles]
     if not os.path.isdir(output_dir):
         os.mkdir(output_dir)
-    for f in dictFunc:
-        filename = os.path.join(output_dir, 'ppfigs_f%03d' % (f))
-        handles = []
-        for plotting_style in plotting_style_list:
-            algorithm_list = plotting_style.algorithm_list
-            line_styles = [d.copy() for d in default_styles]
-            fix_styles(plotting_style, line_styles)  #
-            for i, alg in enumerate(algorithm_list):
-                dictDim = dictFunc[f][alg].dictByDim()  # this does not look like the most obvious solution
-
-                #Collect data
-                dimert = []
-                ert = []
-                dimnbsucc = []
-                ynbsucc = []
-                nbsucc = []
-                dimmaxevals = []
-                maxevals = []
-                dimmedian = []
-                medianfes = []
-                for dim in sorted(dictDim):
-                    assert len(dictDim[dim]) == 1
-                    entry = dictDim[dim][0]
-                    data = generateData(entry, target((f, dim))[0]) # TODO: here we might want a different target for each function
-                    if 1 < 3 or data[2] == 0: # No success
-                        dimmaxevals.append(dim)
-                        maxevals.append(float(data[3])/dim)
-                    if data[2] > 0:
-                        dimmedian.append(dim)
-                        medianfes.append(data[4]/dim)
-                        dimert.append(dim)
-                        ert.append(float(data[0])/dim)
-                        if data[1] < 1.:
-                            dimnbsucc.append(dim)
-                            ynbsucc.append(float(data[0])/dim)
-                            nbsucc.append('%d' % data[2])
-
-                # Draw lines
-                if 1 < 3:  # new version
-                    # omit the line if a point in between is missing
-                    for idim in range(len(dimert)):
-                        # plot line only if next dim < 2.1*dim (a hack)
-                        if idim < len(dimert) - 1 and dimert[idim + 1] < 2.1 * dimert[idim]:
-                            tmp = plt.plot(dimert[idim:idim+2], ert[idim:idim+2], **line_styles[i]) #label=alg, )
-                        else:  # plot remaining single points (some twice)
-                            tmp = plt.plot(dimert[idim], ert[idim], **line_styles[i]) #label=alg, )
-                        plt.setp(tmp[0], markeredgecolor=plt.getp(tmp[0], 'color'))
-                else:  # to be removed
-                    tmp = plt.plot(dimert, ert, **line_styles[i]) #label=alg, )
-                    plt.setp(tmp[0], markeredgecolor=plt.getp(tmp[0], 'color'))
-
-                # For legend
-                # tmp = plt.plot([], [], label=alg.replace('..' + os.sep, '').strip(os.sep), **line_styles[i])
-                algorithm_name = toolsdivers.str_to_latex(toolsdivers.strip_pathname1(alg))
-                if plotting_style.in_background:
-                    algorithm_name = '_' + algorithm_name
-                tmp = plt.plot([], [], label=algorithm_name[:legend_text_max_len], **line_styles[i])
-                plt.setp(tmp[0], markersize=12.,
-                         markeredgecolor=plt.getp(tmp[0], 'color'))
-
-                if dimmaxevals:
-                    tmp = plt.plot(dimmaxevals, maxevals, **line_styles[i])
-                    plt.setp(tmp[0], markersize=20, #label=alg,
-                             markeredgecolor=plt.getp(tmp[0], 'color'),
-                             markeredgewidth=1,
-                             markerfacecolor='None', linestyle='None')
-
-                #tmp2 = plt.plot(dimmedian, medianfes, ls='', marker='+',
-                #               markersize=30, markeredgewidth=5,
-                #               markeredgecolor=plt.getp(tmp, 'color'))[0]
-                #for i, n in enumerate(nbsucc):
-                #    plt.text(dimnbsucc[i], numpy.array(ynbsucc[i])*1.85, n,
-                #             verticalalignment='bottom',
-                #             horizontalalignment='center')
-
-                if not plotting_style.in_background:
-                    handles.append(tmp)
-                    sorted_algorithms = plotting_style.algorithm_list
-                    styles = line_styles
-
-        refalgentries = bestalg.load_reference_algorithm(testbedsettings.current_testbed.reference_algorithm_filename)
-
-        if refalgentries:        
-            refalgdata = []
-            dimrefalg = list(df[0] for df in refalgentries if df[1] == f)
-            dimrefalg.sort()
-            dimrefalg2 = []
-            for d in dimrefalg:
-                entry = refalgentries[(d, f)]
-                tmp = entry.detERT(target((f, d)))[0]
-                if numpy.isfinite(tmp):
-                    refalgdata.append(float(tmp)/d)
-                    dimrefalg2.append(d)
-    
-            tmp = plt.plot(dimrefalg2, refalgdata, color=refcolor, linewidth=10,
-                           marker='d', markersize=25, markeredgecolor=refcolor, zorder=-1
-                           #label='best 2009', 
-                           )
-            handles.append(tmp)
-        
-        if show_significance: # plot significance-stars
-            xstar, ystar = [], []
-            dims = sorted(pproc.dictAlgByDim(dictFunc[f]))
-            for i, dim in enumerate(dims):
-                datasets = pproc.dictAlgByDim(dictFunc[f])[dim]
-                assert all([len(datasets[ialg]) == 1 for ialg in sorted_algorithms if datasets[ialg]])
-                dsetlist =  [datasets[ialg][0] for ialg in sorted_algorithms if datasets[ialg]]
-                if len(dsetlist) > 1:
-                    arzp, arialg = toolsstats.significance_all_best_vs_other(dsetlist, target((f, dim)))
-                    if arzp[0][1] * len(dims) < show_significance:
-                        ert = dsetlist[arialg[0]].detERT(target((f, dim)))[0]
-                        if ert < numpy.inf: 
-                            xstar.append(dim)
-                            ystar.append(ert/dim)
-
-            plt.plot(xstar, ystar, '*',
-                     markerfacecolor='k',  # visible over light colors
-                     markeredgecolor='red',  # visible over dark colors
-                     markeredgewidth=0.7,
-                     markersize=styles[0]['markersize'])
-        
-        fontSize = getFontSize(funInfos.values())
-        if f in funInfos.keys():
-            plt.gca().set_title(funInfos[f], fontsize=0.9*fontSize)
-
-        functions_with_legend = testbedsettings.current_testbed.functions_with_legend
-        isLegend = False
-        if legend:
-            plotLegend(handles)
-        elif f in functions_with_legend and len(sorted_algorithms) < 1e6: # 6 elements at most in the boxed legend
-                isLegend = True
-
-        beautify(legend=isLegend, rightlegend=legend)
-
-        # bottom labels with #instances and type of targets:
-        infotext = ''
-        algorithms_with_data = [a for a in dictAlg.keys() if dictAlg[a] != []]
-        
-        num_of_instances = []
-        for alg in algorithms_with_data:
-            if len(dictFunc[f][alg]) > 0:
-                num_of_instances.append(len((dictFunc[f][alg])[0].instancenumbers))
-            else:
-                warnings.warn('The data for algorithm %s and function %s are missing' % (alg, f))
-        # issue a warning if number of instances is inconsistant, otherwise
-        # display only the present number of instances, i.e. remove copies
-        if len(set(num_of_instances)) > 1:
-            warnings.warn('Number of instances inconsistent over all algorithms.')
-        num_of_instances = set(num_of_instances)
-        for n in num_of_instances:
-            infotext += '%d, ' % n
-
-        infotext = infotext.rstrip(', ')
-        infotext += ' instances\n'
-        infotext += 'target ' + target.label_name() + ': ' + target.label(0)
-        plt.text(plt.xlim()[0], plt.ylim()[0],
-                 infotext, fontsize=fontsize, horizontalalignment="left",
-                 verticalalignment="bottom")
-
-        save_figure(filename, dictAlg[algorithms_with_data[0]][0].algId)
-
-        plt.close()
+    algorithms_with_data = [a for a in dictAlg.keys() if dictAlg[a] != []]
+    tasks = [(f, dictFunc[f], target, plotting_style_list, default_styles,
+              sorted_algorithms, styles, funInfos, output_dir,
+              algorithms_with_data, dictAlg[algorithms_with_data[0]][0].algId)
+             for f in dictFunc]
+    for sorted_algorithms, styles in toolsdivers.parallel_map(_plot_function, tasks):
+        pass  # figures are saved, keep the legend data of the last figure
 
     htmlFile = os.path.join(output_dir, html_file_prefix + '.html')
     # generate commands in tex file:
@@ -641,7 +667,7 @@ def main(dictAlg, html_file_prefix, sorted_algorithms=None, output_dir='ppdata',
         toolsdivers.replace_in_file(htmlFile, '##bbobppfigslegend##', scaling_figure_caption(True) + 'Legend: ' + alg_definitions_html)
 
         if genericsettings.verbose:
-            print('Wrote commands and legend to %s' % filename)
+            print('Wrote commands and legend to %s' % latex_commands_file)
 
         # this is obsolete (however check templates)
         filename = os.path.join(output_dir, 'ppfigs.tex')
@@ -159,7 +159,9 @@ def plot(dsList, dsref, targets=defaulttargets, istoolsstats=False, **kwargs):
                 if len(runlengthsucc) > 0:
                     x = toolsstats.drawSP(runlengthsucc, runlengthunsucc,
                                          percentiles=[50],
-                                         samplesize=perfprofsamplesize)[1]
+                                         samplesize=perfprofsamplesize,
+                                         rng=toolsstats.task_random_state(
+                                             entry.algId, entry.funcId, entry.dim, t))[1]
                 data.extend(i/normalizer for i in x)
             else:
                 x = entry.detERT([t])[0]
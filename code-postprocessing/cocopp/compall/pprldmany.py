@@ -31,11 +31,12 @@ function evaluations of unsuccessful runs divided by dimension.
 from __future__ import absolute_import, print_function
 
 import os
+import sys
 import warnings
 from pdb import set_trace
 import numpy as np
 import matplotlib.pyplot as plt
-from .. import toolsstats, bestalg, genericsettings, testbedsettings
+from .. import toolsstats, bestalg, genericsettings, testbedsettings, derivedstats, profiling
 from .. import pproc as pp  # import dictAlgByDim, dictAlgByFun
 from .. import toolsdivers  # strip_pathname, str_to_latex
 from .. import pprldistr  # plotECDF, beautifyECDF
@@ -57,12 +58,15 @@ median_max_evals_marker_format = ['x', 24, 3]
 label_fontsize = 17
 title_fontsize = 20
 styles = [d.copy() for d in genericsettings.line_styles]  # deep copy
+_reference_samples_cache = {}  # samples of the reference algorithm, see `_reference_samples`
+_reference_samples_cache_size = 1000  # maximal number of entries in `_reference_samples_cache`
 
 refcolor = 'wheat'
 """color of reference (best) algorithm"""
 
 save_figure = True
 close_figure = True
+save_html = True  # write the html page of `PlotType.DIM` figures
 
 # TODO: update the list below which are not relevant anymore
 
@@ -408,17 +412,10 @@ def plot(dsList, targets=None, craftingeffort=0., **kwargs):
     data = []
     maxevals = []
     for entry in dsList:
-        for t in targets((entry.funcId, entry.dim)):
-            divisor = entry.dim if divide_by_dimension else 1
-            x = [np.inf] * perfprofsamplesize
-            runlengthunsucc = []
-            evals = entry.detEvals([t])[0]
-            runlengthsucc = evals[np.isnan(evals) == False] / divisor
-            runlengthunsucc = entry.maxevals[np.isnan(evals)] / divisor
-            if len(runlengthsucc) > 0:
-                x = toolsstats.drawSP(runlengthsucc, runlengthunsucc,
-                                      percentiles=[50],
-                                      samplesize=perfprofsamplesize)[1]
+        divisor = entry.dim if divide_by_dimension else 1
+        for x, runlengthunsucc in _ecdf_samples(
+                (entry, targets((entry.funcId, entry.dim)), divisor,
+                 perfprofsamplesize)):
             data.extend(x)
             maxevals.extend(runlengthunsucc)
 
@@ -447,6 +444,100 @@ def plot(dsList, targets=None, craftingeffort=0., **kwargs):
     return res
 
 
+def _ecdf_samples(task):
+    """return for each target a tuple of the bootstrapped simulated run
+    lengths and the run lengths of the unsuccessful runs.
+
+    ``task == (entry, targets, divisor, samplesize)``, where `entry` is
+    a `DataSet` and run lengths are divided by `divisor`. The
+    evaluations for all targets are determined at once.
+    """
+    entry, targets, divisor, samplesize = task
+    res = []
+    for t, evals in zip(targets, entry.detEvals(targets)):
+        x = [np.inf] * samplesize
+        runlengthsucc = evals[np.isnan(evals) == False] / divisor
+        runlengthunsucc = entry.maxevals[np.isnan(evals)] / divisor
+        if len(runlengthsucc) > 0:
+            x = toolsstats.drawSP(runlengthsucc, runlengthunsucc,
+                                  percentiles=[50],
+                                  samplesize=samplesize,
+                                  rng=toolsstats.task_random_state(
+                                      entry.algId, entry.funcId, entry.dim, t))[1]
+        res.append((x, runlengthunsucc))
+    return res
+
+
+def _ecdf_samples_key(task):
+    """return the key of the result of `_ecdf_samples` for `task` in
+    `derivedstats`"""
+    entry, targets, divisor, samplesize = task
+    return ('pprldmany', tuple(targets), divisor, samplesize,
+            toolsstats._root_seed)
+
+
+def _reference_samples(refalgentry, f, dim, targets, divisor):
+    """return for each target a tuple of the bootstrapped simulated run
+    lengths and the run lengths of the unsuccessful runs of the
+    reference algorithm data set `refalgentry`, like `_ecdf_samples`.
+
+    The samples are kept in memory and, if a seed is set with
+    `toolsstats.set_seed`, stored along with the reference algorithm
+    data, see `bestalg.set_reference_algorithm_cache_item`.
+    """
+    cache_key = ('pprldmany', f, dim, tuple(targets), divisor,
+                 perfprofsamplesize, toolsstats._root_seed)
+    key = (testbedsettings.current_testbed.reference_algorithm_filename,
+           refalgentry.algId) + cache_key
+    if key in _reference_samples_cache:
+        return _reference_samples_cache[key]
+    if toolsstats._root_seed is not None:
+        res = bestalg.get_reference_algorithm_cache_item(cache_key)
+        if res is not None:
+            _remember_reference_samples(key, res)
+            return res
+
+    res = []
+    refalgevals = refalgentry.detEvals(targets)
+    # print(refalgevals)
+    for j in range(len(refalgevals[0])):
+        if refalgevals[1][j]:
+            evals = refalgevals[0][j]
+            # set_trace()
+            assert dim == refalgentry.dim
+            runlengthsucc = evals[np.isnan(evals) == False] / divisor
+            runlengthunsucc = refalgentry.maxevals[refalgevals[1][j]][np.isnan(evals)] / divisor
+            x = toolsstats.drawSP(runlengthsucc, runlengthunsucc,
+                                  percentiles=[50],
+                                  samplesize=perfprofsamplesize,
+                                  rng=toolsstats.task_random_state(
+                                      refalgentry.algId, f, dim,
+                                      targets[j]))[1]
+        else:
+            x = perfprofsamplesize * [np.inf]
+            runlengthunsucc = []
+        res.append((np.asarray(x), runlengthunsucc))
+    _remember_reference_samples(key, res)
+    if toolsstats._root_seed is not None:
+        bestalg.set_reference_algorithm_cache_item(cache_key, res, save=False)
+    return res
+
+
+def _remember_reference_samples(key, samples):
+    """keep `samples` in `_reference_samples_cache`, remove an entry
+    first if the cache has `_reference_samples_cache_size` entries"""
+    if len(_reference_samples_cache) >= _reference_samples_cache_size:
+        _reference_samples_cache.pop(next(iter(_reference_samples_cache)))
+    _reference_samples_cache[key] = samples
+
+
+def _clear_reference_samples_cache():
+    """clear the samples of the previous reference algorithm"""
+    _reference_samples_cache.clear()
+
+bestalg._reset_callbacks.append(_clear_reference_samples_cache)
+
+
 def all_single_functions(dict_alg, is_single_algorithm, sorted_algs=None,
                          output_dir='.', parent_html_file_name=None, settings=genericsettings):
     single_fct_output_dir = (output_dir.rstrip(os.sep) + os.sep +
@@ -456,47 +547,47 @@ def all_single_functions(dict_alg, is_single_algorithm, sorted_algs=None,
     if not os.path.exists(single_fct_output_dir):
         os.makedirs(single_fct_output_dir)
 
+    # keyword arguments of the figures to be drawn by `main`, `settings`
+    # is not passed on as a module cannot be sent to worker processes
+    tasks = []
+
     if is_single_algorithm:
-        main(dict_alg,
-             order=sorted_algs,
-             outputdir=single_fct_output_dir,
-             info='',
-             parentHtmlFileName=parent_html_file_name,
-             plotType=PlotType.DIM,
-             settings=settings)
+        tasks.append(dict(dictAlg=dict_alg,
+                          order=sorted_algs,
+                          outputdir=single_fct_output_dir,
+                          info='',
+                          parentHtmlFileName=parent_html_file_name,
+                          plotType=PlotType.DIM))
 
         dictFG = pp.dictAlgByFuncGroup(dict_alg)
         for fg, entries in sorted(dictFG.items()):
-            main(entries,
-                 order=sorted_algs,
-                 outputdir=single_fct_output_dir,
-                 info='%s' % (fg),
-                 parentHtmlFileName=parent_html_file_name,
-                 plotType=PlotType.DIM,
-                 settings=settings)
+            tasks.append(dict(dictAlg=entries,
+                              order=sorted_algs,
+                              outputdir=single_fct_output_dir,
+                              info='%s' % (fg),
+                              parentHtmlFileName=parent_html_file_name,
+                              plotType=PlotType.DIM))
 
     dictFG = pp.dictAlgByFun(dict_alg)
     for fg, tempDictAlg in sorted(dictFG.items()):
 
         if is_single_algorithm:
-            main(tempDictAlg,
-                 order=sorted_algs,
-                 outputdir=single_fct_output_dir,
-                 info='f%03d' % (fg),
-                 parentHtmlFileName=parent_html_file_name,
-                 plotType=PlotType.DIM,
-                 settings=settings)
+            tasks.append(dict(dictAlg=tempDictAlg,
+                              order=sorted_algs,
+                              outputdir=single_fct_output_dir,
+                              info='f%03d' % (fg),
+                              parentHtmlFileName=parent_html_file_name,
+                              plotType=PlotType.DIM))
         else:
             dictDim = pp.dictAlgByDim(tempDictAlg)
             dims = sorted(dictDim)
             for i, d in enumerate(dims):
                 entries = dictDim[d]
-                main(entries,
-                     order=sorted_algs,
-                     outputdir=single_fct_output_dir,
-                     info='f%03d_%02dD' % (fg, d),
-                     parentHtmlFileName=parent_html_file_name,
-                     settings=settings)
+                tasks.append(dict(dictAlg=entries,
+                                  order=sorted_algs,
+                                  outputdir=single_fct_output_dir,
+                                  info='f%03d_%02dD' % (fg, d),
+                                  parentHtmlFileName=parent_html_file_name))
 
             ppfig.save_single_functions_html(
                 os.path.join(single_fct_output_dir, genericsettings.pprldmany_file_name),
@@ -517,13 +608,12 @@ def all_single_functions(dict_alg, is_single_algorithm, sorted_algs=None,
             next_dim = dims[i+1] if i + 1 < len(dims) else dims[0]
             dictFG = pp.dictAlgByFuncGroup(tempDictAlg)
             for fg, entries in sorted(dictFG.items()):
-                main(entries,
-                     order=sorted_algs,
-                     outputdir=single_fct_output_dir,
-                     info='gr_%s_%02dD' % (fg, d),
-                     parentHtmlFileName=parent_html_file_name,
-                     plotType=PlotType.FUNC,
-                     settings=settings)
+                tasks.append(dict(dictAlg=entries,
+                                  order=sorted_algs,
+                                  outputdir=single_fct_output_dir,
+                                  info='gr_%s_%02dD' % (fg, d),
+                                  parentHtmlFileName=parent_html_file_name,
+                                  plotType=PlotType.FUNC))
 
         ppfig.save_single_functions_html(
             os.path.join(single_fct_output_dir, genericsettings.pprldmany_group_file_name),
@@ -534,7 +624,51 @@ def all_single_functions(dict_alg, is_single_algorithm, sorted_algs=None,
             parentFileName='../%s' % parent_html_file_name if parent_html_file_name else None
         )
 
+    list(toolsdivers.parallel_map(_main, tasks))
+    if is_single_algorithm and save_figure and save_html:
+        _save_dim_html(single_fct_output_dir, parent_html_file_name)
+
+
+def _main(kwargs):
+    """call `main` with keyword arguments `kwargs`, used in
+    `all_single_functions` via `toolsdivers.parallel_map`.
+
+    The html page is written only once by the caller, because
+    concurrent workers would overwrite each others html files. Figures
+    with unchanged inputs are not drawn again.
+    """
+    global save_html, x_limit
+    if x_limit is None:  # as in `main`, but before the inputs are hashed
+        x_limit = x_limit_default
+    info = kwargs.get('info', 'default')
+    filename = os.path.join(kwargs.get('outputdir', '.'),
+                            '%s_%s' % (genericsettings.pprldmany_file_name, info)
+                            if info else genericsettings.pprldmany_file_name)
+    key = toolsdivers.output_record_key(filename, kwargs, sys.modules[__name__],
+                                        toolsstats._root_seed)
+    if toolsdivers.load_output_record(
+            filename, key, ppfig.figure_file_names(filename) + [filename + '.tex'])[0]:
+        return
+    save_html, _save_html = False, save_html
+    try:
+        main(**kwargs)
+    finally:
+        save_html = _save_html
+    toolsdivers.save_output_record(filename, key)
+
+
+def _save_dim_html(outputdir, parentHtmlFileName):
+    """write the html page of the `PlotType.DIM` figures in `outputdir`"""
+    file_name = genericsettings.pprldmany_file_name
+    ppfig.save_single_functions_html(
+        os.path.join(outputdir, file_name),
+        '',  # algorithms names are clearly visible in the figure
+        htmlPage=ppfig.HtmlPage.NON_SPECIFIED,
+        parentFileName='../%s' % parentHtmlFileName if parentHtmlFileName else None,
+        header=ppfig.pprldmany_per_func_dim_header)
 
+
+@profiling.profiled('pprldmany.main')
 def main(dictAlg, order=None, outputdir='.', info='default',
          dimension=None, parentHtmlFileName=None, plotType=PlotType.ALG, settings = genericsettings):
     """Generates a figure showing the performance of algorithms.
@@ -611,73 +745,83 @@ def main(dictAlg, order=None, outputdir='.', info='default',
 
     dictDimList = pp.dictAlgByDim(dictAlg)
     dims = sorted(dictDimList)
-    for i, dim in enumerate(dims):
-        divisor = dim if divide_by_dimension else 1
 
-        dictDim = dictDimList[dim]
-        dictFunc = pp.dictAlgByFun(dictDim)
+    # compute the samples of all (dimension, function, algorithm) triples
+    # first, in parallel if genericsettings.jobs > 1, and reuse stored
+    # samples when they can be reproduced with a seed
+    problems = []
+    samples = {}
+    keys, tasks = [], []
+    for dim in dims:
+        divisor = dim if divide_by_dimension else 1
+        dictFunc = pp.dictAlgByFun(dictDimList[dim])
         for f, dictAlgperFunc in sorted(dictFunc.items()):
-            # print(target_values((f, dim)))
-            for j, t in enumerate(target_values((f, dim))):
-                # for j, t in enumerate(testbedsettings.current_testbed.ecdf_target_values(1e2, f)):
-                # funcsolved[j].add(f)
-
-                for alg in sorted(algorithms_with_data):
-                    x = [np.inf] * perfprofsamplesize
-                    runlengthunsucc = []
-                    try:
-                        entry = dictAlgperFunc[alg][0]  # one element per fun and per dim.
-                        evals = entry.detEvals([t])[0]
-                        assert entry.dim == dim
-                        runlengthsucc = evals[np.isnan(evals) == False] / divisor
-                        runlengthunsucc = entry.maxevals[np.isnan(evals)] / divisor
-                        if len(runlengthsucc) > 0:
-                            x = toolsstats.drawSP(runlengthsucc, runlengthunsucc,
-                                                  percentiles=[50],
-                                                  samplesize=perfprofsamplesize)[1]
-                    except (KeyError, IndexError):
-                        # set_trace()
-                        warntxt = ('Data for algorithm %s on function %d in %d-D '
-                                   % (alg, f, dim)
-                                   + 'are missing.\n')
-                        warnings.warn(warntxt)
-
-                    keyValue = alg
-                    if plotType == PlotType.DIM:
-                        keyValue = '%d-D' % (dim)
-                        if keyValue not in order:
-                            order.append(keyValue)
-                    elif plotType == PlotType.FUNC:
-                        keyValue = 'f%d' % (f)
-                    dictData.setdefault(keyValue, []).extend(x)
-                    dictMaxEvals.setdefault(keyValue, []).extend(runlengthunsucc)
-
-            displaybest = plotType == PlotType.ALG
-            if displaybest:
-                # set_trace()
-                refalgentries = bestalg.load_reference_algorithm(testbedsettings.current_testbed.reference_algorithm_filename)
+            targets = target_values((f, dim))
+            problems.append((dim, f, targets))
+            for alg in algorithms_with_data:
+                try:
+                    entry = dictAlgperFunc[alg][0]  # one element per fun and per dim.
+                except (KeyError, IndexError):
+                    continue
+                assert entry.dim == dim
+                task = (entry, targets, divisor, perfprofsamplesize)
+                if toolsstats._root_seed is not None:
+                    stored = derivedstats.lookup(entry, _ecdf_samples_key(task))
+                    if stored is not None:
+                        samples[(dim, f, alg)] = stored
+                        continue
+                keys.append((dim, f, alg))
+                tasks.append(task)
+    for key, task, res in zip(keys, tasks,
+                              toolsdivers.parallel_map(_ecdf_samples, tasks)):
+        samples[key] = res
+        if toolsstats._root_seed is not None:
+            derivedstats.store(task[0], _ecdf_samples_key(task), res)
+    derivedstats.save()
+
+    for dim, f, targets in problems:
+        divisor = dim if divide_by_dimension else 1
+        for j, t in enumerate(targets):
+            # for j, t in enumerate(testbedsettings.current_testbed.ecdf_target_values(1e2, f)):
+            # funcsolved[j].add(f)
 
-                if not refalgentries:
-                    displaybest = False
-                else:
-                    refalgentry = refalgentries[(dim, f)]
-                    refalgevals = refalgentry.detEvals(target_values((f, dim)))
-                    # print(refalgevals)
-                    for j in range(len(refalgevals[0])):
-                        if refalgevals[1][j]:
-                            evals = refalgevals[0][j]
-                            # set_trace()
-                            assert dim == refalgentry.dim
-                            runlengthsucc = evals[np.isnan(evals) == False] / divisor
-                            runlengthunsucc = refalgentry.maxevals[refalgevals[1][j]][np.isnan(evals)] / divisor
-                            x = toolsstats.drawSP(runlengthsucc, runlengthunsucc,
-                                                  percentiles=[50],
-                                                  samplesize=perfprofsamplesize)[1]
-                        else:
-                            x = perfprofsamplesize * [np.inf]
-                            runlengthunsucc = []
-                        xbest.extend(x)
-                        maxevalsbest.extend(runlengthunsucc)
+            for alg in sorted(algorithms_with_data):
+                x = [np.inf] * perfprofsamplesize
+                runlengthunsucc = []
+                try:
+                    x, runlengthunsucc = samples[(dim, f, alg)][j]
+                except KeyError:
+                    # set_trace()
+                    warntxt = ('Data for algorithm %s on function %d in %d-D '
+                               % (alg, f, dim)
+                               + 'are missing.\n')
+                    warnings.warn(warntxt)
+
+                keyValue = alg
+                if plotType == PlotType.DIM:
+                    keyValue = '%d-D' % (dim)
+                    if keyValue not in order:
+                        order.append(keyValue)
+                elif plotType == PlotType.FUNC:
+                    keyValue = 'f%d' % (f)
+                dictData.setdefault(keyValue, []).extend(x)
+                dictMaxEvals.setdefault(keyValue, []).extend(runlengthunsucc)
+
+        displaybest = plotType == PlotType.ALG
+        if displaybest:
+            # set_trace()
+            refalgentries = bestalg.load_reference_algorithm(testbedsettings.current_testbed.reference_algorithm_filename)
+
+            if not refalgentries:
+                displaybest = False
+            else:
+                for x, runlengthunsucc in _reference_samples(
+                        refalgentries[(dim, f)], f, dim, targets, divisor):
+                    xbest.extend(x)
+                    maxevalsbest.extend(runlengthunsucc)
+
+    if displaybest:  # store newly computed reference samples at once
+        bestalg.save_reference_algorithm_cache()
 
     if order is None:
         order = dictData.keys()
@@ -845,14 +989,8 @@ def main(dictAlg, order=None, outputdir='.', info='default',
         ppfig.save_figure(figureName,
                           dictAlg[algorithms_with_data[0]][0].algId,
                           layout_rect=(0, 0, 0.88, 1))
-        if plotType == PlotType.DIM:
-            file_name = genericsettings.pprldmany_file_name
-            ppfig.save_single_functions_html(
-                os.path.join(outputdir, file_name),
-                '',  # algorithms names are clearly visible in the figure
-                htmlPage=ppfig.HtmlPage.NON_SPECIFIED,
-                parentFileName='../%s' % parentHtmlFileName if parentHtmlFileName else None,
-                header=ppfig.pprldmany_per_func_dim_header)
+        if plotType == PlotType.DIM and save_html:
+            _save_dim_html(outputdir, parentHtmlFileName)
 
     if close_figure:
         plt.close()
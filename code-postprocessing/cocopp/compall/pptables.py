@@ -10,6 +10,7 @@ import warnings
 import numpy
 
 from .. import genericsettings, bestalg, toolsstats, pproc, ppfigparam, testbedsettings, captions, ppfig
+from .. import derivedstats, profiling, toolsdivers
 from ..pptex import writeFEvals2, writeFEvalsMaxPrec, tableXLaTeX, numtotext
 from ..toolsstats import significancetest, significance_all_best_vs_other
 from ..toolsdivers import str_to_latex, strip_pathname1, replace_in_file, get_version_label, prepend_to_file
@@ -243,7 +244,67 @@ def get_top_indices_of_columns(table, max_rank=None):
     return ranked
 
 
+def _entry_statistics(entry, targets, targetf):
+    """return evaluations, aRTs and dispersions of `entry` for `targets`
+    and the number of successful and of all runs for `targetf`.
+
+    With a seed set, see `toolsstats.set_seed`, the results are
+    reproducible and hence taken from or put into `derivedstats`.
+    """
+    key = ('pptables', tuple(targets), targetf, samplesize,
+           toolsstats._root_seed)
+    if toolsstats._root_seed is not None:
+        res = derivedstats.lookup(entry, key)
+        if res is not None:
+            return res
+    evals = entry.detEvals(targets)
+    tmpdisp = []
+    tmpert = []
+    for i, e in enumerate(evals):
+        succ = (numpy.isnan(e) == False)
+        ec = e.copy()  # note: here was the previous bug (changes made in e also appeared in evals !)
+        ec[succ == False] = entry.maxevals[succ == False]
+        ert = toolsstats.sp(ec, issuccessful=succ)[0]
+        if succ.any():
+            tmp = toolsstats.drawSP(ec[succ], entry.maxevals[succ == False],
+                                    [10, 50, 90], samplesize=samplesize,
+                                    rng=toolsstats.task_random_state(
+                                        entry.algId, entry.funcId, entry.dim, targets[i]))[0]
+            tmpdisp.append((tmp[-1] - tmp[0]) / 2.)
+        else:
+            tmpdisp.append(numpy.nan)
+        tmpert.append(ert)
+
+    # determine success probability for Df = 1e-8
+    e = entry.detEvals((targetf,))[0]
+    res = (evals, tmpert, tmpdisp, numpy.sum(numpy.isnan(e) == False), len(e))
+    if toolsstats._root_seed is not None:
+        derivedstats.store(entry, key, res)
+    return res
+
+
+def _insert_table_html(output_dir, dim, res):
+    """insert the html table `res` for dimension `dim` into the
+    pptables html file in `output_dir` and return the file name"""
+    filename = os.path.join(output_dir, genericsettings.pptables_file_name + '.html')
+    lines = []
+    html_string = '<!--pptablesHtml_%d-->' % dim
+    with open(filename) as infile:
+        for line in infile:
+            if html_string in line:
+                lines.append(res)
+            lines.append(line)
+
+    with open(filename, 'w') as outfile:
+        for line in lines:
+            outfile.write(line)
+
+    replace_in_file(filename, '??COCOVERSION??', '<br />Data produced with COCO %s' % (get_version_label(None)))
+    return filename
+
+
 # TODO: function_headings argument need to be tested, default should be changed according to templates
+@profiling.profiled('pptables.main')
 def main(dict_alg, sorted_algs, output_dir='.', function_targets_line=True, latex_commands_file=''):  # [1, 13, 101]
     """Generate one table per func with results of multiple algorithms."""
     """Difference with the first version:
@@ -294,6 +355,23 @@ def main(dict_alg, sorted_algs, output_dir='.', function_targets_line=True, late
         else:
             targetf = testbed.pptable_ftarget
 
+        with_targets_line = (function_targets_line is True or
+                             (function_targets_line and df[1] in function_targets_line))
+        record_file = os.path.join(output_dir, 'pptables_f%03d_%02dD' % (df[1], df[0]))
+        record_key = toolsdivers.output_record_key(
+            record_file, [dict_data[df][n] for n in sorted(dict_data[df])],
+            [sorted_algs[n] for n in sorted(dict_data[df])], targets, targetf, nbtests,
+            refalgentries[df] if refalgentries else None, with_targets_line,
+            sys.modules[__name__], toolsstats._root_seed)
+        unchanged, record = toolsdivers.load_output_record(record_file, record_key,
+                                                           [record_file + '.tex'])
+        if unchanged:  # the tex file is up to date, restore what the other outputs need
+            res, additional_commands, spec = record[:3]
+            if with_targets_line:
+                tables_header = record[3]
+            _insert_table_html(output_dir, df[0], res)
+            continue
+
         # reference algorithm
         if refalgentries:
             refalgentry = refalgentries[df]
@@ -330,23 +408,8 @@ def main(dict_alg, sorted_algs, output_dir='.', function_targets_line=True, late
 
             algnames.append(sorted_algs[n])
 
-            evals = entry.detEvals(targets)
-            # tmpdata = []
-            tmpdisp = []
-            tmpert = []
-            for i, e in enumerate(evals):
-                succ = (numpy.isnan(e) == False)
-                ec = e.copy()  # note: here was the previous bug (changes made in e also appeared in evals !)
-                ec[succ == False] = entry.maxevals[succ == False]
-                ert = toolsstats.sp(ec, issuccessful=succ)[0]
-                # tmpdata.append(ert/refalgert[i])
-                if succ.any():
-                    tmp = toolsstats.drawSP(ec[succ], entry.maxevals[succ == False],
-                                            [10, 50, 90], samplesize=samplesize)[0]
-                    tmpdisp.append((tmp[-1] - tmp[0]) / 2.)
-                else:
-                    tmpdisp.append(numpy.nan)
-                tmpert.append(ert)
+            evals, tmpert, tmpdisp, nbsucc, nbruns = _entry_statistics(
+                entry, targets, targetf)
             algerts.append(tmpert)
             algevals.append(evals)
             # algdata.append(tmpdata)
@@ -356,13 +419,20 @@ def main(dict_alg, sorted_algs, output_dir='.', function_targets_line=True, late
             # algmedmaxevals.append(numpy.median(entry.maxevals)/df[0])
             # algmedfinalfunvals.append(numpy.median(entry.finalfunvals))
 
-            if refalgentries:
-                algtestres.append(significancetest(refalgentry, entry, targets))
-
-            # determine success probability for Df = 1e-8
-            e = entry.detEvals((targetf,))[0]
-            algnbsucc.append(numpy.sum(numpy.isnan(e) == False))
-            algnbruns.append(len(e))
+            if refalgentries:  # stored only with a seed, like `_entry_statistics`
+                key = ('pptables significance', refalgentry.fingerprint(),
+                       tuple(targets))
+                testres = None
+                if toolsstats._root_seed is not None:
+                    testres = derivedstats.lookup(entry, key)
+                if testres is None:
+                    testres = significancetest(refalgentry, entry, targets)
+                    if toolsstats._root_seed is not None:
+                        derivedstats.store(entry, key, testres)
+                algtestres.append(testres)
+
+            algnbsucc.append(nbsucc)
+            algnbruns.append(nbruns)
 
         # Process over all data
         # find best values...
@@ -401,7 +471,7 @@ def main(dict_alg, sorted_algs, output_dir='.', function_targets_line=True, late
             extraeol.append('')
 
         # generate line with displayed quality indicator and targets:
-        if function_targets_line is True or (function_targets_line and df[1] in function_targets_line):
+        if with_targets_line:
             if isinstance(targets_of_interest, pproc.RunlengthBasedTargetValues):
                 curline = [r'\#FEs/D']
                 counter = 1
@@ -677,21 +747,9 @@ def main(dict_alg, sorted_algs, output_dir='.', function_targets_line=True, late
             res = "".join(str(item) for item in tableHtml)
             res = '\n<table class=\"sortable\" style=\"width:800px \">\n%s</table>\n<p/>\n' % res
 
-            if True:
-                filename = os.path.join(output_dir, genericsettings.pptables_file_name + '.html')
-                lines = []
-                html_string = '<!--pptablesHtml_%d-->' % df[0]
-                with open(filename) as infile:
-                    for line in infile:
-                        if html_string in line:
-                            lines.append(res)
-                        lines.append(line)
-
-                with open(filename, 'w') as outfile:
-                    for line in lines:
-                        outfile.write(line)
-                
-                replace_in_file(filename, '??COCOVERSION??', '<br />Data produced with COCO %s' % (get_version_label(None)))
+            filename = _insert_table_html(output_dir, df[0], res)
+            toolsdivers.save_output_record(record_file, record_key,
+                                           (res, additional_commands, spec, tables_header))
 
             if genericsettings.verbose:
                 print('Wrote table in %s' % filename)
@@ -701,6 +759,7 @@ def main(dict_alg, sorted_algs, output_dir='.', function_targets_line=True, late
             f.close()
             # TODO: return status
 
+    derivedstats.save()
     if len(additional_commands) > 0:
         for command in additional_commands:
             prepend_to_file(latex_commands_file, [command])
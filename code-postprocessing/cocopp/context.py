@@ -0,0 +1,225 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Processing context of the post-processing.
+
+The state of a post-processing, like the settings in `genericsettings`,
+the current testbed and data format, the loaded reference algorithm and
+the settings and intermediate values of the plotting modules, lives in
+module attributes. A `Context` holds a copy of all of this state.
+
+A `Context` is created as a snapshot of the current state. Within a
+``with`` block, the state of the context is the current state of the
+process. On exit, changes are kept in the context and the previous
+state is restored. As only one context can be current at a time,
+entering a context waits until other threads have left theirs. Hence
+post-processings in concurrent threads do not interfere with each
+other, though they do not run in parallel::
+
+    >>> import cocopp
+    >>> from cocopp import genericsettings
+    >>> from cocopp.context import Context
+    >>> c = Context()
+    >>> with c:
+    ...     genericsettings.verbose = 'changed'
+    >>> genericsettings.verbose == 'changed'
+    False
+    >>> with c:
+    ...     print(genericsettings.verbose)
+    changed
+
+Each context has its own copies of the mutable values, like option lists,
+the current testbed and the reference algorithm cache. Hence changes
+within one context are not seen in another::
+
+    >>> from cocopp import bestalg
+    >>> c1, c2 = Context(), Context()
+    >>> with c1:
+    ...     genericsettings.figure_file_formats.append('png')
+    ...     bestalg._cache['test'] = 'c1'
+    >>> with c2:
+    ...     print(genericsettings.figure_file_formats[-1], 'test' in bestalg._cache)
+    pdf False
+    >>> with c1:
+    ...     print(genericsettings.figure_file_formats[-1], bestalg._cache['test'])
+    png c1
+    >>> genericsettings.figure_file_formats[-1], 'test' in bestalg._cache
+    ('pdf', False)
+
+`cocopp.main` accepts a context as argument, and `toolsdivers.parallel_map`
+passes the context of the calling process to its worker processes. To
+run post-processings in parallel, run each in its own process with
+`main_in_process`.
+
+A `Context` can be pickled. Values which cannot be pickled, like the
+dictionaries of functions in `captions`, are left out and keep their
+value in the process where the context is unpickled. Each value is
+pickled separately, hence only values assigned to several attributes
+remain shared after unpickling::
+
+    >>> import pickle
+    >>> c = pickle.loads(pickle.dumps(Context()))
+    >>> 'replace_dict' in c.state['captions']
+    False
+
+"""
+
+from __future__ import absolute_import
+
+import copy
+import pickle
+import types
+import threading
+import importlib
+
+processing_lock = threading.RLock()
+"""held while a post-processing runs or a `Context` is entered"""
+
+_stateful_modules = ('genericsettings', 'testbedsettings',
+                     'dataformatsettings', 'bestalg', 'toolsstats',
+                     'captions', 'ppfigdim', 'pprldistr', 'pplogloss',
+                     'ppconverrorbars', 'compall.pprldmany', 'compall.ppfigs',
+                     'compall.pptables', 'comp2.ppfig2', 'comp2.ppscatter')
+"""modules with public attributes to be kept in a `Context`"""
+
+_private_state = {'bestalg': ('_cache', ),
+                  'toolsstats': ('_root_seed', ),
+                  'compall.pprldmany': ('_reference_samples_cache', )}
+"""non-public module attributes to be kept in a `Context`"""
+
+
+def _is_state(value):
+    """return whether a module attribute `value` is state rather than
+    code"""
+    return not isinstance(value, (types.ModuleType, types.FunctionType,
+                                  types.BuiltinFunctionType, type))
+
+
+def _copy(value, memo):
+    """return a copy of module attribute `value` for a `Context`.
+
+    Settings, see `toolsdivers._is_setting`, are copied deeply. Other
+    lists, dictionaries and sets, like caches, and instances of `cocopp`
+    classes, like the current testbed, are copied shallowly, their
+    entries and attributes are shared. Other values are not copied.
+    `memo` is the `copy.deepcopy` memo, such that values shared between
+    attributes remain shared in the copies.
+    """
+    from .toolsdivers import _is_setting
+    if id(value) in memo:
+        return memo[id(value)]
+    if _is_setting(value):
+        return copy.deepcopy(value, memo)
+    if not (isinstance(value, (dict, list, set)) or
+            type(value).__module__.startswith(__package__ + '.')):
+        return value
+    memo[id(value)] = res = copy.copy(value)
+    return res
+
+
+class Context(object):
+    """state of a post-processing, by default a snapshot of the current
+    state of the process.
+
+    See the module documentation for details.
+    """
+    def __init__(self):
+        self.state = {}
+        self._previous = []
+        self.capture()
+
+    def capture(self):
+        """set the state of `self` to the current state of the process.
+
+        Mutable values are copied, see `_copy`, such that later changes
+        of the current state do not affect `self`. Values shared between
+        attributes remain shared in the copy.
+        """
+        memo = {}
+        self.state = {}
+        for name in _stateful_modules:
+            module = importlib.import_module('%s.%s' % (__package__, name))
+            state = self.state[name] = {}
+            for key, value in vars(module).items():
+                if key.startswith('_') and key not in _private_state.get(name, ()):
+                    continue
+                if not _is_state(value):
+                    continue
+                state[key] = _copy(value, memo)
+
+    def __getstate__(self):
+        """return the picklable state of `self`, see the module
+        documentation"""
+        pickled = {}  # pickled values by id, to pickle each value once
+        state = {}
+        for name, module_state in self.state.items():
+            state[name] = {}
+            for key, value in module_state.items():
+                if id(value) not in pickled:
+                    try:
+                        pickled[id(value)] = pickle.dumps(value, protocol=2)
+                    except Exception:  # pickling can raise about any exception
+                        pickled[id(value)] = None
+                if pickled[id(value)] is not None:
+                    state[name][key] = pickled[id(value)]
+        return {'pickled_state': state}
+
+    def __setstate__(self, state):
+        unpickled = {}  # values by id of their pickle, shared pickles give shared values
+        self.state = {}
+        for name, module_state in state['pickled_state'].items():
+            self.state[name] = {}
+            for key, data in module_state.items():
+                if id(data) not in unpickled:
+                    unpickled[id(data)] = pickle.loads(data)
+                self.state[name][key] = unpickled[id(data)]
+        self._previous = []
+
+    def restore(self):
+        """make a copy of the state of `self` the current state of the
+        process, such that changes of the current state do not affect
+        `self`"""
+        memo = {}
+        for name, state in self.state.items():
+            module = importlib.import_module('%s.%s' % (__package__, name))
+            for key, value in state.items():
+                setattr(module, key, _copy(value, memo))
+
+    def __enter__(self):
+        processing_lock.acquire()
+        try:
+            self._previous.append(Context())
+            self.restore()
+        except:
+            processing_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *args):
+        try:
+            self.capture()
+            self._previous.pop().restore()
+        finally:
+            processing_lock.release()
+
+
+def _main(argv, processing_context):
+    """run `cocopp.main` in a process started by `main_in_process`"""
+    from . import rungeneric
+    rungeneric.main(argv, processing_context)
+
+
+def main_in_process(argv, processing_context=None):
+    """start ``cocopp.main(argv, processing_context)`` in a new process and
+    return the started `multiprocessing.Process`.
+
+    By default, `processing_context` is a snapshot of the current state.
+    Post-processings started like this run in parallel, as each process
+    has its own state. Call ``join()`` on the returned process to wait
+    for it, a nonzero ``exitcode`` indicates a failure.
+    """
+    import multiprocessing
+    process = multiprocessing.Process(
+        target=_main, args=(argv, processing_context or Context()))
+    process.start()
+    return process
@@ -0,0 +1,185 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Store of statistics derived from algorithm data sets.
+
+Statistics like aRT values, success rates or simulated run lengths
+computed from a `pproc.DataSet` are stored per algorithm in a file in
+`genericsettings.derived_statistics_folder`. Items are keyed by the
+fingerprint of the data set (see `pproc.DataSet.fingerprint`) and by a
+key describing the computation, typically the targets and the seed.
+Hence, when the same algorithms are compared again, possibly against
+different further algorithms, only statistics of new or changed data
+are computed.
+
+Each store keeps at most `max_items` items, the items stored first are
+discarded first. `save` merges the new items into the store file under
+a lock, such that concurrent processes do not lose items of each other.
+`clear` removes store files, removing the folder clears the store as
+well.
+
+Statistics are only stored and looked up when a seed is set with
+`toolsstats.set_seed`, because without a seed bootstrapped statistics,
+like dispersions, differ in each run.
+
+The store files are loaded with `pickle`, which can run arbitrary code.
+Hence nobody untrusted must be able to write into the store folder.
+"""
+
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import glob
+import pickle
+import gzip
+import hashlib
+import warnings
+import contextlib
+
+from . import genericsettings
+from .toolsdivers import replace_file
+
+_format_version = 2
+max_items = 20000
+"""maximal number of items stored per algorithm"""
+lock_timeout = 60
+"""seconds to wait for the lock of a store file, older locks are
+considered stale and removed"""
+
+_stores = {}
+"""map algorithm id to a `dict` with the loaded items and the items not
+yet saved, items are ``(time stored, value)`` tuples"""
+
+
+def _filename(algId):
+    """return the store file name for algorithm `algId` or `None`"""
+    folder = genericsettings.derived_statistics_folder
+    if not folder:
+        return None
+    key = repr((algId, _format_version, sys.version_info[0],
+                getattr(sys.modules.get(__package__), '__version__', None)))
+    return os.path.join(os.path.expanduser(folder),
+                        'stats-%s.pickle.gz' % hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def _load(filename):
+    """return the items in store file `filename`, any failure to read the
+    file is silently ignored"""
+    if filename and os.path.isfile(filename):
+        try:
+            with gzip.open(filename, 'rb') as fid:
+                content = pickle.load(fid)
+            if content.get('version') == _format_version:
+                return content['items']
+        except Exception:
+            pass
+    return {}
+
+
+def _store(algId):
+    """return the store of algorithm `algId`, load it first if needed"""
+    if algId not in _stores:
+        _stores[algId] = {'items': _load(_filename(algId)), 'new': {}}
+    return _stores[algId]
+
+
+@contextlib.contextmanager
+def _lock(filename):
+    """hold an exclusive lock of `filename` by creating a lock file"""
+    lock_filename = filename + '.lock'
+    start = time.time()
+    while True:
+        try:
+            fd = os.open(lock_filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except OSError:
+            try:
+                if time.time() - os.path.getmtime(lock_filename) > lock_timeout:
+                    os.remove(lock_filename)  # stale lock
+                    continue
+            except OSError:  # the lock was just released
+                continue
+            if time.time() - start > lock_timeout:
+                raise IOError('timeout waiting for lock %s' % lock_filename)
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_filename)
+
+
+def lookup(entry, key):
+    """return the statistics stored for data set `entry` with `key` or
+    `None`"""
+    if not genericsettings.derived_statistics_folder:
+        return None
+    item = _store(entry.algId)['items'].get((entry.fingerprint(), key))
+    return None if item is None else item[1]
+
+
+def store(entry, key, value):
+    """store statistics `value` computed from data set `entry` with `key`.
+
+    `key` and `value` must be picklable, `value` must not be `None`.
+    Items are written to disk with the next call of `save`.
+    """
+    if not genericsettings.derived_statistics_folder:
+        return
+    s = _store(entry.algId)
+    s['items'][(entry.fingerprint(), key)] = s['new'][(entry.fingerprint(), key)] = (
+        time.time(), value)
+
+
+def save():
+    """merge the new items into the store files on disk.
+
+    The store file is read again under a lock and written to a
+    temporary file first, to never leave a partially written store
+    behind. Only the `max_items` most recently stored items are kept.
+    Failures are only reported as warning.
+    """
+    for algId, s in _stores.items():
+        filename = _filename(algId)
+        if not s['new'] or not filename:
+            continue
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            folder = os.path.dirname(filename)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with _lock(filename):
+                items = _load(filename)
+                items.update(s['new'])
+                if len(items) > max_items:
+                    items = dict(sorted(items.items(), key=lambda kv: kv[1][0])[-max_items:])
+                with gzip.open(tmp_filename, 'wb') as fid:
+                    pickle.dump({'version': _format_version, 'algId': algId,
+                                 'items': items},
+                                fid, pickle.HIGHEST_PROTOCOL)
+                replace_file(tmp_filename, filename)
+            s['items'] = items
+        except Exception as e:
+            warnings.warn("could not write derived statistics %s (%s)"
+                          % (filename, str(e)))
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+        s['new'] = {}
+
+
+def clear(older_than=None):
+    """remove the store files in `genericsettings.derived_statistics_folder`
+    which were not written within the last `older_than` seconds, by
+    default all of them, and forget the loaded stores"""
+    folder = genericsettings.derived_statistics_folder
+    if folder:
+        for filename in glob.glob(os.path.join(os.path.expanduser(folder),
+                                               'stats-*.pickle.gz')):
+            if older_than is None or time.time() - os.path.getmtime(filename) > older_than:
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+    _stores.clear()
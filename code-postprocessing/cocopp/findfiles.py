@@ -19,14 +19,20 @@ import warnings
 import tarfile
 import zipfile
 import hashlib
+import json
 import ast
+import threading
+from multiprocessing.pool import ThreadPool
 if sys.version_info[0] >= 3:
-    from urllib.request import urlretrieve
+    from urllib.request import urlopen, Request
+    from urllib.error import HTTPError
 else:
-    from urllib import urlretrieve
+    from urllib2 import urlopen, Request, HTTPError
 from .toolsdivers import StringList  # def StringList(list_): return list_
+from .toolsdivers import replace_file
 from . import genericsettings
 
+_stamps_lock = threading.Lock()  # serializes writing the index files in local_data_path
 # Initialization
 
 
@@ -452,6 +458,14 @@ class COCODataArchive(list):
         ('test/RS-4.zip', '1e9b0f4e63eaf934bdd819113c160b4663561f2d83059d799feb0c8cb5672978', 6158),
 ]
 
+    _metadata_index_filename = '.metadata-index.json'
+    """name of the file in `local_data_path` with the metadata of
+    archived data, see `build_metadata_index`"""
+
+    _verified_stamps_filename = '.verified-hashes.json'
+    """name of the file in `local_data_path` with the ``[size, mtime,
+    hash]`` stamps of the files whose hash was verified"""
+
     @property
     def names_found(self):
         """names as (to be) used in `get` when called without argument.
@@ -476,9 +490,11 @@ class COCODataArchive(list):
         archive, however this functionality has never been tested and
         needs most likely a few bug fixes.
         """
-        self.local_data_path = os.path.expanduser(os.path.join(*local_path.split('/')))
+        self.local_data_path = os.path.expanduser(local_path.replace('/', os.path.sep))
         self.remote_data_path = url
         self._names_found = []  # names recently found
+        self._verified = None  # stamps of verified files, see `_verified_stamps`
+        self._metadata = None  # see `_metadata_index`
         self._print = print  # like this we can make it quiet for testing
         if definition_file:
             self._all = self._read_names_list(definition_file)
@@ -562,7 +578,164 @@ class COCODataArchive(list):
             print("%4d '%s'" % (index, self[index]))
         self._names_found = current_names
 
-    def get_all(self, indices=None, remote=True):
+    def build_metadata_index(self, names=None, remote=False):
+        """scan the :file:`info` files of archived data for metadata and
+        return the names of the entries with metadata.
+
+        By default all entries of the archive are scanned, which are
+        available locally or, with ``remote=True``, downloaded. Only the
+        :file:`info` members are read, the archives are not extracted.
+        The metadata are kept in a file in `local_data_path` together
+        with the hash of the scanned archive, such that each archive is
+        scanned only once. The file can be copied to another local data
+        path to use the metadata without the data.
+
+        See `metadata` and `find_by_metadata` for using the metadata.
+        """
+        index = self._metadata_index()
+        modified = False
+        for name in list(self) if names is None else names:
+            if self.metadata(name) is not None:
+                continue
+            path = self.get(name, remote=remote)
+            if not path:
+                continue
+            index[name] = {'sha256': self._known_hash(name) or self._hash(path),
+                           'metadata': _archive_metadata(path)}
+            modified = True
+        if modified:
+            self._save_metadata_index()
+        return StringList(name for name in self if self.metadata(name) is not None)
+
+    def metadata(self, name):
+        """return the metadata of archive entry `name` or `None`.
+
+        The metadata are a `dict` with the sorted lists ``'algIds'``,
+        ``'suites'``, ``'functions'`` and ``'dimensions'`` found in
+        the :file:`info` files and with ``'data'``, a list of
+        ``[function, dimension, number_of_runs, max_evaluations]``
+        entries.
+
+        Metadata are available after `build_metadata_index` was called
+        in the same `local_data_path`.
+        """
+        entry = self._metadata_index().get(name)
+        if entry is None:
+            return None
+        known_hash = self._known_hash(name)
+        if known_hash is None and os.path.exists(self.full_path(name)):
+            known_hash = self._hash(name)
+        if entry['sha256'] != known_hash:  # the archive has changed
+            return None
+        return entry['metadata']
+
+    def find_by_metadata(self, *substrs, **conditions):
+        """return names of archived data that match all `substrs` like
+        `find` and all `conditions` on their metadata.
+
+        Possible conditions are
+
+        - ``suite``: name of the suite, entries whose :file:`info` files
+          give no suite always match
+        - ``dimensions``: a dimension or a list of dimensions
+        - ``functions``: a function number or a list of function numbers
+        - ``instances``: minimal number of runs
+        - ``budget``: minimal largest number of evaluations divided by
+          dimension
+
+        Entries match only if they have data for each of the given
+        functions in each of the given dimensions, and the
+        ``instances`` and ``budget`` conditions hold on all of these.
+        Entries without metadata, see `build_metadata_index`, do not
+        match. For example, all 2013 entries with 40-D data on f1-f24
+        are found with::
+
+            cocopp.bbob.find_by_metadata('2013', dimensions=40,
+                                         functions=range(1, 25))
+
+        A test with a single archived data set:
+
+        >>> import os, shutil, hashlib, tempfile, cocopp
+        >>> from cocopp.findfiles import COCODataArchive
+        >>> local = tempfile.mkdtemp()
+        >>> os.mkdir(os.path.join(local, '2009'))
+        >>> path = os.path.join(local, '2009', 'best.tgz')
+        >>> _ = shutil.copy(os.path.join(os.path.dirname(cocopp.__file__),
+        ...                              'refalgs', 'best2009-bbob.tar.gz'), path)
+        >>> with open(path, 'rb') as file_:
+        ...     hash_ = hashlib.sha256(file_.read()).hexdigest()
+        >>> with open(os.path.join(local, 'archive_info.txt'), 'w') as file_:
+        ...     _ = file_.write(repr([('2009/best.tgz', hash_, 0)]))
+        >>> archive = COCODataArchive(local, '', definition_file='archive_info.txt')
+        >>> archive.build_metadata_index()
+        ['2009/best.tgz']
+        >>> archive.metadata('2009/best.tgz')['dimensions']
+        [2, 3, 5, 10, 20, 40]
+        >>> archive.find_by_metadata('2009', dimensions=40, functions=range(1, 25))
+        ['2009/best.tgz']
+        >>> archive.find_by_metadata(dimensions=[40, 80])
+        []
+
+        """
+        unknown = set(conditions) - set(['suite', 'dimensions', 'functions',
+                                         'instances', 'budget'])
+        if unknown:
+            raise TypeError('unknown conditions %s' % str(sorted(unknown)))
+        as_list = lambda x: None if x is None else (
+            list(x) if hasattr(x, '__iter__') else [x])
+        dimensions = as_list(conditions.get('dimensions'))
+        functions = as_list(conditions.get('functions'))
+        names = []
+        for name in self.find(*substrs):
+            metadata = self.metadata(name)
+            if metadata is None:
+                continue
+            if (conditions.get('suite') and metadata['suites'] and
+                    conditions['suite'] not in metadata['suites']):
+                continue
+            data = dict(((f, d), (runs, evals))
+                        for f, d, runs, evals in metadata['data'])
+            pairs = [(f, d) for f in (functions or metadata['functions'])
+                     for d in (dimensions or metadata['dimensions'])]
+            if all(pair in data and
+                   data[pair][0] >= conditions.get('instances', 0) and
+                   data[pair][1] >= conditions.get('budget', 0) * pair[1]
+                   for pair in pairs):
+                names.append(name)
+        self._names_found = names
+        return StringList(names)
+
+    def _metadata_index(self):
+        """return the `dict` of metadata by archive name, see
+        `build_metadata_index`"""
+        if self._metadata is None:
+            self._metadata = {}
+            try:
+                with open(os.path.join(self.local_data_path,
+                                       self._metadata_index_filename), 'rt') as file_:
+                    self._metadata = json.load(file_)
+            except (IOError, OSError, ValueError):
+                pass
+        return self._metadata
+
+    def _save_metadata_index(self):
+        """write the metadata index to `local_data_path`"""
+        filename = os.path.join(self.local_data_path, self._metadata_index_filename)
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with _stamps_lock:
+            try:
+                if not os.path.isdir(self.local_data_path):
+                    os.makedirs(self.local_data_path)
+                with open(tmp_filename, 'wt') as file_:
+                    json.dump(self._metadata_index(), file_, sort_keys=True)
+                replace_file(tmp_filename, filename)
+            except (IOError, OSError) as e:
+                warnings.warn('could not write metadata index %s (%s)'
+                              % (filename, str(e)))
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+
+    def get_all(self, indices=None, remote=True, jobs=None):
         """Return a `list` (`StringList`) of absolute pathnames,
 
         by repeatedly calling `get`. Elements of the `indices` list can
@@ -570,12 +743,47 @@ class COCODataArchive(list):
         in the archive. If ``indices is None``, the results from the
         last call to `find` are used. Download the data if necessary.
 
+        Missing data are downloaded concurrently in `jobs` threads, by
+        default `genericsettings.download_jobs`. Each download is
+        written to a temporary file which is renamed only after its
+        hash was verified. An interrupted download is resumed on the
+        next call if the server supports it.
+
+        With a local mirror as `url` argument of the constructor:
+
+        >>> import os, hashlib, tempfile
+        >>> from cocopp.findfiles import COCODataArchive
+        >>> mirror, local = tempfile.mkdtemp(), tempfile.mkdtemp()
+        >>> entries = []
+        >>> for name in ['a.tgz', 'b.tgz']:
+        ...     with open(os.path.join(mirror, name), 'wb') as file_:
+        ...         _ = file_.write(name.encode() * 1000)
+        ...     entries.append((name, hashlib.sha256(name.encode() * 1000).hexdigest(), 2))
+        >>> with open(os.path.join(local, 'archive_info.txt'), 'w') as file_:
+        ...     _ = file_.write(repr(entries))
+        >>> archive = COCODataArchive(local, 'file:' + mirror.replace(os.path.sep, '/'),
+        ...                           definition_file='archive_info.txt')
+        >>> archive._print = lambda *args: None
+        >>> [os.path.basename(path) for path in archive.get_all([0, 1], jobs=2)]
+        ['a.tgz', 'b.tgz']
+
         See also `get`.
         """
         if indices is None:
             names = self.names_found
         else:
             names = self.find(indices)
+        if jobs is None:
+            jobs = genericsettings.download_jobs
+        missing = [] if not remote else sorted(set(
+            name for name in names if not os.path.exists(self.full_path(name))))
+        if len(missing) > 1 and jobs > 1:
+            pool = ThreadPool(min((jobs, len(missing))))
+            try:
+                pool.map(self._download, missing, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
         return StringList(self.get(name, remote=remote)
                           for name in names)
 
@@ -649,15 +857,55 @@ class COCODataArchive(list):
         if not remote:
             return ''  # like this string operations don't bail out
 
-        # download
-        if not os.path.exists(os.path.split(full_name)[0]):
-            os.makedirs(os.path.split(full_name)[0])  # create path
-        url = '/'.join((self.remote_data_path, names[0]))
-        self._print("  downloading %s to %s" % (url, full_name))
-        urlretrieve(url, full_name)
-        self.check_hash(full_name)
+        self._download(names[0])
         return full_name
 
+    def _download(self, name, chunk_size=2**16):
+        """download `name` and verify its hash.
+
+        Data are written to a ``.part`` file which is renamed when the
+        download is complete and the hash is correct, otherwise a
+        `ValueError` is raised. A ``.part`` file from an interrupted
+        download is continued if the server supports range requests.
+        """
+        full_name = self.full_path(name)
+        part_name = full_name + '.part'
+        try:
+            os.makedirs(os.path.dirname(full_name))  # create path
+        except OSError:
+            if not os.path.isdir(os.path.dirname(full_name)):
+                raise
+        url = '/'.join((self.remote_data_path, name))
+        offset = os.path.getsize(part_name) if os.path.exists(part_name) else 0
+        request = Request(url)
+        if offset:
+            request.add_header('Range', 'bytes=%d-' % offset)
+        self._print("  downloading %s to %s" % (url, full_name))
+        try:
+            response = urlopen(request)
+        except HTTPError as e:
+            if not offset or e.code != 416:  # 416 means nothing is left to read
+                raise
+        else:
+            try:
+                if offset and response.getcode() != 206:  # range not supported
+                    offset = 0
+                with open(part_name, 'ab' if offset else 'wb') as file_:
+                    for chunk in iter(lambda: response.read(chunk_size), b''):
+                        file_.write(chunk)
+            finally:
+                response.close()
+        known_hash = self._known_hash(name)
+        if known_hash is not None and self._hash(part_name) != known_hash:
+            os.remove(part_name)
+            raise ValueError('wrong checksum for download of "%s" from %s, '
+                             'the partial download was removed' % (name, url))
+        replace_file(part_name, full_name)
+        if known_hash is None:
+            self.check_hash(full_name)  # warns
+        else:
+            self._set_verified_stamp(full_name, known_hash)
+
     def get_one(self, *args, **kwargs):
         """depreciated, for backwards compatibility"""
         return self.get(*args, **kwargs)
@@ -745,20 +993,74 @@ class COCODataArchive(list):
                 'compute all hashes of local data and then manually insert the hash in _all.\n'
                 'Or consider filing a bug report (issue) at https://github.com/numbbo/coco/issues'
                 '' % (name, self._hash(name)))
-        elif self._hash(name) != known_hash:
-            raise ValueError(
-                'wrong checksum for "%s".'
-                'Consider to (re)move file\n'
-                '   %s\n'
-                'as it may be a partial/unsuccessful download.\n'
-                'A missing file will be downloaded again by `get`.'
-                '' % (name, self.full_path(name)))
-
-    def _hash(self, name, hash_function=hashlib.sha256):
-        """compute hash of `name` or path"""
-        with open(self.full_path(name) if name in self else
-                  name, 'rb') as file_:
-            return hash_function(file_.read()).hexdigest()
+        elif self._verified_stamp(name) != self._stamp(name, known_hash):
+            if self._hash(name) != known_hash:
+                raise ValueError(
+                    'wrong checksum for "%s".'
+                    'Consider to (re)move file\n'
+                    '   %s\n'
+                    'as it may be a partial/unsuccessful download.\n'
+                    'A missing file will be downloaded again by `get`.'
+                    '' % (name, self.full_path(name)))
+            self._set_verified_stamp(name, known_hash)
+
+    def _path(self, name):
+        """return the full path of `name` or path"""
+        return self.full_path(name) if name in self else name
+
+    def _hash(self, name, hash_function=hashlib.sha256, chunk_size=2**20):
+        """compute hash of `name` or path, reading `chunk_size` bytes
+        at a time"""
+        hash_ = hash_function()
+        with open(self._path(name), 'rb') as file_:
+            for chunk in iter(lambda: file_.read(chunk_size), b''):
+                hash_.update(chunk)
+        return hash_.hexdigest()
+
+    def _stamp(self, name, hash_):
+        """return ``[size, mtime, hash_]`` of the file `name` or path"""
+        stat = os.stat(self._path(name))
+        return [stat.st_size, stat.st_mtime, hash_]
+
+    def _verified_stamps(self):
+        """return the `dict` of stamps of files with a verified hash.
+
+        The stamps are kept in the file `_verified_stamps_filename` in
+        `local_data_path`, such that the hash of a file is computed only
+        once, unless its size or modification time changes.
+        """
+        if self._verified is None:
+            self._verified = {}
+            try:
+                with open(os.path.join(self.local_data_path,
+                                       self._verified_stamps_filename), 'rt') as file_:
+                    self._verified = json.load(file_)
+            except (IOError, OSError, ValueError):
+                pass
+        return self._verified
+
+    def _verified_stamp(self, name):
+        """return the stamp recorded for `name` or path or `None`"""
+        return self._verified_stamps().get(self._name(self._path(name)))
+
+    def _set_verified_stamp(self, name, hash_):
+        """record that `name` or path has the verified hash `hash_`.
+
+        Failures to write the stamps are silently ignored, the hash is
+        then computed again on the next access.
+        """
+        filename = os.path.join(self.local_data_path, self._verified_stamps_filename)
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with _stamps_lock:
+            stamps = self._verified_stamps()
+            stamps[self._name(self._path(name))] = self._stamp(name, hash_)
+            try:
+                with open(tmp_filename, 'wt') as file_:
+                    json.dump(stamps, file_, indent=1, sort_keys=True)
+                replace_file(tmp_filename, filename)
+            except (IOError, OSError):
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
 
     def _known_hash(self, name):
         """return known hash or `None`
@@ -787,7 +1089,7 @@ class COCODataArchive(list):
         """
         with open(os.path.join(self.local_data_path, definition_filename),
                   'rt') as file_:
-            return ast.literat_eval(file_.read())
+            return ast.literal_eval(file_.read())
 
     def _generate_names_list(self, definition_filename=None):
         """write an _all list of an existing archive including hashes and
@@ -808,6 +1110,8 @@ class COCODataArchive(list):
             for filename in filenames:
                 if '.extracted' not in dirpath \
                         and not filename.endswith(('dat', 'info')) \
+                        and not filename.startswith(self._verified_stamps_filename) \
+                        and not filename.startswith(self._metadata_index_filename) \
                         and not ('BBOB' in filename and 'rawdata' in filename):
                     name = '/'.join([dirpath.replace(os.path.sep, '/'), filename])[len(filename) + 1:]
                     path = os.path.join(dirpath, filename)
@@ -820,6 +1124,67 @@ class COCODataArchive(list):
                 file_.write(repr(res))
         return res
 
+def _info_members(path):
+    """yield the lines of all :file:`info` files in the archive `path`
+    without extracting it"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if member.endswith('.info'):
+                    for line in archive.read(member).decode('utf-8', 'replace').splitlines():
+                        yield line
+    else:
+        archive = tarfile.open(path)
+        try:
+            for member in archive:
+                if member.isfile() and member.name.endswith('.info'):
+                    file_ = archive.extractfile(member)
+                    for line in file_.read().decode('utf-8', 'replace').splitlines():
+                        yield line
+        finally:
+            archive.close()
+
+
+def _archive_metadata(path):
+    """return the metadata of the archived data `path`, see
+    `COCODataArchive.metadata`"""
+    from .pproc import DataSet, parseinfo  # pproc imports findfiles
+    attribute = lambda key: DataSet._attributes.get(key, (key, ))[0]
+    algIds, suites, data = set(), set(), {}
+    header = {}
+    for line in _info_members(path):
+        line = line.strip()
+        if not line or line.startswith('%'):
+            continue
+        parts = [part.strip() for part in line.split(', ')]
+        if not any(part.endswith('dat') for part in parts):
+            header = dict((attribute(key), value) for key, value in parseinfo(line))
+            continue
+        info = dict(header)  # data lines of biobjective data have header info
+        info.update((attribute(key), value) for key, value in
+                    parseinfo(', '.join(part for part in parts if '=' in part)))
+        if 'algId' in info:
+            algIds.add(str(info['algId']))
+        if info.get('suite'):
+            suites.add(str(info['suite']))
+        try:
+            key = (int(info['funcId']), int(info['dim']))
+        except (KeyError, ValueError):
+            continue
+        runs, evals = data.get(key, (0, 0))
+        for part in parts:
+            if '=' in part or part.endswith('dat'):
+                continue
+            runs += 1
+            if ':' in part:
+                evals = max((evals, int(float(part.split(':', 1)[1].split('|')[0]))))
+        data[key] = (runs, evals)
+    return {'algIds': sorted(algIds), 'suites': sorted(suites),
+            'functions': sorted(set(f for f, d in data)),
+            'dimensions': sorted(set(d for f, d in data)),
+            'data': [[f, d, runs, evals] for (f, d), (runs, evals) in sorted(data.items())]}
+
+
 class COCOBBOBDataArchive(COCODataArchive):
     """This class "contains" archived data for the 'bbob' suite.
 
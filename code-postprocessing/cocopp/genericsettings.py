@@ -240,6 +240,32 @@ latex_commands_for_html = 'latex_commands_for_html'
 
 extraction_folder_prefix = '.extracted_'
 
+reference_algorithm_cache_folder = '~/.cocopp/cache'
+"""folder where pre-processed reference algorithm data are stored to be
+loaded quickly in later sessions, `None` or `''` disables the cache"""
+
+derived_statistics_folder = '~/.cocopp/statistics'
+"""folder where statistics derived from algorithm data, like aRTs and
+simulated run lengths, are stored to be reused when the same data are
+compared again, `None` or `''` disables the store. The store files are
+pickles, and loading a pickle can run arbitrary code, hence everybody
+who can write into this folder, for example in a shared home directory,
+must be trusted"""
+
+keep_data_in_memory = False
+"""keep data parsed from index files and reference algorithm data in
+memory to be reused by later post-processings in the same process, like
+in ``python -m cocopp serve``"""
+
+skip_unchanged_outputs = False
+"""do not redraw figures and tables whose data, settings and cocopp
+version did not change since they were written into the output folder,
+set with ``--skip-unchanged``. The inputs are recorded in hidden
+``.*.inputs`` files next to the outputs only with this setting. Only
+the data, `genericsettings`, the testbed and the settings of the
+drawing module are compared, changes of `matplotlib.rcParams` or of
+the plotting code within the same cocopp version are not detected."""
+
 # default settings for rungeneric, rungeneric1 and rungenericmany
 inputCrE = 0.
 isFig = True
@@ -253,6 +279,20 @@ inputsettings = 'color'
 isExpensive = False
 isRldOnSingleFcts = True
 isRLDistr = True
+jobs = 1
+"""number of processes for computations which can run in parallel,
+`1` computes everything in the current process, `0` uses all cores"""
+stage_jobs = 1
+"""number of independent post-processing stages, like the scaling
+figures or the tables, which run concurrently in worker processes, `1`
+runs the stages one after the other, `0` uses all cores"""
+download_jobs = 4
+"""number of archived data sets downloaded concurrently by
+`findfiles.COCODataArchive.get_all`"""
+profile = 0
+"""record wall time, CPU time and memory of the post-processing stages
+and write a report to the output folder, see `profiling`, `2` also
+writes `cProfile` dumps of the stages"""
 
 # usage: background = {(color, linestyle): [alg1, alg2, ...], }
 # for example:
@@ -276,7 +316,8 @@ longoptlist = ["help", "output-dir=", "noisy", "noise-free",
                "verbose", "settings=", "conv",
                "expensive", "runlength-based",
                "los-only", "crafting-effort=", "pickle",
-               "sca-only", "no-svg", "constrained"]
+               "sca-only", "no-svg", "constrained", "jobs=", "stage-jobs=",
+               "profile", "cprofile", "skip-unchanged"]
 
 
 # thereby, "los-only", "crafting-effort=", and "pickle" affect only rungeneric1
@@ -10,7 +10,7 @@ import sys
 import numpy
 
 from . import toolsdivers
-from . import genericsettings, pproc, testbedsettings
+from . import genericsettings, pproc, testbedsettings, profiling
 from .ppfig import save_figure, save_single_functions_html, convergence_plots_header
 from .toolsstats import prctile
 
@@ -47,6 +47,7 @@ def beautify():
     plt.ylim(max((limits[0], final_target)), limits[1])
 
 
+@profiling.profiled('ppconverrorbars.main')
 def main(dictAlg, outputdir='.', parentHtmlFileName=None, algorithm_name=None):
     """Main routine for generating convergence plots
 
@@ -9,13 +9,13 @@ from operator import itemgetter
 from itertools import groupby
 import warnings
 import numpy as np
-from matplotlib import pyplot as plt
 import shutil
 from six import advance_iterator
 # from pdb import set_trace
 
 # absolute_import => . refers to where ppfig resides in the package:
-from . import genericsettings, testbedsettings, toolsstats, htmldesc, toolsdivers
+from . import genericsettings, testbedsettings, toolsstats, htmldesc, toolsdivers, profiling
+plt = toolsdivers.LazyModule('matplotlib.pyplot')  # imported when a figure is drawn
 
 
 # CLASS DEFINITIONS
@@ -34,6 +34,13 @@ HtmlPage = enum('NON_SPECIFIED', 'ONE', 'MANY', 'PPRLDMANY_BY_GROUP', 'PPRLDMANY
                 'PPTABLE', 'PPTABLE2', 'PPTABLES', 'PPRLDISTR', 'PPRLDISTR2', 'PPLOGLOSS', 'PPSCATTER', 'PPFIGS')
 
 
+def figure_file_names(filename):
+    """return the names of the files written by `save_figure`"""
+    return [filename + '.' + format
+            for format in genericsettings.figure_file_formats]
+
+
+@profiling.profiled('save_figure')
 def save_figure(filename, algorithm=None, format=None,
                 layout_rect=(0, 0, 0.99, 1), bbox_inches=None):
     """Save figure into an image file.
@@ -161,6 +168,9 @@ def save_folder_index_file(filename, image_file_extension):
 
     if not filename:
         return
+    # the links depend on the existing files, hence wait for all stages
+    if toolsdivers.defer_call(save_folder_index_file, filename, image_file_extension):
+        return
 
     current_dir = os.path.dirname(os.path.realpath(filename))
 
@@ -491,12 +501,17 @@ def discretize_limits(limits, smaller_steps_limit=3.1):
 
 
 def marker_positions(xdata, ydata, nbperdecade, maxnb,
-                     ax_limits=None, y_transformation=None, xmin=1.1):
+                     ax_limits=None, y_transformation=None, xmin=1.1,
+                     rng=None):
     """return randomized marker positions
 
     replacement for downsample, could be improved by becoming independent
     of axis limits?
+
+    `rng` is the random state, by default the global `numpy.random` state.
     """
+    if rng is None:
+        rng = np.random
     if ax_limits is None:  # use current axis limits
         ax_limits = plt.axis()
     tfy = y_transformation
@@ -515,11 +530,11 @@ def marker_positions(xdata, ydata, nbperdecade, maxnb,
     xpos = []
     ypos = []
     if sum(probs) > 0:
-        xoff = np.random.rand() / nbmarkers
+        xoff = rng.rand() / nbmarkers
         probs /= sum(probs)
         cum = np.cumsum(probs)
         for xact in np.arange(0, 1, 1. / nbmarkers):
-            pos = xoff + xact + (1. / nbmarkers) * (0.3 + 0.4 * np.random.rand())
+            pos = xoff + xact + (1. / nbmarkers) * (0.3 + 0.4 * rng.rand())
             idx = np.abs(cum - pos).argmin()  # index of closest value
             if xdata[idx] > xmin:
                 xpos.append(xdata[idx])
@@ -544,6 +559,9 @@ def plotUnifLogXMarkers(x, y, nbperdecade, logscale=False, **kwargs):
     label.
 
     This function only works with monotonous graph.
+
+    The random marker positions are drawn from the
+    `toolsstats.task_random_state` of the label and the data size.
     """
     line_args = kwargs.copy()
     line_args['marker'] = ''
@@ -553,7 +571,9 @@ def plotUnifLogXMarkers(x, y, nbperdecade, logscale=False, **kwargs):
     if 'marker' in kwargs and len(x) > 0:
         # x2, y2 = downsample(x, y)
         x2, y2 = marker_positions(x, y, nbperdecade, 19, plt.axis(),
-                                  np.log10 if logscale else None)
+                                  np.log10 if logscale else None,
+                                  rng=toolsstats.task_random_state(
+                                      'markers', kwargs.get('label', ''), len(x)))
         marker_args = kwargs.copy()
         marker_args['drawstyle'] = 'default'
         marker_args['linestyle'] = ''
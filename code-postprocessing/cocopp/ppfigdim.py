@@ -54,6 +54,7 @@ target (if in the expensive/runlength-based targets setting).
 from __future__ import absolute_import
 
 import os
+import sys
 import warnings
 
 import matplotlib.pyplot as plt
@@ -61,7 +62,7 @@ import numpy as np
 from six import advance_iterator
 
 from . import genericsettings, toolsstats, bestalg, pproc, ppfig, ppfigparam, htmldesc, toolsdivers
-from . import testbedsettings
+from . import testbedsettings, profiling
 from . import captions
 
 xlim_max = None
@@ -500,6 +501,7 @@ def plot_previous_algorithms(func, target=None):  # lambda x: [1e-8]):
                    zorder= -2)
     return res
 
+@profiling.profiled('ppfigdim.main')
 def main(dsList, _valuesOfInterest, outputdir):
     """From a DataSetList, returns a convergence and aRT/dim figure vs dim.
     
@@ -555,35 +557,46 @@ def main(dsList, _valuesOfInterest, outputdir):
 
     ppfig.copy_js_files(outputdir)
     
-    funInfos = ppfigparam.read_fun_infos()    
+    funInfos = ppfigparam.read_fun_infos()
     fontSize = ppfig.getFontSize(funInfos.values())
-    for func in dictFunc:
-        plot(dictFunc[func], _valuesOfInterest, styles=styles)  # styles might have changed via config
-        beautify(axesLabel=False)
-        
-        # display number of instances in data and used targets type:
-        display_text = '%d instances\n' % len(((dictFunc[func][0]).instancenumbers))
-        display_text += _valuesOfInterest.short_info
-        plt.text(plt.xlim()[0], plt.ylim()[0],
-                 display_text, fontsize=14, horizontalalignment="left",
-                 verticalalignment="bottom")
-
-        if func in testbedsettings.current_testbed.functions_with_legend:
-            toolsdivers.legend(loc="best")
-        if func in funInfos.keys():
-            # print(plt.rcParams['axes.titlesize'])
-            # print(plt.rcParams['font.size'])
-            funcName = funInfos[func]
-            plt.gca().set_title(funcName, fontsize=fontSize)
-
-        plot_previous_algorithms(func, _valuesOfInterest)
-        filename = os.path.join(outputdir, 'ppfigdim_f%03d' % (func))
-        with warnings.catch_warnings(record=True) as ws:
-            ppfig.save_figure(filename, dsList[0].algId)
-            if len(ws):
-                for w in ws:
-                    print(w)
-                print('while saving figure in "' + filename +
-                        '" (in ppfigdim.py:551)')
-
-        plt.close()
+    tasks = [(dictFunc[func], func, _valuesOfInterest, styles,  # styles might have changed via config
+              funInfos.get(func), fontSize, outputdir, dsList[0].algId)
+             for func in dictFunc]
+    list(toolsdivers.parallel_map(_plot_function, tasks))
+
+def _plot_function(task):
+    """draw and save the figure of a single function, called from `main`
+    via `toolsdivers.parallel_map` with a tuple of arguments"""
+    dsList, func, _valuesOfInterest, styles, funcName, fontSize, outputdir, algId = task
+    filename = os.path.join(outputdir, 'ppfigdim_f%03d' % (func))
+    key = toolsdivers.output_record_key(filename, task, sys.modules[__name__])
+    if toolsdivers.load_output_record(filename, key,
+                                      ppfig.figure_file_names(filename))[0]:
+        return
+
+    plot(dsList, _valuesOfInterest, styles=styles)
+    beautify(axesLabel=False)
+
+    # display number of instances in data and used targets type:
+    display_text = '%d instances\n' % len(((dsList[0]).instancenumbers))
+    display_text += _valuesOfInterest.short_info
+    plt.text(plt.xlim()[0], plt.ylim()[0],
+             display_text, fontsize=14, horizontalalignment="left",
+             verticalalignment="bottom")
+
+    if func in testbedsettings.current_testbed.functions_with_legend:
+        toolsdivers.legend(loc="best")
+    if funcName is not None:
+        plt.gca().set_title(funcName, fontsize=fontSize)
+
+    plot_previous_algorithms(func, _valuesOfInterest)
+    with warnings.catch_warnings(record=True) as ws:
+        ppfig.save_figure(filename, algId)
+        if len(ws):
+            for w in ws:
+                print(w)
+            print('while saving figure in "' + filename +
+                    '" (in ppfigdim.py:_plot_function)')
+
+    plt.close()
+    toolsdivers.save_output_record(filename, key)
@@ -23,7 +23,7 @@ except ImportError:
 from matplotlib import mlab as mlab
 from six import advance_iterator
 
-from . import toolsstats, toolsdivers, bestalg, testbedsettings, genericsettings, captions
+from . import toolsstats, toolsdivers, bestalg, testbedsettings, genericsettings, captions, profiling
 from .pptex import writeFEvals2
 from .ppfig import save_figure, consecutiveNumbers
 
@@ -596,10 +596,12 @@ def generateSingleTableTex(dsList, funcs, mFE, d, prcOfInterest, EVALS, data,
 
     #set_trace()
     res.append(" & ".join(header))
+    # percentiles of all rows at once
+    prctiles = toolsstats.prctile_array([list(data[f][i] for f in data)
+                                         for i in range(len(EVALS))],
+                                        prcOfInterest)
     for i in range(len(EVALS)):
-        tmpdata = list(data[f][i] for f in data)
-        #set_trace()
-        tmpdata = toolsstats.prctile(tmpdata, prcOfInterest)
+        tmpdata = prctiles[i]
         # format entries
         #tmp = [writeFEvals(EVALS[i]/d, '.0')]
         if EVALS[i]/d < 200:
@@ -716,10 +718,12 @@ def generateSingleTableHtml(dsList, funcs, mFE, d, prcOfInterest, EVALS, data,
 
     # add data
     res.append("<tbody>\n")
+    # percentiles of all rows at once
+    prctiles = toolsstats.prctile_array([list(data[f][i] for f in data)
+                                         for i in range(len(EVALS))],
+                                        prcOfInterest)
     for i in range(len(EVALS)):
-        tmpdata = list(data[f][i] for f in data)
-        #set_trace()
-        tmpdata = toolsstats.prctile(tmpdata, prcOfInterest)
+        tmpdata = prctiles[i]
 
         res.append("<tr>\n")
 
@@ -864,6 +868,7 @@ def generateFigure(dsList, CrE=0., isStoringXRange=True, outputdir='.',
 
         #plt.rcdefaults()
 
+@profiling.profiled('pplogloss.main')
 def main(dsList, CrE=0., isStoringXRange=True, outputdir='.', info='default'):
     """Generates aRT loss ratio boxplot figures.
 
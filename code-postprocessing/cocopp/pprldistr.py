@@ -49,8 +49,9 @@ import matplotlib.pyplot as plt
 import numpy as np
 from pdb import set_trace
 from . import genericsettings, pproc, toolsdivers
-from . import testbedsettings
+from . import testbedsettings, profiling
 from .ppfig import consecutiveNumbers, plotUnifLogXMarkers, save_figure, logxticks
+from .ppfig import figure_file_names
 from .pptex import color_to_latex, marker_to_latex
 from . import captions
 
@@ -536,6 +537,7 @@ def plotFVDistr(dsList, budget, min_f=None, **plotArgs):
     else:
         return None
 
+@profiling.profiled('pprldistr.comp')
 def comp(dsList0, dsList1, targets, isStoringXMax=False,
          outputdir='', info='default'):
     """Generate figures of ECDF that compare 2 algorithms.
@@ -782,6 +784,94 @@ def plotRLB_previous_algorithms(dim, funcs):
 
 
 
+def _plot_dimension(task):
+    """draw and save the run length and function value distribution
+    figures of a single dimension.
+
+    Called from `main` via `toolsdivers.parallel_map` with a tuple of
+    arguments, returns the x-limit :py:data:`fmax` of the function
+    value distribution figure.
+    """
+    global fmax
+    (d, dictdim, maxEvalsFactor, evalfmax, fmax,
+     isStoringXMax, isBiobjective, outputdir, info, algId) = task
+    testbed = testbedsettings.current_testbed
+    targets = testbed.pprldistr_target_values # convenience abbreviation
+
+    filename = os.path.join(outputdir, 'pprldistr_%02dD_%s' % (d, info))
+    fvd_filename = os.path.join(outputdir, 'ppfvdistr_%02dD_%s' % (d, info))
+    key = toolsdivers.output_record_key(filename, task, sys.modules[__name__])
+    unchanged, stored_fmax = toolsdivers.load_output_record(
+        filename, key,
+        figure_file_names(filename) + figure_file_names(fvd_filename))
+    if unchanged:
+        return stored_fmax
+
+    # first figure: Run Length Distribution
+    fig = plt.figure()
+    for j in range(len(targets)):
+        plotRLDistr(dictdim,
+                    lambda fun_dim: targets(fun_dim)[j],
+                    (targets.label(j)
+                     if isinstance(targets,
+                                   pproc.RunlengthBasedTargetValues)
+                     else targets.loglabel(j)),
+                    evalfmax, # can be larger maxEvalsFactor with no effect
+                    ** rldStyles[j % len(rldStyles)])
+
+    funcs = list(i.funcId for i in dictdim)
+    text = '{%s}, %d-D' % (consecutiveNumbers(sorted(funcs), 'f'), d)
+    if not isBiobjective:
+ #   try:
+
+        if not isinstance(targets, pproc.RunlengthBasedTargetValues):
+        # if targets.target_values[-1] == 1e-8:  # this is a hack
+            plot_previous_algorithms(d, funcs)
+
+        else:
+            plotRLB_previous_algorithms(d, funcs)
+
+#    except:
+ #       pass
+
+    plt.axvline(x=maxEvalsFactor, color='k') # vertical line at maxevals
+    toolsdivers.legend(loc='best')
+    plt.text(0.5, 0.98, text, horizontalalignment="center",
+             verticalalignment="top",
+             transform=plt.gca().transAxes
+             # bbox=dict(ec='k', fill=False)
+            )
+    try: # was never tested, so let's make it safe
+        if len(funcs) == 1:
+            plt.title(testbed.info(funcs[0])[:27])
+    except:
+        warnings.warn('could not print title')
+
+
+    beautifyRLD(evalfmax)
+    save_figure(filename, algId)
+    plt.close(fig)
+
+    # second figure: Function Value Distribution
+    fig = plt.figure()
+    plotFVDistr(dictdim, np.inf, testbed.ppfvdistr_min_target, **rldStyles[-1])
+    # coloring right to left
+    for j, max_eval_factor in enumerate(genericsettings.single_runlength_factors):
+        if max_eval_factor > maxEvalsFactor:
+            break
+        plotFVDistr(dictdim, max_eval_factor, testbed.ppfvdistr_min_target,
+                    **rldUnsuccStyles[j % len(rldUnsuccStyles)])
+
+    plt.text(0.98, 0.02, text, horizontalalignment="right",
+             transform=plt.gca().transAxes) # bbox=dict(ec='k', fill=False),
+    beautifyFVD(isStoringXMax=isStoringXMax, ylabel=False)
+    save_figure(fvd_filename, algId)
+    plt.close(fig)
+    toolsdivers.save_output_record(filename, key, fmax)
+    return fmax
+
+
+@profiling.profiled('pprldistr.main')
 def main(dsList, isStoringXMax=False, outputdir='',
          info='default'):
     """Generate figures of empirical cumulative distribution functions.
@@ -811,9 +901,7 @@ def main(dsList, isStoringXMax=False, outputdir='',
     # plt.rc("ytick", labelsize=20)
     # plt.rc("font", size=20)
     # plt.rc("legend", fontsize=20)
-    testbed = testbedsettings.current_testbed
-    targets = testbed.pprldistr_target_values # convenience abbreviation
-
+    tasks = []
     for d, dictdim in sorted(dsList.dictByDim().items()):
         maxEvalsFactor = max(i.mMaxEvals() / d for i in dictdim)
         if isStoringXMax:
@@ -824,68 +912,16 @@ def main(dsList, isStoringXMax=False, outputdir='',
             evalfmax = maxEvalsFactor
         if runlen_xlimits_max is not None:
             evalfmax = runlen_xlimits_max
-
-        # first figure: Run Length Distribution
-        filename = os.path.join(outputdir, 'pprldistr_%02dD_%s' % (d, info))
-        fig = plt.figure()
-        for j in range(len(targets)):
-            plotRLDistr(dictdim,
-                        lambda fun_dim: targets(fun_dim)[j],
-                        (targets.label(j)
-                         if isinstance(targets,
-                                       pproc.RunlengthBasedTargetValues)
-                         else targets.loglabel(j)),
-                        evalfmax, # can be larger maxEvalsFactor with no effect
-                        ** rldStyles[j % len(rldStyles)])
-
-        funcs = list(i.funcId for i in dictdim)
-        text = '{%s}, %d-D' % (consecutiveNumbers(sorted(funcs), 'f'), d)
-        if not dsList.isBiobjective():
-     #   try:
-
-            if not isinstance(targets, pproc.RunlengthBasedTargetValues):
-            # if targets.target_values[-1] == 1e-8:  # this is a hack
-                plot_previous_algorithms(d, funcs)
-
-            else:
-                plotRLB_previous_algorithms(d, funcs)
-
-    #    except:
-     #       pass
-
-        plt.axvline(x=maxEvalsFactor, color='k') # vertical line at maxevals
-        toolsdivers.legend(loc='best')
-        plt.text(0.5, 0.98, text, horizontalalignment="center",
-                 verticalalignment="top",
-                 transform=plt.gca().transAxes
-                 # bbox=dict(ec='k', fill=False)
-                )
-        try: # was never tested, so let's make it safe
-            if len(funcs) == 1:
-                plt.title(testbed.info(funcs[0])[:27])
-        except:
-            warnings.warn('could not print title')
-
-
-        beautifyRLD(evalfmax)
-        save_figure(filename, dsList[0].algId)
-        plt.close(fig)
-
-        # second figure: Function Value Distribution
-        filename = os.path.join(outputdir, 'ppfvdistr_%02dD_%s' % (d, info))
-        fig = plt.figure()
-        plotFVDistr(dictdim, np.inf, testbed.ppfvdistr_min_target, **rldStyles[-1])
-        # coloring right to left
-        for j, max_eval_factor in enumerate(genericsettings.single_runlength_factors):
-            if max_eval_factor > maxEvalsFactor:
-                break
-            plotFVDistr(dictdim, max_eval_factor, testbed.ppfvdistr_min_target,
-                        **rldUnsuccStyles[j % len(rldUnsuccStyles)])
-
-        plt.text(0.98, 0.02, text, horizontalalignment="right",
-                 transform=plt.gca().transAxes) # bbox=dict(ec='k', fill=False),
-        beautifyFVD(isStoringXMax=isStoringXMax, ylabel=False)
-        save_figure(filename, dsList[0].algId)
-        plt.close(fig)
-        # plt.rcdefaults()
+        tasks.append((d, dictdim, maxEvalsFactor, evalfmax))
+
+    global fmax
+    if isStoringXMax and not fmax and tasks:
+        # the first figure sets the x-limit of all subsequent figures
+        fmax = _plot_dimension(tasks.pop(0) + (
+            fmax, isStoringXMax, dsList.isBiobjective(),
+            outputdir, info, dsList[0].algId))
+    tasks = [task + (fmax, isStoringXMax, dsList.isBiobjective(),
+                     outputdir, info, dsList[0].algId) for task in tasks]
+    for fmax in toolsdivers.parallel_map(_plot_dimension, tasks):
+        pass  # keep the x-limit of the last figure like a sequential loop
 
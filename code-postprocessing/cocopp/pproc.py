@@ -24,6 +24,7 @@ import os
 import ast
 import re
 import pickle, gzip  # gzip is for future functionality: we probably never want to pickle without gzip anymore
+import copy
 import warnings
 import json
 import hashlib
@@ -32,17 +33,20 @@ import collections
 from pdb import set_trace
 from six import string_types, advance_iterator
 import numpy, numpy as np
-import matplotlib.pyplot as plt
 from collections import OrderedDict
 from . import genericsettings, findfiles, toolsstats, toolsdivers
-from . import testbedsettings, dataformatsettings
+from . import testbedsettings, dataformatsettings, profiling
 from .readalign import split, align_data, HMultiReader, VMultiReader, openfile
 from .readalign import HArrayMultiReader, VArrayMultiReader, alignArrayData
 from .ppfig import consecutiveNumbers, Usage
+plt = toolsdivers.LazyModule('matplotlib.pyplot')  # imported when a figure is drawn
 
 do_assertion = genericsettings.force_assertions # expensive assertions
 targets_displayed_for_info = [10, 1., 1e-1, 1e-3, 1e-5, 1e-8]  # only to display info in DataSetList.info
 maximal_evaluations_only_to_last_target = False  # was true in release 13.03, leads naturally to better results
+_parsed_index_files = toolsdivers.LeastRecentlyUsedDict(1000)
+"""stamps of the data files and data sets by index file key, see
+`_index_file_key` and `genericsettings.keep_data_in_memory`"""
 
 
 def _DataSet_complement_data(self, step=10**0.2, final_target=1e-8):
@@ -289,11 +293,13 @@ class RunlengthBasedTargetValues(TargetValues):
         self.target_discretization_factor = 10**0.2  # in accordance with default recordings
         self.reference_algorithm = ''
         self.initialized = False
+        self._target_table = None
 
     def initialize(self):
         """lazy initialization to prevent slow import"""
         if self.initialized:
             return self
+        cache_key = None  # the target table is only cached with testbedsettings reference data
         if self.reference_data == 'testbedsettings': # refalg data are loaded according to testbedsettings
             self.reference_algorithm = testbedsettings.current_testbed.reference_algorithm_filename
             self._short_info = 'reference budgets from ' + self.reference_algorithm
@@ -301,6 +307,8 @@ class RunlengthBasedTargetValues(TargetValues):
             from . import bestalg
             self.reference_data = bestalg.load_reference_algorithm(self.reference_algorithm, force=True)
             # TODO: remove targets smaller than 1e-8
+            cache_key = self._target_table_key()
+            self._target_table = bestalg.get_reference_algorithm_cache_item(cache_key)
         elif type(self.reference_data) is str:  # self.reference_data in ('RANDOMSEARCH', 'IPOP-CMA-ES') should work
             self._short_info = 'reference budgets from ' + self.reference_data
             # dsl = DataSetList(os.path.join(sys.modules[globals()['__name__']].__file__.split('cocopp')[0],
@@ -323,9 +331,56 @@ class RunlengthBasedTargetValues(TargetValues):
             # we assume here that self.reference_data is a dictionary
             # of reference data sets
             self.reference_algorithm = self.reference_data[list(self.reference_data.keys())[0]].algId
-        self.initialized = True
+        if self._target_table is None:
+            self._target_table = self._compute_target_table()
+            if cache_key is not None and self.reference_data:
+                bestalg.set_reference_algorithm_cache_item(cache_key, self._target_table,
+                                                           save=False)
+        self.initialized = True  # only now, such that a failed initialization is repeated
         return self
 
+    def fingerprint(self):
+        """return a hash string of the target values of `self`.
+
+        Used by `toolsdivers.inputs_hash`. `self` is initialized first,
+        such that the hash does not depend on whether the lazy
+        initialization has already been done.
+        """
+        self.initialize()
+        h = hashlib.sha1()
+        h.update(repr((self.__class__.__name__, self._short_info,
+                       self.reference_algorithm, self.unique_target_values,
+                       self._target_table_key())).encode('utf-8'))
+        for dim_fun in sorted(self._target_table):
+            targets, too_easy_run_lengths = self._target_table[dim_fun]
+            h.update(repr((dim_fun, list(too_easy_run_lengths))).encode('utf-8'))
+            h.update(np.asarray(targets, dtype=float).tobytes())
+        return h.hexdigest()
+
+    def _target_table_key(self):
+        """key of the target table in the reference algorithm cache.
+
+        The key contains all inputs of `_compute_targets` other than the
+        reference data, which are cached per reference algorithm anyway.
+        """
+        return (type(self).__name__, tuple(self.run_lengths),
+                self.smallest_target, self.times_dimension,
+                self.force_different_targets_factor,
+                self.step_to_next_difficult_target,
+                self.target_discretization_factor,
+                bool(genericsettings.test))
+
+    def _compute_target_table(self):
+        """return a dictionary with keys ``(dimension, funcId)`` like
+        the reference data and values ``(targets, too_easy_run_lengths)``.
+        """
+        if self.force_different_targets_factor**len(self.run_lengths) > 1e3:
+                warnings.warn('enforced different target values might spread more than three orders of magnitude')
+        if not self.reference_data:
+            return {}
+        return dict((dim_fun, self._compute_targets(ds, tuple(reversed(dim_fun))))
+                    for dim_fun, ds in self.reference_data.items())
+
     def __len__(self):
         return len(self.run_lengths)  
 
@@ -347,8 +402,6 @@ class RunlengthBasedTargetValues(TargetValues):
 
         """            
         self.initialize()
-        if self.force_different_targets_factor**len(self.run_lengths) > 1e3:
-                warnings.warn('enforced different target values might spread more than three orders of magnitude')
         if fun_dim is None:
             raise ValueError('call to RunlengthbasedTargetValues class instance needs the parameter ``fun_dim``, none given')
         fun_dim = tuple(fun_dim)
@@ -360,7 +413,25 @@ class RunlengthBasedTargetValues(TargetValues):
             raise ValueError('When running with the runlegth based target values ' \
                               'the reference data (e.g. a best algorithm) must exist.')
 
-        ds = self.reference_data[dim_fun]
+        targets, too_easy_run_lengths = self._target_table[dim_fun]
+        for rl in too_easy_run_lengths:
+            warnings.warn('  too easy run length ' + str(rl) +
+                          ' for (f,dim)=' + str(fun_dim))
+        targets = np.array(targets)  # prevent changes of the table
+
+        if self.unique_target_values:
+            #len_ = len(targets)
+            targets = np.array(list(reversed(sorted(set(targets)))))
+            # print(' '.join((str(len(targets)), 'of', str(len_), 'targets kept')))
+        if discretize:
+            return self._discretize(targets)
+        return targets    
+
+    def _compute_targets(self, ds, fun_dim):
+        """return the targets computed from reference data set `ds` for
+        ``fun_dim == (funcId, dimension)`` and the list of run lengths
+        for which the reference reached no target, see `__call__`.
+        """
         if 11 < 3:   
             try:
                 ds._complement_data() # is not fully implemented and not here not necessary
@@ -426,22 +497,19 @@ class RunlengthBasedTargetValues(TargetValues):
         
         # here the actual computation starts
         old_targets = targets
-        targets = [] 
-        for rl in self.run_lengths:
-            # choose best target achieved by reference aRT times step_to_next_difficult_target
-            indices = np.nonzero(ds.ert[:end] <= np.max((1, rl * (fun_dim[1] if self.times_dimension else 1))))[0]
-            if not len(indices):
-                warnings.warn('  too easy run length ' + str(rl) +
-                              ' for (f,dim)=' + str(fun_dim))
-                targets.append(ds.target[0])
-            else:
-                targets.append((1 + 1e-9) * ds.target[indices[-1]]
-                               / self.step_to_next_difficult_target)
-            
-            if (len(targets) > 1 and targets[-1] >= targets[-2] and 
-                self.force_different_targets_factor > 1):
-                targets[-1] = targets[-2] / self.force_different_targets_factor
-        targets = np.array(targets, copy=False)
+        # choose best target achieved by reference aRT times step_to_next_difficult_target
+        budgets = np.maximum(1, np.asarray(self.run_lengths, dtype=float) *
+                                (fun_dim[1] if self.times_dimension else 1))
+        reached = np.asarray(ds.ert[:end])[np.newaxis, :] <= budgets[:, np.newaxis]
+        too_easy = ~reached.any(axis=1)
+        # index of the last reached target for each run length
+        last = reached.shape[1] - 1 - np.argmax(reached[:, ::-1], axis=1)
+        targets = np.where(too_easy, ds.target[0],
+                           (1 + 1e-9) * ds.target[last] / self.step_to_next_difficult_target)
+        if self.force_different_targets_factor > 1:
+            for i in range(1, len(targets)):
+                if targets[i] >= targets[i - 1]:
+                    targets[i] = targets[i - 1] / self.force_different_targets_factor
         targets[targets < self.smallest_target] = self.smallest_target
 
         # a few more sanity checks
@@ -462,13 +530,7 @@ class RunlengthBasedTargetValues(TargetValues):
             print(targets / old_targets - 1)
             print(targets)
 
-        if self.unique_target_values:
-            #len_ = len(targets)
-            targets = np.array(list(reversed(sorted(set(targets)))))
-            # print(' '.join((str(len(targets)), 'of', str(len_), 'targets kept')))
-        if discretize:
-            return self._discretize(targets)
-        return targets    
+        return targets, [rl for rl, easy in zip(self.run_lengths, too_easy) if easy]
 
     get_targets = __call__  # an alias
     
@@ -1142,7 +1204,8 @@ class DataSet(object):
             samplesize=genericsettings.simulated_runlength_bootstrap_sample_size,
             randintfirst=toolsstats.randint_derandomized,
             randintrest=toolsstats.randint_derandomized,
-            bootstrap=False):
+            bootstrap=False,
+            rng=None):
         """Return a len(targets) list of ``samplesize`` "simulated" run
         lengths (#evaluations, sorted).
 
@@ -1160,6 +1223,13 @@ class DataSet(object):
         TODO: change this: To get a bootstrap sample for estimating dispersion use
         ``min_samplesize=0, randint=np.random.randint``.
 
+        `rng` is the random state passed to the default `randintfirst`
+        and `randintrest` functions and used for bootstrapping. By
+        default, each target uses its own random state from
+        ``toolsstats.task_random_state(self.algId, self.funcId, self.dim,
+        target)``, such that the result does not depend on the order of
+        computations.
+
         Details:
 
         - For targets where all runs were successful, samplesize=nbRuns()
@@ -1179,7 +1249,16 @@ class DataSet(object):
         try: targets = targets([self.funcId, self.dim])
         except TypeError: pass
         res = []  # res[i] is a list of samplesize evals
-        for evals in self.detEvals(targets, bootstrap=bootstrap):
+        for target, evals in zip(targets, self.detEvals(targets)):
+            rng_ = rng if rng is not None else toolsstats.task_random_state(
+                            self.algId, self.funcId, self.dim, target)
+            randfirst, randrest = randintfirst, randintrest
+            if randfirst is toolsstats.randint_derandomized:
+                randfirst = functools.partial(randfirst, rng=rng_)
+            if randrest is toolsstats.randint_derandomized:
+                randrest = functools.partial(randrest, rng=rng_)
+            if bootstrap:  # like detEvals, but with the random state of target
+                evals = evals[rng_.randint(0, len(evals), len(evals))]
             # prepare evals array
             evals.sort()
             indices = np.isfinite(evals)
@@ -1195,7 +1274,7 @@ class DataSet(object):
             nsucc = sum(indices)
 
             # do the job
-            indices = randintfirst(0, len(evals), samplesize)
+            indices = randfirst(0, len(evals), samplesize)
             sums = evals[indices]
             if nsucc == len(evals):
                 res += [sorted(sums)]
@@ -1203,7 +1282,7 @@ class DataSet(object):
             failing = np.where(indices >= nsucc)[0]
             assert nsucc > 0  # prevent infinite loop
             while len(failing):  # add "restarts"
-                indices = randintrest(0, len(evals), len(failing))
+                indices = randrest(0, len(evals), len(failing))
                 sums[failing] += evals[indices]
                 # keep failing indices
                 failing = [failing[i] for i in range(len(failing))
@@ -1233,6 +1312,35 @@ class DataSet(object):
     def __ne__(self,other):
         return not self.__eq__(other)
 
+    def fingerprint(self):
+        """return a hash string of the identity and the data of `self`.
+
+        Used to find outputs which must be recomputed, see
+        `toolsdivers.inputs_hash`, and stored statistics, see
+        `derivedstats`. The hash is computed again only when another
+        array is assigned to one of the data attributes, changing the
+        values of an array in place is not detected.
+        """
+        identity = repr((self.__class__.__name__, self.algId,
+                         getattr(self, 'comment', None), self.funcId, self.dim,
+                         getattr(self, 'precision', None),
+                         list(getattr(self, 'instancenumbers', [])),
+                         [(i, getattr(self, i))
+                          for i in getattr(self, '_extra_attr', ())]))
+        arrays = [getattr(self, name, None)
+                  for name in ('evals', 'funvals', 'maxevals', 'finalfunvals')]
+        memo = self.__dict__.get('_fingerprint')
+        if (memo is not None and memo[0] == identity and
+                all(a is b for a, b in zip(memo[1], arrays))):
+            return memo[2]
+        h = hashlib.sha1()
+        h.update(identity.encode('utf-8'))
+        for data in arrays:
+            if data is not None:
+                h.update(np.ascontiguousarray(data).tobytes())
+        self._fingerprint = (identity, arrays, h.hexdigest())
+        return self._fingerprint[2]
+
     def __repr__(self):
         res = ('DataSet(%s on f%s %d-D'
                % (self.algId, str(self.funcId), self.dim))
@@ -1264,9 +1372,10 @@ class DataSet(object):
         evals = self.detEvals(targets, copy=False)
         nsucc = self.detSuccesses(targets)
         ert = self.detERT(targets)
+        prctiles = toolsstats.prctile_array(evals, (0, 15, 50, 85, 100))
         for i, target in enumerate(targets):
             line = '  %.1e |' % target
-            for val in toolsstats.prctile(evals[i], (0, 15, 50, 85, 100)):
+            for val in prctiles[i]:
                 val = float(val)
                 line += ' %7d' % int(np.round(val / self.dim)) if not np.isnan(val) else '     .  '
             line += ' |' + ('%9.1f' % (ert[i] / self.dim) if np.isfinite(ert[i]) else '    nan  ') 
@@ -1520,6 +1629,7 @@ class DataSet(object):
         """
         return np.array(self.detSuccesses(targets)) / float(self.nbRuns())
 
+    @profiling.profiled('aRT computation')
     def detERT(self, targets):
         """Determine the average running time to reach target values.
         The value is numpy.inf, if the target was never reached. 
@@ -1555,7 +1665,7 @@ class DataSet(object):
         # targets, sorted along targets
         return list(res[i][1] for i in targets)
 
-    def detEvals(self, targets, copy=True, bootstrap=False):
+    def detEvals(self, targets, copy=True, bootstrap=False, rng=None):
         """returns len(targets) data rows self.evals[idata, 1:] each row with 
         the closest but not larger target such that self.evals[idata, 0] <= target, 
         and self.evals[idata-1, 0] > target or in the "limit" cases the
@@ -1563,6 +1673,9 @@ class DataSet(object):
         
         Makes by default a copy of the data, however this might change in
         future.
+
+        If `bootstrap`, the runs are resampled with replacement using the
+        random state `rng`, by default the global `numpy.random` state.
         
         """
         evalsrows = {}  # data rows, easiest target first
@@ -1581,7 +1694,9 @@ class DataSet(object):
                         for i, target in enumerate(targets)])
 
         if bootstrap:
-            return [np.asarray(evalsrows[t])[np.random.randint(0,
+            if rng is None:
+                rng = np.random
+            return [np.asarray(evalsrows[t])[rng.randint(0,
                                 len(evalsrows[t]), len(evalsrows[t]))]
                     for t in targets]
         return [evalsrows[t] for t in targets]
@@ -1653,6 +1768,39 @@ class DataSet(object):
                 plt.ylabel('number of function evaluations')
         return plt.gca()
 
+def _index_file_key(indexFile):
+    """return the key of `indexFile` in the data sets kept in memory.
+
+    The key changes when the index file is modified or when the
+    testbed or data format, which determine the parsing, change.
+    """
+    try:
+        stat = os.stat(indexFile)
+    except OSError:
+        return None
+    return (os.path.abspath(indexFile), stat.st_size, stat.st_mtime,
+            type(testbedsettings.current_testbed).__name__,
+            type(dataformatsettings.current_data_format).__name__)
+
+def _data_files_stamp(datasets):
+    """return size and modification time of the ``.dat`` and ``.tdat``
+    files of `datasets`, which change when a data file is rewritten
+    without changing the index file"""
+    stamp = []
+    for ds in datasets:
+        folder = os.path.split(ds.indexFiles[0])[0]
+        for name in ds.dataFiles:
+            for extension in ('.dat', '.tdat'):
+                filename = os.path.join(folder, os.path.splitext(name)[0] + extension)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    stamp.append((filename, None, None))
+                else:
+                    stamp.append((filename, stat.st_size, stat.st_mtime))
+    return stamp
+
+
 class DataSetList(list):
     """List of instances of :py:class:`DataSet`.
 
@@ -1749,9 +1897,23 @@ class DataSetList(list):
         if len(self) and data_consistent:
             print("  Data consistent according to consistency_check() in pproc.DataSet")
             
+    @profiling.profiled('loading')
     def processIndexFile(self, indexFile):
         """Reads in an index (.info?) file information on the different runs."""
 
+        key = None
+        if genericsettings.keep_data_in_memory:
+            key = _index_file_key(indexFile)
+            cached = _parsed_index_files.get(key)
+            if cached is not None and cached[0] == _data_files_stamp(cached[1]):
+                parsed = copy.deepcopy(cached[1])
+                if parsed and not testbedsettings.current_testbed:
+                    testbedsettings.load_current_testbed(
+                        parsed[0].testbed_name, TargetValues, parsed[0].get_data_format())
+                for ds in parsed:
+                    self.append(ds)
+                return
+        parsed = []
         try:
             f = openfile(indexFile)
             if genericsettings.verbose:
@@ -1783,6 +1945,7 @@ class DataSetList(list):
                     ds = DataSet(header, comment, data, indexFile)                    
                     if len(ds.instancenumbers) > 0:                    
                         self.append(ds)
+                        parsed.append(ds)
                 except StopIteration:
                     break
             # Close index file
@@ -1795,6 +1958,9 @@ class DataSetList(list):
                     if data_file_names[i-1] == data_file_names[i]:
                         warnings.warn("    data file " + data_file_names[i])
                 warnings.warn("  This is likely to produce spurious results.")
+            if key is not None:
+                _parsed_index_files[key] = (_data_files_stamp(parsed),
+                                            copy.deepcopy(parsed))
 
         except IOError as e:
             print('Could not load "%s".' % indexFile)
@@ -2111,8 +2277,9 @@ class DataSetList(list):
                     tmpevals = i.detEvals(targets_displayed_for_info)
                     for j in range(len(targets_displayed_for_info)):
                         evals[j].extend(tmpevals[j])
+                prctiles = toolsstats.prctile_array(evals, [0, 10, 50, 90, 100])
                 for i, j in enumerate(targets_displayed_for_info): # never aggregate over dim...
-                    tmp = toolsstats.prctile(evals[i], [0, 10, 50, 90, 100])
+                    tmp = prctiles[i]
                     tmp2 = []
                     for k in tmp:
                         if not numpy.isfinite(k):
@@ -2211,16 +2378,17 @@ class DataSetList(list):
                     continue
                 assert dimension == ds.dim
                 funcs_processed.append(ds.funcId)
+                rng = toolsstats.task_random_state(ds.algId, ds.funcId, ds.dim)
                 if not simulated_restarts:
                     evals = ds.detEvals(target_values((ds.funcId, ds.dim)),
-                                        bootstrap=bootstrap)
+                                        bootstrap=bootstrap, rng=rng)
                     if data_per_target is not None:
                         # make sure to get 15 numbers for each target
                         if 1 < 3:
-                            evals = [np.sort(np.asarray(d)[toolsstats.randint_derandomized(0, len(d), data_per_target)])
+                            evals = [np.sort(np.asarray(d)[toolsstats.randint_derandomized(0, len(d), data_per_target, rng=rng)])
                                          for d in evals]
                         else:  # this assumes that data_per_target is not smaller than nbRuns
-                            evals = [np.sort(toolsstats.fix_data_number(d, data_per_target))
+                            evals = [np.sort(toolsstats.fix_data_number(d, data_per_target, rng=rng))
                                         for d in evals]
                 else:
                     if isinstance(simulated_restarts, dict):
@@ -2271,9 +2439,11 @@ class DataSetList(list):
                                 np.array([data_per_target * [val]
                                     for val in reference_scores[ds.funcId]],
                                          copy=False)
+                        ref_rng = toolsstats.task_random_state(
+                            'reference', ds.funcId, ds.dim)
                         for i, line in enumerate(reference_scores[ds.funcId]):
                             reference_scores[ds.funcId][i] = \
-                                np.sort(np.asarray(line)[toolsstats.randint_derandomized(0, len(line), data_per_target)])
+                                np.sort(np.asarray(line)[toolsstats.randint_derandomized(0, len(line), data_per_target, rng=ref_rng)])
                                 # np.sort(toolsstats.fix_data_number(line, data_per_target))
                     ref_scores.append(np.hstack(reference_scores[ds.funcId]))
                     # 'needs to be checked', qqq
@@ -2285,7 +2455,7 @@ class DataSetList(list):
 
             funcs_processed.sort()
             funcs_solved.sort()
-            assert map(int, np.__version__.split('.')) > [1, 4, 0], \
+            assert list(map(int, np.__version__.split('.')[:2])) > [1, 4], \
     """for older versions of numpy, replacing `nan` with `inf` might work
     for sorting here"""
             rld_data = np.hstack(rld_data)
@@ -2477,16 +2647,25 @@ class DataSetList(list):
             reference_data_set_list=reference_dataset_list)
         reference_algorithms = []
         idx = left_envelope >= smallest_evaluation_to_use
-        for alg in rld:
+        algs = list(rld)
+        # compute the percentiles of all algorithms at once
+        if reference_dataset_list:
+            scores = toolsstats.prctile_array([rld[alg][0][idx] for alg in algs], [5])[:, 0]
+            prctiles = toolsstats.prctile_array([rld[alg][0] for alg in algs],
+                                                [2, 5, 15, 25, 50], ignore_nan=False)
+        else:
+            prctiles = toolsstats.prctile_array([rld[alg][0] / left_envelope for alg in algs],
+                                                [2, 5, 15, 25, 50], ignore_nan=False)
+        for ialg, alg in enumerate(algs):
             try:
                 if reference_dataset_list:
-                    reference_algorithms.append([alg, toolsstats.prctile(rld[alg][0][idx], [5])[0],
+                    reference_algorithms.append([alg, scores[ialg],
                                             rld[alg], left_envelope,
-                                            toolsstats.prctile(rld[alg][0], [2, 5, 15, 25, 50], ignore_nan=False)])
+                                            list(prctiles[ialg])])
                 else:
                     reference_algorithms.append([alg, np.nanmin(rld[alg][0][idx] / left_envelope[idx]),
                                             rld[alg], left_envelope,
-                                            toolsstats.prctile(rld[alg][0] / left_envelope, [2, 5, 15, 25, 50], ignore_nan=False)])
+                                            list(prctiles[ialg])])
             except ValueError:
                 warnings.warn(str(alg) + ' could not be processed for get_sorted_algorithms ')
 
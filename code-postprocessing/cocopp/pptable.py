@@ -24,10 +24,11 @@ functions.
 from __future__ import absolute_import, print_function
 
 import os
+import sys
 import warnings
 import numpy as np
-from . import genericsettings, bestalg, toolsstats, pproc
-from . import testbedsettings
+from . import genericsettings, bestalg, toolsstats, pproc, toolsdivers
+from . import testbedsettings, profiling
 from .pptex import tableLaTeX, writeFEvals2, writeFEvalsMaxPrec
 from .toolsstats import significancetest
 from .toolsdivers import prepend_to_file
@@ -106,6 +107,7 @@ def get_table_caption():
     return captions.replace(table_caption)
         
 
+@profiling.profiled('pptable.main')
 def main(dsList, dims_of_interest, outputdir, latex_commands_file):
     """Generate a table of ratio aRT/aRTref vs target precision.
     
@@ -155,7 +157,22 @@ def main(dsList, dims_of_interest, outputdir, latex_commands_file):
         nbtests = float(len(funcs)) # #funcs tests times one algorithm
 
         tableHtml.append('<tbody>\n')
-        for f in sorted(funcs):
+        if isinstance(targetsOfInterest, pproc.RunlengthBasedTargetValues):
+            spec = r'@{}c@{}|' + '*{%d}{@{ }r@{}@{}l@{}}' % len(targetsOfInterest) + '|@{}r@{}@{}l@{}'
+        else:
+            spec = r'@{}c@{}|' + '*{%d}{@{}r@{}@{}l@{}}' % len(targetsOfInterest) + '|@{}r@{}@{}l@{}'
+        record_file = os.path.join(outputdir, 'pptable_%02dD' % d)
+        record_key = toolsdivers.output_record_key(
+            record_file, dictDim[d], [targetsOfInterest((f, d)) for f in sorted(funcs)],
+            [refalgentries[(d, f)] for f in sorted(funcs)] if refalgentries else None,
+            sys.modules[__name__], toolsstats._root_seed)
+        unchanged, stored_html = toolsdivers.load_output_record(
+            record_file, record_key, [os.path.join(outputdir, 'pptable_f%03d_%02dD.tex' % (f, d))
+                               for f in funcs])
+        if unchanged:  # the tex files are up to date, only the html is needed
+            tableHtml = stored_html
+            output_file = os.path.join(outputdir, 'pptable_f%03d_%02dD.tex' % (max(funcs), d))
+        for f in sorted(funcs) if not unchanged else ():
             table = []
             extraeol = []
 
@@ -226,7 +243,7 @@ def main(dsList, dims_of_interest, outputdir, latex_commands_file):
             evals = entry.detEvals(targetsOfInterest((f,d)))
             dispersion = []
             data = []
-            for i in evals:
+            for target, i in zip(targetsOfInterest((f, d)), evals):
                 succ = (np.isnan(i) == False)
                 tmp = i.copy()
                 tmp[succ==False] = entry.maxevals[np.isnan(i)]
@@ -237,7 +254,8 @@ def main(dsList, dims_of_interest, outputdir, latex_commands_file):
                 #   set_trace()
                 if any(succ):
                     tmp2 = toolsstats.drawSP(tmp[succ], tmp[succ==False],
-                                (10, 50, 90), genericsettings.simulated_runlength_bootstrap_sample_size)[0]
+                                (10, 50, 90), genericsettings.simulated_runlength_bootstrap_sample_size,
+                                rng=toolsstats.task_random_state(entry.algId, f, d, target))[0]
                     dispersion.append((tmp2[-1] - tmp2[0]) / 2.)
                 else: 
                     dispersion.append(None)
@@ -407,15 +425,13 @@ def main(dsList, dims_of_interest, outputdir, latex_commands_file):
             extraeol[-1] = ''
 
             output_file = os.path.join(outputdir, 'pptable_f%03d_%02dD.tex' % (f, d))
-            if isinstance(targetsOfInterest, pproc.RunlengthBasedTargetValues):
-                spec = r'@{}c@{}|' + '*{%d}{@{ }r@{}@{}l@{}}' % len(targetsOfInterest) + '|@{}r@{}@{}l@{}'
-            else:
-                spec = r'@{}c@{}|' + '*{%d}{@{}r@{}@{}l@{}}' % len(targetsOfInterest) + '|@{}r@{}@{}l@{}'
             #res = r'\providecommand{\algshort}{%s}' % alg1 + '\n'
             res = tableLaTeX(table, spec=spec, extra_eol=extraeol, add_begin_tabular=False, add_end_tabular=False)
             f = open(output_file, 'w')
             f.write(res)
             f.close()
+        if not unchanged:
+            toolsdivers.save_output_record(record_file, record_key, tableHtml)
 
         res = ("").join(str(item) for item in tableHtml)
         res = '<table>\n%s</table>\n' % res
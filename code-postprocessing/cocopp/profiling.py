@@ -0,0 +1,223 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Record where the time of a post-processing goes.
+
+With ``--profile``, see `genericsettings.profile`, the wall time, CPU
+time and memory high-water mark of the stages of the post-processing
+are recorded: loading and aligning data, computing aRTs, the main
+functions of the plotting modules, each `ppfig.save_figure` call, and
+the stages of `rungeneric1` and `rungenericmany`. Nested stages are
+recorded under the name of the enclosing stage, like
+``rungeneric1 > scaling figures > ppfigdim.main > save_figure``, and
+summed up over all calls with the same name.
+
+The results are written to :file:`profile.json` and
+:file:`profile.txt` in the output folder. With ``--cprofile``, a
+`cProfile` dump of each stage of `rungeneric1` and `rungenericmany` is
+written to the :file:`profile` subfolder, to be read with `pstats`.
+As `cProfile` only sees the current process, everything then runs in
+a single process, see `toolsdivers.parallel_map` and
+`toolsdivers.run_stages`.
+The report is written when the outermost of `rungeneric.main`,
+`rungeneric1.main` and `rungenericmany.main` returns.
+
+The memory high-water mark of the process is taken from `resource`
+and, if tracing was started, for example with the environment variable
+``PYTHONTRACEMALLOC=1``, from `tracemalloc`. Stages which run in worker
+processes, see ``--jobs`` and ``--stage-jobs``, are only recorded as
+part of the stage which started the workers.
+
+    >>> from cocopp import genericsettings, profiling
+    >>> genericsettings.profile = 1
+    >>> with profiling.stage('outer'):
+    ...     with profiling.stage('inner'):
+    ...         pass
+    >>> sorted(profiling.records)
+    ['outer', 'outer > inner']
+    >>> profiling.records['outer > inner']['calls']
+    1
+    >>> profiling.reset()
+    >>> genericsettings.profile = 0
+
+"""
+
+from __future__ import absolute_import, division
+
+import os
+import re
+import sys
+import json
+import time
+import functools
+import contextlib
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from . import genericsettings
+
+records = {}
+"""summed up measurements by stage name"""
+
+_stack = []  # names of the currently running stages
+_cprofiles = []  # (name, cProfile.Profile) of the dumped stages
+_report_folder = None  # where the outermost `run` writes the report
+
+
+def reset():
+    """discard all recorded measurements"""
+    records.clear()
+    del _cprofiles[:]
+
+
+def _cpu_time():
+    """return the CPU time of the current process in seconds"""
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+    return getattr(time, 'process_time', time.clock)()
+
+
+def _max_rss_megabytes():
+    """return the memory high-water mark of the process or `None`"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / 2.**20 if sys.platform == 'darwin' else rss / 2.**10
+
+
+def _traced_peak_megabytes():
+    """return the peak of the memory traced by `tracemalloc` or `None`"""
+    if tracemalloc is None or not tracemalloc.is_tracing():
+        return None
+    return tracemalloc.get_traced_memory()[1] / 2.**20
+
+
+def _add_record(key, start, start_cpu):
+    """add the measurements since `start` and `start_cpu` to stage `key`"""
+    record = records.setdefault(key, {'calls': 0, 'wall': 0., 'cpu': 0.})
+    record['calls'] += 1
+    record['wall'] += time.time() - start
+    record['cpu'] += _cpu_time() - start_cpu
+    for name, value in (('max_rss_MB', _max_rss_megabytes()),
+                        ('traced_peak_MB', _traced_peak_megabytes())):
+        if value is not None:
+            record[name] = max((record.get(name, 0), value))
+
+
+@contextlib.contextmanager
+def stage(name, dump=False):
+    """record the time and memory used in the ``with`` block as stage
+    `name`, if `genericsettings.profile` is set.
+
+    With ``dump=True`` and ``genericsettings.profile > 1``, the stage is
+    also run under `cProfile` unless an enclosing stage already is.
+    """
+    if not genericsettings.profile:
+        yield
+        return
+    _stack.append(name)
+    key = ' > '.join(_stack)
+    profiler = None
+    if dump and genericsettings.profile > 1 and not any(
+            key.startswith(k + ' > ') for k, _ in _cprofiles):
+        import cProfile
+        profiler = cProfile.Profile()
+        _cprofiles.append((key, profiler))
+    start, start_cpu = time.time(), _cpu_time()
+    try:
+        if profiler is None:
+            yield
+        else:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+    finally:
+        _add_record(key, start, start_cpu)
+        _stack.pop()
+
+
+@contextlib.contextmanager
+def run(name):
+    """record a post-processing run like `stage`.
+
+    Profiling can be switched on within the ``with`` block, typically
+    when the options are parsed. When the outermost run finishes, the
+    report is written to the folder given to `report_to`.
+    """
+    global _report_folder
+    outermost = not _stack
+    if outermost:
+        reset()
+    _stack.append(name)
+    key = ' > '.join(_stack)
+    start, start_cpu = time.time(), _cpu_time()
+    try:
+        yield
+    finally:
+        if genericsettings.profile:
+            _add_record(key, start, start_cpu)
+        _stack.pop()
+        if outermost:
+            try:
+                if genericsettings.profile and _report_folder:
+                    write_report(_report_folder)
+            finally:
+                _report_folder = None
+
+
+def report_to(folder):
+    """write the report to `folder` when the outermost `run` finishes,
+    unless an enclosing run has already chosen a folder"""
+    global _report_folder
+    if _report_folder is None:
+        _report_folder = folder
+
+
+def profiled(name):
+    """decorator to record each call of the decorated function as
+    stage `name`, see `stage`"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not genericsettings.profile:
+                return function(*args, **kwargs)
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def write_report(output_dir):
+    """write the recorded measurements to :file:`profile.json` and
+    :file:`profile.txt` in `output_dir` and the `cProfile` dumps to the
+    :file:`profile` subfolder"""
+    with open(os.path.join(output_dir, 'profile.json'), 'w') as f:
+        json.dump({'stages': records}, f, indent=1, sort_keys=True)
+    lines = ['%10s %10s %7s %12s  %s' % ('wall [s]', 'CPU [s]', 'calls',
+                                          'max RSS [MB]', 'stage')]
+    for key in sorted(records, key=lambda k: -records[k]['wall']):
+        record = records[key]
+        lines.append('%10.2f %10.2f %7d %12s  %s' % (
+            record['wall'], record['cpu'], record['calls'],
+            '%.0f' % record['max_rss_MB'] if 'max_rss_MB' in record else '',
+            key))
+    with open(os.path.join(output_dir, 'profile.txt'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    if _cprofiles:
+        folder = os.path.join(output_dir, 'profile')
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        for i, (key, profiler) in enumerate(_cprofiles):
+            profiler.dump_stats(os.path.join(
+                folder, '%02d_%s.prof' % (i, re.sub(r'\W+', '_', key).strip('_'))))
+    print('Profile written to %s' % os.path.join(output_dir, 'profile.txt'))
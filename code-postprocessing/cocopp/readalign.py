@@ -23,7 +23,7 @@ import os, sys
 import numpy
 import warnings
 
-from . import genericsettings, testbedsettings
+from . import genericsettings, testbedsettings, profiling
 
 from pdb import set_trace
 from six import string_types, advance_iterator
@@ -338,6 +338,7 @@ class HArrayMultiReader(ArrayMultiReader, HMultiReader):
 
 
 # FUNCTION DEFINITIONS
+@profiling.profiled('alignment')
 def align_data(data, idx_evals, idx_funvals, rewind_reader=False):
     """Aligns the data from a list of data arrays.
 
@@ -371,6 +372,7 @@ def align_data(data, idx_evals, idx_funvals, rewind_reader=False):
     # of the data.
 
 
+@profiling.profiled('alignment')
 def alignArrayData(data):
     """Aligns the data from a list of aligned arrays.
 
@@ -20,8 +20,9 @@ import sys
 import getopt
 import warnings
 import matplotlib
-from . import genericsettings, testbedsettings, rungeneric1, rungenericmany, toolsdivers, bestalg, findfiles
+from . import genericsettings, testbedsettings, rungeneric1, rungenericmany, toolsdivers, bestalg, findfiles, profiling
 from .toolsdivers import truncate_latex_command_file, print_done, diff_attr
+from .context import processing_lock
 from .ppfig import Usage
 from .compall import ppfigs
 
@@ -54,7 +55,7 @@ def usage():
     print(main.__doc__)
 
 
-def main(argv=None):
+def main(argv=None, context=None):
     r"""Main routine for post-processing data from COCO.
 
     Synopsis::
@@ -65,6 +66,11 @@ def main(argv=None):
 
         python -c "import cocopp; cocopp.main('data_folder [more_data_folders]')"
 
+    or, to keep data in memory between many post-processings, as
+    service, see `cocopp.serve`::
+
+        python -m cocopp serve [--port=8000]
+
     For this call to work, the path to this package must be in python
     search path, that is,
 
@@ -155,6 +161,36 @@ def main(argv=None):
 
             do not generate the svg figures which are used in html files
 
+        --jobs=N
+
+            number of processes to compute and draw figures in parallel,
+            by default 1, 0 uses all cores
+
+        --stage-jobs=N
+
+            number of processes to run independent stages, like the
+            scaling figures and the tables, concurrently, by default 1,
+            0 uses all cores
+
+        --profile
+
+            write the wall time, CPU time and memory used by each stage
+            of the post-processing to :file:`profile.json` and
+            :file:`profile.txt` in the output folder
+
+        --cprofile
+
+            like ``--profile`` and additionally write a `cProfile` dump
+            of each stage to the :file:`profile` subfolder, everything
+            runs in a single process, ``--jobs`` and ``--stage-jobs``
+            are ignored
+
+        --skip-unchanged
+
+            do not redraw figures and tables whose inputs did not change
+            since they were written into the output folder, see
+            `genericsettings.skip_unchanged_outputs`
+
 
     Exceptions raised:
 
@@ -181,7 +217,22 @@ def main(argv=None):
     default :file:`ppdata` to :file:`outputfolder`. The arguments can
     also be presented as a list of strings.
 
+    With a `context.Context` as `context` argument, the post-processing
+    runs on the state of `context`, leaving the module attributes of
+    the calling process unchanged. Concurrent post-processings in
+    different threads run one after the other.
+
     """
+    with context if context is not None else processing_lock:
+        with profiling.run('rungeneric'):
+            try:
+                return _main(argv)
+            finally:
+                bestalg.save_reference_algorithm_cache()
+
+
+def _main(argv):
+    """post-process as in `main` with the current state of the process"""
 
     if argv is None:
         argv = sys.argv[1:]
@@ -239,6 +290,16 @@ def main(argv=None):
                 if o in ("-v", "--verbose"):
                     genericsettings.verbose = True
                     is_assigned = True
+                if o == "--jobs":
+                    genericsettings.jobs = int(a)
+                if o == "--stage-jobs":
+                    genericsettings.stage_jobs = int(a)
+                if o == "--profile":
+                    genericsettings.profile = max((genericsettings.profile, 1))
+                if o == "--cprofile":
+                    genericsettings.profile = 2
+                if o == "--skip-unchanged":
+                    genericsettings.skip_unchanged_outputs = True
                 if o == '--include-single':
                     is_assigned = True
                 if not is_assigned:
@@ -256,6 +317,7 @@ def main(argv=None):
             os.makedirs(outputdir)
             if genericsettings.verbose:
                 print('Folder %s was created.' % outputdir)
+        profiling.report_to(outputdir)
 
         latex_commands_filename = os.path.join(outputdir, 'cocopp_commands.tex')
 
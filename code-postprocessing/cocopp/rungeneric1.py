@@ -27,7 +27,9 @@ import warnings, getopt, numpy as np
 from . import genericsettings, testbedsettings, ppfig, pptable, pprldistr, ppfigdim, pplogloss, findfiles
 from .pproc import DataSetList, store_reference_values, dictAlgByDim
 from .ppfig import Usage
+from . import toolsdivers, profiling
 from .toolsdivers import print_done, prepend_to_file, strip_pathname1, str_to_latex, get_version_label, replace_in_file
+from .context import processing_lock
 from . import ppconverrorbars
 from .compall import pprldmany, ppfigs
 
@@ -39,7 +41,7 @@ __all__ = ['main']
 def usage():
     print(main.__doc__)
 
-def main(argv=None):
+def main(argv=None, context=None):
     r"""Post-processing COCO data of a single algorithm.
 
     Provided with some data, this routine outputs figure and TeX files
@@ -100,6 +102,25 @@ def main(argv=None):
             useful with comparatively small budgets.
         --no-svg
             do not generate the svg figures which are used in html files
+        --jobs=N
+            number of processes to compute and draw figures in parallel,
+            by default 1, 0 uses all cores
+        --stage-jobs=N
+            number of processes to run independent stages, like the
+            scaling figures and the tables, concurrently, by default 1,
+            0 uses all cores
+        --profile
+            write the wall time, CPU time and memory used by each stage
+            of the post-processing to :file:`profile.json` and
+            :file:`profile.txt` in the output folder
+        --cprofile
+            like ``--profile`` and additionally write a `cProfile` dump
+            of each stage to the :file:`profile` subfolder, everything
+            runs in a single process, ``--jobs`` and ``--stage-jobs``
+            are ignored
+        --skip-unchanged
+            do not redraw figures and tables whose inputs did not change
+            since they were written into the output folder
         --runlength-based
             runlength-based f-target values, such that the
             "level of difficulty" is similar for all functions. 
@@ -142,7 +163,19 @@ def main(argv=None):
       :file:`folder1`. The ``-o`` option changes the output folder from
       the default to :file:`outputfolder`.
 
+    With a `context.Context` as `context` argument, the post-processing
+    runs on the state of `context`, leaving the module attributes of
+    the calling process unchanged. Concurrent post-processings in
+    different threads run one after the other.
+
     """
+    with context if context is not None else processing_lock:
+        with profiling.run('rungeneric1'):
+            return _main(argv)
+
+
+def _main(argv):
+    """post-process as in `main` with the current state of the process"""
 
     if argv is None:
         argv = sys.argv[1:]
@@ -221,6 +254,16 @@ def main(argv=None):
                 genericsettings.isExpensive = True  # comprises runlength-based
             elif o == "--no-svg":
                 genericsettings.generate_svg_files = False
+            elif o == "--jobs":
+                genericsettings.jobs = int(a)
+            elif o == "--stage-jobs":
+                genericsettings.stage_jobs = int(a)
+            elif o == "--profile":
+                genericsettings.profile = max((genericsettings.profile, 1))
+            elif o == "--cprofile":
+                genericsettings.profile = 2
+            elif o == "--skip-unchanged":
+                genericsettings.skip_unchanged_outputs = True
             elif o == "--sca-only":
                 warnings.warn("option --sca-only will have no effect with rungeneric1.py")
             else:
@@ -328,6 +371,7 @@ def main(argv=None):
                 os.makedirs(algoutputdir)
                 if genericsettings.verbose:
                     print('Folder %s was created.' % (algoutputdir))
+            profiling.report_to(outputdir)
 
         latex_commands_file = os.path.join(outputdir, 'cocopp_commands.tex')
 
@@ -347,7 +391,18 @@ def main(argv=None):
                                          function_groups=dsList.getFuncGroups())
 
         values_of_interest = testbedsettings.current_testbed.ppfigdim_target_values
-        if prepare_figures:
+
+        # the stages below only read the data and write distinct files,
+        # hence they can run concurrently, see genericsettings.stage_jobs
+        def set_rc():
+            plt.rc("axes", **inset.rcaxes)
+            plt.rc("xtick", **inset.rctick)
+            plt.rc("ytick", **inset.rctick)
+            plt.rc("font", **inset.rcfont)
+            plt.rc("legend", **inset.rclegend)
+            plt.rc('pdf', fonttype = 42)
+
+        def scaling_figures():
             print("Scaling figures...")
             # aRT/dim vs dim.
             plt.rc("axes", **inset.rcaxeslarger)
@@ -362,21 +417,16 @@ def main(argv=None):
             plt.rcdefaults()
             print_done()
 
-        plt.rc("axes", **inset.rcaxes)
-        plt.rc("xtick", **inset.rctick)
-        plt.rc("ytick", **inset.rctick)
-        plt.rc("font", **inset.rcfont)
-        plt.rc("legend", **inset.rclegend)
-        plt.rc('pdf', fonttype = 42)
-
-        if genericsettings.isConv:
+        def convergence_plots():
+            set_rc()
             print("Generating convergence plots...")
             ppconverrorbars.main(dictAlg,
                                  algoutputdir,
                                  genericsettings.single_algorithm_file_name)
             print_done()
 
-        if prepare_tables:
+        def tables():
+            set_rc()
             print("Generating LaTeX tables...")
             dictNoise = dsList.dictByNoise()
             dict_dim_list = dictAlgByDim(dictAlg)
@@ -394,7 +444,8 @@ def main(argv=None):
                 pptable.main(sliceNoise, dims, algoutputdir, latex_commands_file)
             print_done()
 
-        if prepare_RLDistr:
+        def ecdf_graphs():
+            set_rc()
             print("ECDF graphs...")
             dictNoise = dsList.dictByNoise()
             if len(dictNoise) > 1:
@@ -428,18 +479,20 @@ def main(argv=None):
                 pprldistr.evalfmax = None  # Resetting the max #fevalsfactor
             print_done()
 
-            if genericsettings.isRldOnSingleFcts: # copy-paste from above, here for each function instead of function groups
-                # ECDFs for each function
-                print("ECDF graphs per function...")
-                pprldmany.all_single_functions(dictAlg, 
-                                               True,
-                                               None,
-                                               algoutputdir,
-                                               genericsettings.single_algorithm_file_name,
-                                               settings=inset)
-                print_done()
+        def ecdf_graphs_single_functions():  # copy-paste from above, here for each function instead of function groups
+            set_rc()
+            # ECDFs for each function
+            print("ECDF graphs per function...")
+            pprldmany.all_single_functions(dictAlg, 
+                                           True,
+                                           None,
+                                           algoutputdir,
+                                           genericsettings.single_algorithm_file_name,
+                                           settings=inset)
+            print_done()
             
-        if prepare_log_loss:
+        def log_loss():
+            set_rc()
             print("aRT loss ratio figures and tables...")
             for ng, sliceNoise in dsList.dictByNoise().items():
                 if ng == 'noiselessall':
@@ -470,6 +523,24 @@ def main(argv=None):
                     pplogloss.evalfmax = None  # Resetting the max #fevalsfactor
             print_done()
 
+        stages = []
+        if prepare_figures:
+            stages.append(('scaling figures', scaling_figures, ()))
+        if genericsettings.isConv:
+            stages.append(('convergence plots', convergence_plots, ()))
+        if prepare_tables:
+            stages.append(('tables', tables, ()))
+        if prepare_RLDistr:
+            stages.append(('ECDF graphs', ecdf_graphs, ()))
+            if genericsettings.isRldOnSingleFcts:
+                stages.append(('ECDF graphs per function',
+                               ecdf_graphs_single_functions, ()))
+        if prepare_log_loss:  # ppfigdim.main writes the html page header
+            stages.append(('aRT loss ratios', log_loss,
+                           ('scaling figures', ) if prepare_figures else ()))
+        set_rc()
+        toolsdivers.run_stages(stages)
+
         prepend_to_file(latex_commands_file,
                         ['\\providecommand{\\bbobloglosstablecaption}[1]{',
                          pplogloss.table_caption(), '}'])
@@ -21,7 +21,9 @@ import warnings
 from . import genericsettings, ppfig, testbedsettings, findfiles
 from . import pproc, pptex, pprldistr
 from .pproc import DataSetList, processInputArgs
+from .context import processing_lock
 from .ppfig import Usage
+from . import toolsdivers, profiling
 from .toolsdivers import prepend_to_file, strip_pathname1, str_to_latex, replace_in_file
 from .compall import pprldmany, pptables, ppfigs
 from .comp2 import pprldistr2, ppscatter
@@ -68,7 +70,7 @@ def grouped_ecdf_graphs(alg_dict, order, output_dir, function_groups, settings,
             replace_in_file(file_name, '??COCOVERSION??', '<br />Data produced with COCO %s' % (get_version_label(None)))
 
 
-def main(argv=None):
+def main(argv=None, context=None):
     r"""Main routine for post-processing the data of multiple algorithms.
 
     Provided with some data, this routine outputs figure and TeX files
@@ -122,6 +124,25 @@ def main(argv=None):
             useful with comparatively small budgets.
         --no-svg
             do not generate the svg figures which are used in html files
+        --jobs=N
+            number of processes to compute and draw figures in parallel,
+            by default 1, 0 uses all cores
+        --stage-jobs=N
+            number of processes to run independent stages, like the
+            scaling figures and the tables, concurrently, by default 1,
+            0 uses all cores
+        --profile
+            write the wall time, CPU time and memory used by each stage
+            of the post-processing to :file:`profile.json` and
+            :file:`profile.txt` in the output folder
+        --cprofile
+            like ``--profile`` and additionally write a `cProfile` dump
+            of each stage to the :file:`profile` subfolder, everything
+            runs in a single process, ``--jobs`` and ``--stage-jobs``
+            are ignored
+        --skip-unchanged
+            do not redraw figures and tables whose inputs did not change
+            since they were written into the output folder
         -
 
     Exceptions raised:
@@ -158,7 +179,19 @@ def main(argv=None):
 
         $ python rungenericmany.py --settings grayscale NEWUOA NELDER LSSTEP
 
+    With a `context.Context` as `context` argument, the post-processing
+    runs on the state of `context`, leaving the module attributes of
+    the calling process unchanged. Concurrent post-processings in
+    different threads run one after the other.
+
     """
+    with context if context is not None else processing_lock:
+        with profiling.run('rungenericmany'):
+            return _main(argv)
+
+
+def _main(argv):
+    """post-process as in `main` with the current state of the process"""
 
     if argv is None:
         argv = sys.argv[1:]
@@ -220,6 +253,16 @@ def main(argv=None):
                 genericsettings.isExpensive = True  # comprises runlength-based
             elif o == "--no-svg":
                 genericsettings.generate_svg_files = False
+            elif o == "--jobs":
+                genericsettings.jobs = int(a)
+            elif o == "--stage-jobs":
+                genericsettings.stage_jobs = int(a)
+            elif o == "--profile":
+                genericsettings.profile = max((genericsettings.profile, 1))
+            elif o == "--cprofile":
+                genericsettings.profile = 2
+            elif o == "--skip-unchanged":
+                genericsettings.skip_unchanged_outputs = True
             elif o == "--los-only":
                 warnings.warn("option --los-only will have no effect with rungenericmany.py")
             elif o == "--crafting-effort=":
@@ -267,6 +310,7 @@ def main(argv=None):
             os.makedirs(outputdir)
             if genericsettings.verbose:
                 print('Folder %s was created.' % outputdir)
+        profiling.report_to(outputdir)
 
         latex_commands_file = os.path.join(outputdir, 'cocopp_commands.tex')
 
@@ -331,13 +375,15 @@ def main(argv=None):
                               'the correct instances ' +
                               'of function F%d.' % i.funcId)
 
-        plt.rc("axes", **inset.rcaxes)
-        plt.rc("xtick", **inset.rctick)
-        plt.rc("ytick", **inset.rctick)
-        plt.rc("font", **inset.rcfont)
-        plt.rc("legend", **inset.rclegend)
-        plt.rc('pdf', fonttype=42)
+        def set_rc():
+            plt.rc("axes", **inset.rcaxes)
+            plt.rc("xtick", **inset.rctick)
+            plt.rc("ytick", **inset.rctick)
+            plt.rc("font", **inset.rcfont)
+            plt.rc("legend", **inset.rclegend)
+            plt.rc('pdf', fonttype=42)
 
+        set_rc()
         ppfig.copy_js_files(many_algorithms_output)
 
         ppfig.save_single_functions_html(
@@ -370,43 +416,93 @@ def main(argv=None):
         if prepare_RLDistr:
             config.config(dsList[0].testbed_name, dsList[0].get_data_format())
 
-            if len(genericsettings.foreground_algorithm_list) == 2:
-                print("ECDF runlength ratio graphs...")
-
-                ds_list0 = dictAlg[sortedAlgs[0]]
-                dict_fun0 = ds_list0.dictByNoise()
-                ds_list1 = dictAlg[sortedAlgs[1]]
-                dict_fun1 = ds_list1.dictByNoise()
-
-                if len(dict_fun0) > 1 or len(dict_fun1) > 1:
-                    warnings.warn('Data for functions from both the noisy and ' +
-                                  'non-noisy testbeds have been found. Their ' +
-                                  'results will be mixed in the "all functions" ' +
-                                  'ECDF figures.')
-
-                algorithm_name0 = str_to_latex(strip_pathname1(sortedAlgs[0]))
-                algorithm_name1 = str_to_latex(strip_pathname1(sortedAlgs[1]))
-
-                algorithm_name = "%s vs %s" % (algorithm_name1, algorithm_name0)
-                ppfig.save_single_functions_html(
-                    os.path.join(many_algorithms_output, genericsettings.pprldistr2_file_name),
-                    algname=algorithm_name,
-                    htmlPage=ppfig.HtmlPage.PPRLDISTR2,
-                    function_groups=ds_list0.getFuncGroups(),
-                    parentFileName=genericsettings.many_algorithm_file_name
-                )
-
-                # ECDFs of aRT ratios
-                dic_dim0 = ds_list0.dictByDim()
-                dic_dim1 = ds_list1.dictByDim()
+        # the stages below only read the data and write distinct files,
+        # hence they can run concurrently, see genericsettings.stage_jobs
+        def two_algorithm_ecdf_graphs():
+            set_rc()
+            print("ECDF runlength ratio graphs...")
+
+            ds_list0 = dictAlg[sortedAlgs[0]]
+            dict_fun0 = ds_list0.dictByNoise()
+            ds_list1 = dictAlg[sortedAlgs[1]]
+            dict_fun1 = ds_list1.dictByNoise()
+
+            if len(dict_fun0) > 1 or len(dict_fun1) > 1:
+                warnings.warn('Data for functions from both the noisy and ' +
+                              'non-noisy testbeds have been found. Their ' +
+                              'results will be mixed in the "all functions" ' +
+                              'ECDF figures.')
+
+            algorithm_name0 = str_to_latex(strip_pathname1(sortedAlgs[0]))
+            algorithm_name1 = str_to_latex(strip_pathname1(sortedAlgs[1]))
+
+            algorithm_name = "%s vs %s" % (algorithm_name1, algorithm_name0)
+            ppfig.save_single_functions_html(
+                os.path.join(many_algorithms_output, genericsettings.pprldistr2_file_name),
+                algname=algorithm_name,
+                htmlPage=ppfig.HtmlPage.PPRLDISTR2,
+                function_groups=ds_list0.getFuncGroups(),
+                parentFileName=genericsettings.many_algorithm_file_name
+            )
+
+            # ECDFs of aRT ratios
+            dic_dim0 = ds_list0.dictByDim()
+            dic_dim1 = ds_list1.dictByDim()
+            for dim in set(dic_dim0.keys()) & set(dic_dim1.keys()):
+                if dim in inset.rldDimsOfInterest:
+                    # ECDF for all functions altogether
+                    try:
+                        pprldistr2.main(dic_dim0[dim], dic_dim1[dim], dim,
+                                        testbedsettings.current_testbed.rldValsOfInterest,
+                                        many_algorithms_output,
+                                        '%02dD_all' % dim)
+                    except KeyError:
+                        warnings.warn('Could not find some data in %d-D.' % dim)
+                        continue
+
+                    # ECDFs per function groups
+                    dict_fun_group0 = dic_dim0[dim].dictByFuncGroup()
+                    dict_fun_group1 = dic_dim1[dim].dictByFuncGroup()
+
+                    for fGroup in set(dict_fun_group0.keys()) & set(dict_fun_group1.keys()):
+                        pprldistr2.main(dict_fun_group1[fGroup], dict_fun_group0[fGroup], dim,
+                                        testbedsettings.current_testbed.rldValsOfInterest,
+                                        many_algorithms_output,
+                                        '%02dD_%s' % (dim, fGroup))
+
+                    # ECDFs per noise groups
+                    dict_fun0 = dic_dim0[dim].dictByNoise()
+                    dict_fun1 = dic_dim1[dim].dictByNoise()
+
+                    for fGroup in set(dict_fun0.keys()) & set(dict_fun1.keys()):
+                        pprldistr2.main(dict_fun1[fGroup], dict_fun0[fGroup], dim,
+                                        testbedsettings.current_testbed.rldValsOfInterest,
+                                        many_algorithms_output,
+                                        '%02dD_%s' % (dim, fGroup))
+
+            prepend_to_file(latex_commands_file,
+                            ['\\providecommand{\\bbobpprldistrlegendtwo}[1]{',
+                             pprldistr.caption_two(),  # depends on the config
+                             # setting, should depend
+                             # on maxfevals
+                             '}'
+                             ])
+            print_done()
+
+            if testbedsettings.current_testbed not in [testbedsettings.GECCOBiObjBBOBTestbed,
+                                                       testbedsettings.GECCOBiObjExtBBOBTestbed]:
+                print("ECDF runlength graphs...")
                 for dim in set(dic_dim0.keys()) & set(dic_dim1.keys()):
+                    pprldistr.fmax = None  # Resetting the max final value
+                    pprldistr.evalfmax = None  # Resetting the max #fevalsfactor
+                    # ECDFs of all functions altogether
                     if dim in inset.rldDimsOfInterest:
-                        # ECDF for all functions altogether
                         try:
-                            pprldistr2.main(dic_dim0[dim], dic_dim1[dim], dim,
-                                            testbedsettings.current_testbed.rldValsOfInterest,
-                                            many_algorithms_output,
-                                            '%02dD_all' % dim)
+                            pprldistr.comp(dic_dim1[dim], dic_dim0[dim],
+                                           testbedsettings.current_testbed.rldValsOfInterest,
+                                           # TODO: let rldVals... possibly be RL-based targets
+                                           True,
+                                           many_algorithms_output, 'all')
                         except KeyError:
                             warnings.warn('Could not find some data in %d-D.' % dim)
                             continue
@@ -416,68 +512,23 @@ def main(argv=None):
                         dict_fun_group1 = dic_dim1[dim].dictByFuncGroup()
 
                         for fGroup in set(dict_fun_group0.keys()) & set(dict_fun_group1.keys()):
-                            pprldistr2.main(dict_fun_group1[fGroup], dict_fun_group0[fGroup], dim,
-                                            testbedsettings.current_testbed.rldValsOfInterest,
-                                            many_algorithms_output,
-                                            '%02dD_%s' % (dim, fGroup))
+                            pprldistr.comp(dict_fun_group1[fGroup], dict_fun_group0[fGroup],
+                                           testbedsettings.current_testbed.rldValsOfInterest, True,
+                                           many_algorithms_output,
+                                           '%s' % fGroup)
 
                         # ECDFs per noise groups
                         dict_fun0 = dic_dim0[dim].dictByNoise()
                         dict_fun1 = dic_dim1[dim].dictByNoise()
-
                         for fGroup in set(dict_fun0.keys()) & set(dict_fun1.keys()):
-                            pprldistr2.main(dict_fun1[fGroup], dict_fun0[fGroup], dim,
-                                            testbedsettings.current_testbed.rldValsOfInterest,
-                                            many_algorithms_output,
-                                            '%02dD_%s' % (dim, fGroup))
-
-                prepend_to_file(latex_commands_file,
-                                ['\\providecommand{\\bbobpprldistrlegendtwo}[1]{',
-                                 pprldistr.caption_two(),  # depends on the config
-                                 # setting, should depend
-                                 # on maxfevals
-                                 '}'
-                                 ])
-                print_done()
-
-                if testbedsettings.current_testbed not in [testbedsettings.GECCOBiObjBBOBTestbed,
-                                                           testbedsettings.GECCOBiObjExtBBOBTestbed]:
-                    print("ECDF runlength graphs...")
-                    for dim in set(dic_dim0.keys()) & set(dic_dim1.keys()):
-                        pprldistr.fmax = None  # Resetting the max final value
-                        pprldistr.evalfmax = None  # Resetting the max #fevalsfactor
-                        # ECDFs of all functions altogether
-                        if dim in inset.rldDimsOfInterest:
-                            try:
-                                pprldistr.comp(dic_dim1[dim], dic_dim0[dim],
-                                               testbedsettings.current_testbed.rldValsOfInterest,
-                                               # TODO: let rldVals... possibly be RL-based targets
-                                               True,
-                                               many_algorithms_output, 'all')
-                            except KeyError:
-                                warnings.warn('Could not find some data in %d-D.' % dim)
-                                continue
-
-                            # ECDFs per function groups
-                            dict_fun_group0 = dic_dim0[dim].dictByFuncGroup()
-                            dict_fun_group1 = dic_dim1[dim].dictByFuncGroup()
-
-                            for fGroup in set(dict_fun_group0.keys()) & set(dict_fun_group1.keys()):
-                                pprldistr.comp(dict_fun_group1[fGroup], dict_fun_group0[fGroup],
-                                               testbedsettings.current_testbed.rldValsOfInterest, True,
-                                               many_algorithms_output,
-                                               '%s' % fGroup)
-
-                            # ECDFs per noise groups
-                            dict_fun0 = dic_dim0[dim].dictByNoise()
-                            dict_fun1 = dic_dim1[dim].dictByNoise()
-                            for fGroup in set(dict_fun0.keys()) & set(dict_fun1.keys()):
-                                pprldistr.comp(dict_fun1[fGroup], dict_fun0[fGroup],
-                                               testbedsettings.current_testbed.rldValsOfInterest, True,
-                                               many_algorithms_output,
-                                               '%s' % fGroup)
-                    print_done()  # of "ECDF runlength graphs..."
-
+                            pprldistr.comp(dict_fun1[fGroup], dict_fun0[fGroup],
+                                           testbedsettings.current_testbed.rldValsOfInterest, True,
+                                           many_algorithms_output,
+                                           '%s' % fGroup)
+                print_done()  # of "ECDF runlength graphs..."
+
+        def ecdf_graphs_per_noise_group():
+            set_rc()
             # ECDFs per noise groups
             print("ECDF graphs per noise group...")
             grouped_ecdf_graphs(pproc.dictAlgByNoi(dictAlg),
@@ -488,6 +539,8 @@ def main(argv=None):
                                 genericsettings.many_algorithm_file_name)
             print_done()
 
+        def ecdf_graphs_per_function_group():
+            set_rc()
             # ECDFs per function groups
             print("ECDF graphs per function group...")
             grouped_ecdf_graphs(pproc.dictAlgByFuncGroup(dictAlg),
@@ -498,6 +551,8 @@ def main(argv=None):
                                 genericsettings.many_algorithm_file_name)
             print_done()
 
+        def ecdf_graphs_per_function():
+            set_rc()
             # copy-paste from above, here for each function instead of function groups:
             print("ECDF graphs per function...")
             if genericsettings.isRldOnSingleFcts:
@@ -537,7 +592,8 @@ def main(argv=None):
                             header=ppfig.pprldmany_per_func_dim_header)
             print_done()
 
-        if prepare_tables:
+        def tables():
+            set_rc()
             print("Generating comparison tables...")
             prepend_to_file(latex_commands_file,
                             ['\providecommand{\\bbobpptablesmanylegend}[1]{' +
@@ -555,7 +611,8 @@ def main(argv=None):
                         latex_commands_file)
             print_done()
 
-        if prepare_scatter and len(genericsettings.foreground_algorithm_list) == 2:
+        def scatter_plots():
+            set_rc()
             print("Scatter plots...")
 
             ds_list0 = dictAlg[sortedAlgs[0]]
@@ -587,7 +644,7 @@ def main(argv=None):
 
             print_done()
 
-        if prepare_figures:
+        def scaling_figures():
             print("Scaling figures...")
             plt.rc("axes", labelsize=20, titlesize=24)
             plt.rc("xtick", labelsize=20)
@@ -603,6 +660,24 @@ def main(argv=None):
                         latex_commands_file)
             plt.rcdefaults()
             print_done()
+
+        stages = []
+        if prepare_RLDistr:
+            if len(genericsettings.foreground_algorithm_list) == 2:
+                stages.append(('two algorithm ECDF graphs', two_algorithm_ecdf_graphs, ()))
+            stages.append(('ECDF graphs per noise group', ecdf_graphs_per_noise_group, ()))
+            # both write the same html file
+            stages.append(('ECDF graphs per function group', ecdf_graphs_per_function_group,
+                           ('ECDF graphs per noise group', )))
+            stages.append(('ECDF graphs per function', ecdf_graphs_per_function, ()))
+        if prepare_tables:
+            stages.append(('tables', tables, ()))
+        if prepare_scatter and len(genericsettings.foreground_algorithm_list) == 2:
+            stages.append(('scatter plots', scatter_plots, ()))
+        if prepare_figures:
+            stages.append(('scaling figures', scaling_figures, ()))
+        toolsdivers.run_stages(stages)
+
         print("Output data written to folder %s" %
               os.path.join(os.getcwd(), many_algorithms_output))
 
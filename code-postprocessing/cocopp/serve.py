@@ -0,0 +1,226 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Post-processing service which keeps data in memory between requests.
+
+Started from the shell with::
+
+    $ python -m cocopp serve [--port=8000] [--host=localhost] [--token=secret]
+
+the service accepts post-processing requests via HTTP. A ``POST``
+request with a JSON object as body runs the post-processing with the
+arguments given as ``"args"``, either as a string or as a list of
+strings, exactly like ``python -m cocopp`` on the shell::
+
+    $ curl -H "X-Cocopp-Token: secret" -H "Content-Type: application/json" \\
+    >      -d '{"args": "-o ppdata folder1 folder2"}' localhost:8000
+
+With ``"stage": "rungeneric1"`` or ``"stage": "rungenericmany"``, the
+arguments are passed directly to `rungeneric1.main` or
+`rungenericmany.main`, respectively. The response is a JSON object with
+``"status"`` being ``"ok"`` or ``"error"``. A ``GET`` request returns
+the status of the service.
+
+Each request runs with the settings the service was started with, see
+`context.Context`, and requests are processed one after the other.
+Data parsed from index files and reference algorithm data are kept in
+memory, see `genericsettings.keep_data_in_memory`, hence only data
+which are new or have changed are read again.
+
+A request can read and write any file the service can access. Hence
+every request must send a token in the ``X-Cocopp-Token`` header, also
+on ``localhost``, because any web page open in a browser can send
+requests to a local service. The token is given with ``--token`` or
+otherwise generated and printed when the service starts. Requests with
+an ``Origin`` header, which browsers send, and ``POST`` requests
+without ``Content-Type: application/json`` are rejected as well. The
+service should only listen on a loopback address like ``localhost``.
+
+    >>> import json, threading
+    >>> from cocopp import serve
+    >>> server = serve.make_server(port=0, token='secret')
+    >>> thread = threading.Thread(target=server.handle_request)
+    >>> thread.start()
+    >>> response = serve.urlopen(serve.Request(
+    ...     'http://localhost:%d' % server.server_port,
+    ...     headers={'X-Cocopp-Token': 'secret'}))
+    >>> json.loads(response.read().decode('utf-8'))['status']
+    'ok'
+    >>> thread.join()
+    >>> server.server_close()
+
+"""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import hmac
+import json
+import time
+import socket
+import getopt
+import binascii
+import traceback
+if sys.version_info[0] >= 3:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from urllib.request import urlopen, Request
+else:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from urllib2 import urlopen, Request
+
+from . import genericsettings, pproc, rungeneric, rungeneric1, rungenericmany
+from .context import Context
+from .ppfig import Usage
+
+stages = {'main': rungeneric.main,
+          'rungeneric1': rungeneric1.main,
+          'rungenericmany': rungenericmany.main}
+"""post-processing functions which can be called in a request"""
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """handle post-processing requests, see the module documentation"""
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        self._respond(200, {'status': 'ok',
+                            'version': getattr(sys.modules.get(__package__),
+                                               '__version__', None),
+                            'index_files_in_memory': len(pproc._parsed_index_files)})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.headers.get('Content-Type', '').split(';')[0].strip() != 'application/json':
+            self._respond(415, {'status': 'error',
+                                'error': 'Content-Type must be application/json'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            stage = stages[request.get('stage', 'main')]
+            args = request['args']
+            if not isinstance(args, list):
+                args = str(args).split()
+        except (ValueError, KeyError, TypeError) as e:
+            self._respond(400, {'status': 'error',
+                                'error': 'malformed request (%s)' % str(e)})
+            return
+        start = time.time()
+        try:
+            stage(args, context=self.server.context_for_request())
+        except (Exception, SystemExit) as e:  # keep serving
+            self._respond(500, {'status': 'error', 'error': repr(e),
+                                'traceback': traceback.format_exc()})
+            return
+        self._respond(200, {'status': 'ok', 'seconds': time.time() - start})
+
+    def _authorized(self):
+        """return whether the request has the token of the server and
+        does not come from a browser, respond with an error otherwise"""
+        if self.headers.get('Origin') is not None:
+            self._respond(403, {'status': 'error',
+                                'error': 'requests from browsers are not served'})
+            return False
+        if hmac.compare_digest(
+                self.headers.get('X-Cocopp-Token', '').encode('utf-8'),
+                self.server.token.encode('utf-8')):
+            return True
+        self._respond(403, {'status': 'error', 'error': 'missing or wrong token'})
+        return False
+
+    def _respond(self, code, result):
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if genericsettings.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class Server(HTTPServer):
+    """HTTP server which runs each request in a copy of the state the
+    server was started with. Requests must send `token`."""
+
+    def __init__(self, *args, **kwargs):
+        self.token = kwargs.pop('token')
+        HTTPServer.__init__(self, *args, **kwargs)
+        self.context = Context()
+
+    def context_for_request(self):
+        """return a new `context.Context` with the initial state"""
+        with self.context:
+            return Context()
+
+
+def is_loopback(host):
+    """return whether `host` is a loopback address
+
+    >>> from cocopp.serve import is_loopback
+    >>> is_loopback('localhost'), is_loopback('127.0.0.1'), is_loopback('0.0.0.0')
+    (True, True, False)
+    """
+    if host in ('localhost', '::1'):
+        return True
+    try:
+        return socket.gethostbyname(host).startswith('127.')
+    except socket.error:
+        return False
+
+
+def new_token():
+    """return a random token for `make_server`"""
+    return binascii.hexlify(os.urandom(16)).decode('ascii')
+
+
+def make_server(host='localhost', port=8000, token=None):
+    """return a `Server` serving on `host` and `port`, where ``port=0``
+    chooses a free port.
+
+    Requests must send `token` in the ``X-Cocopp-Token`` header. If
+    `token` is `None`, a new token is generated, see ``server.token``.
+    """
+    if token is None:
+        token = new_token()
+    genericsettings.keep_data_in_memory = True
+    return Server((host, port), RequestHandler, token=token)
+
+
+def main(argv=None):
+    """serve post-processing requests until interrupted.
+
+    Accepts the options ``--port=N`` (default 8000), ``--host=name``
+    (default ``localhost``) and ``--token=secret``. If no token is
+    given, a token is generated and printed.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    try:
+        opts, args = getopt.getopt(argv, '', ['port=', 'host=', 'token='])
+    except getopt.error as msg:
+        raise Usage(msg)
+    options = dict(opts)
+    host = options.get('--host', 'localhost')
+    token = options.get('--token') or new_token()
+    if not is_loopback(host):
+        sys.stderr.write(
+            '*** WARNING: serving on %s, which is not a loopback address.\n'
+            '*** Requests run the post-processing with the rights of this\n'
+            '*** process, anyone with the token can read and write files.\n'
+            % host)
+    server = make_server(host, int(options.get('--port', 8000)), token)
+    print('Serving cocopp post-processing on http://%s:%d' %
+          (server.server_name, server.server_port))
+    print('Requests must send the header "X-Cocopp-Token: %s"' % token)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -179,6 +179,35 @@ def process_doctest_output(stream=None):
             s2 += line + ''
 
 
+import_time_limit = 10
+"""seconds which ``import cocopp`` may take at most in `test_import_time`,
+generous to not fail on slow machines, `None` means the time is only
+reported"""
+
+def test_import_time(repetitions=3):
+    """check that ``import cocopp`` imports neither `matplotlib` nor
+    `pkg_resources` and report how long the import takes.
+
+    Each import is timed in a new python process. Unless
+    `import_time_limit` is `None`, the best of `repetitions` must be
+    below `import_time_limit`.
+    """
+    code = ('import sys, time; t0 = time.time(); import cocopp; '
+            'print(time.time() - t0); '
+            'print(" ".join(m for m in ("matplotlib", "pkg_resources") '
+            'if m in sys.modules))')
+    best = None
+    for _ in range(repetitions):
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         universal_newlines=True).split('\n')
+        seconds, imported = float(output[0]), output[1].strip()
+        assert not imported, '"import cocopp" imported %s' % imported
+        best = seconds if best is None else min((best, seconds))
+    print('**  import cocopp took %.3f seconds' % best)
+    if import_time_limit is not None:
+        assert best < import_time_limit, (
+            '"import cocopp" took %.3f > %.3f seconds' % (best, import_time_limit))
+
 def delete_files(all_files=False):
     shutil.rmtree('ppdata')
     if all_files:
@@ -216,6 +245,7 @@ def main(arguments):
     #print('LaTeX templates copied.')
 
     print('*** testing module cocopp ***')
+
     t0 = time.time()
     data_path = data_archive_get('BFGS_ros_noiseless')
     print(python + command + # '--conv ' +
@@ -390,4 +420,6 @@ def main(arguments):
 """
 
 if __name__ == "__main__":
-    main(sys.argv[1:])
+    test_import_time()  # needs no data, ``python test.py import-time`` runs only this
+    if sys.argv[1:] != ['import-time']:
+        main(sys.argv[1:])
@@ -7,12 +7,49 @@
 from __future__ import absolute_import, print_function
 
 import os, time
+import sys
+import types
+import numbers
+import hashlib
+import pickle
+import warnings
+import multiprocessing
+import importlib
+import collections
+import threading
 import numpy as np
-from matplotlib import pyplot as plt
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
 from subprocess import CalledProcessError, STDOUT
-import pkg_resources
 
-from . import genericsettings, testbedsettings
+from . import genericsettings, testbedsettings, context, profiling
+
+class LazyModule(object):
+    """Proxy of the module `name` which is imported only on the first
+    attribute access.
+
+    Keeps `matplotlib` and `pkg_resources`, which are slow to import,
+    out of code paths which do not use them:
+
+    >>> from cocopp.toolsdivers import LazyModule
+    >>> path = LazyModule('os.path')
+    >>> path.join('a', 'b') == os.path.join('a', 'b')
+    True
+
+    """
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self):
+        return '<lazily imported module %r>' % self._name
+
+plt = LazyModule('matplotlib.pyplot')
+pkg_resources = LazyModule('pkg_resources')
 
 class Infolder(object):
     """Contextmanager to do some work in a folder of choice and change dir
@@ -63,6 +100,40 @@ class StringList(list):
         return ' ' + ' '.join(self) + ' '
 
 
+class LeastRecentlyUsedDict(collections.OrderedDict):
+    """`dict` which keeps at most `maxsize` items by removing the least
+    recently used item, where only `get` and setting an item count as
+    use.
+
+    >>> from cocopp.toolsdivers import LeastRecentlyUsedDict
+    >>> d = LeastRecentlyUsedDict(2)
+    >>> d['a'], d['b'] = 1, 2
+    >>> d.get('a')
+    1
+    >>> d['c'] = 3
+    >>> sorted(d)
+    ['a', 'c']
+
+    """
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        collections.OrderedDict.__init__(self)
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        value = collections.OrderedDict.pop(self, key)
+        collections.OrderedDict.__setitem__(self, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self:
+            collections.OrderedDict.__delitem__(self, key)
+        collections.OrderedDict.__setitem__(self, key, value)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
 def print_done(message='  done'):
     """prints a message with time stamp"""
     print(message, '(' + time.asctime() + ').')
@@ -100,8 +171,26 @@ def diff_attr(m1, m2, exclude=('_', )):
                     not any(key.startswith(s) for s in exclude)
                     and getattr(m1, key) != getattr(m2, key)]
 
+_deferred_calls = None  # calls to be made after all stages, see `run_stages`
+
+
+def defer_call(function, *args):
+    """record ``function(*args)`` to be called by `run_stages` after all
+    stages have finished and return `True` when running in a stage
+    worker process, otherwise return `False`.
+
+    Used for writing files which several stages write to.
+    """
+    if _deferred_calls is None:
+        return False
+    _deferred_calls.append((function, args))
+    return True
+
+
 def prepend_to_file(filename, lines, maxlines=1000, warn_message=None):
     """"prepend lines the tex-command filename """
+    if defer_call(prepend_to_file, filename, lines, maxlines, warn_message):
+        return
     try:
         with open(filename, 'r') as f:
             lines_to_append = list(f)
@@ -130,7 +219,21 @@ def replace_in_file(filename, old_text, new_text):
         with open(filename, 'w') as f:
             for line in lines:
                 f.write(line.replace(old_text, new_text))
-        
+
+def replace_file(source, target):
+    """rename file `source` to `target`, replacing `target` atomically
+    with `os.replace` if available.
+
+    On Python 2, `target` is removed first, because `os.rename` fails
+    on Windows if `target` exists.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(source, target)
+    else:
+        if os.path.exists(target):
+            os.remove(target)
+        os.rename(source, target)
+
 def truncate_latex_command_file(filename, keeplines=200):
     """truncate file but keep in good latex shape"""
     open(filename, 'a').close()
@@ -350,4 +453,348 @@ def path_in_package(sub_path=""):
     """return the absolute path prepended to `subpath` in this module.
     """
     egg_info = pkg_resources.require('cocopp')[0]
-    return os.path.join(egg_info.location, egg_info.project_name, sub_path)
\ No newline at end of file
+    return os.path.join(egg_info.location, egg_info.project_name, sub_path)
+
+
+_inputs_hash_ignored_settings = (
+    'jobs', 'stage_jobs', 'download_jobs', 'verbose', 'profile',
+    'skip_unchanged_outputs', 'keep_data_in_memory',
+    'reference_algorithm_cache_folder', 'derived_statistics_folder',
+    'extraction_folder_prefix',
+    'previous_data_dict', 'previous_RLBdata_dict')
+"""settings which do not change any output. The last entries are data
+loaded on first use by `pprldistr`, their file names are settings."""
+
+
+def _is_setting(value):
+    """return whether `value` is a number, a string, ``None`` or a
+    sequence or dictionary of these"""
+    if value is None or isinstance(value, (numbers.Number, str, bytes, type(u''))):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_is_setting(v) for v in value)
+    if isinstance(value, dict):
+        return all(_is_setting(k) and _is_setting(v) for k, v in value.items())
+    return False
+
+
+def _update_hash(h, x, _ids, _folder=None):
+    """update hash object `h` with the content of `x`, see `inputs_hash`.
+
+    The string `_folder` is hashed as a placeholder, see
+    `output_record_key`.
+    """
+    if _folder is not None and isinstance(x, (str, type(u''))) and x == _folder:
+        h.update(b'<folder>')
+    elif x is None or isinstance(x, (numbers.Number, str, bytes, type(u''))):
+        h.update(repr(x).encode('utf-8'))
+    elif isinstance(x, np.ndarray):
+        if x.dtype == object:
+            _update_hash(h, x.tolist(), _ids, _folder)
+        else:
+            h.update(repr((x.dtype.str, x.shape)).encode('utf-8'))
+            h.update(np.ascontiguousarray(x).tobytes())
+    elif hasattr(x, 'fingerprint') and not isinstance(x, type):
+        h.update(x.fingerprint().encode('utf-8'))
+    elif isinstance(x, types.ModuleType):  # only public settings are used
+        h.update(x.__name__.encode('utf-8'))
+        _update_hash(h, dict((k, v) for k, v in vars(x).items()
+                             if not k.startswith('_') and _is_setting(v) and
+                             k not in _inputs_hash_ignored_settings), _ids, _folder)
+    elif isinstance(x, (types.FunctionType, types.BuiltinFunctionType,
+                        types.MethodType, type)):
+        h.update(('%s.%s' % (getattr(x, '__module__', ''),
+                             getattr(x, '__name__', ''))).encode('utf-8'))
+    elif id(x) in _ids:  # reference cycle
+        h.update(b'...')
+    else:
+        _ids.add(id(x))
+        h.update(type(x).__name__.encode('utf-8'))
+        if isinstance(x, dict):
+            for key in sorted(x, key=repr):
+                _update_hash(h, key, _ids, _folder)
+                _update_hash(h, x[key], _ids, _folder)
+        elif isinstance(x, (list, tuple)):
+            for item in x:
+                _update_hash(h, item, _ids, _folder)
+        elif isinstance(x, (set, frozenset)):
+            for item in sorted(x, key=repr):
+                _update_hash(h, item, _ids, _folder)
+        elif hasattr(x, '__dict__'):
+            _update_hash(h, vars(x), _ids, _folder)
+        else:
+            h.update(repr(x).encode('utf-8'))
+        _ids.remove(id(x))
+
+
+_cocopp_version = []  # computed once as ``pkg_resources.require`` is slow
+
+def inputs_hash(*inputs):
+    """return a hexadecimal hash of `inputs` and of the settings.
+
+    The settings are the values of `genericsettings`, the current testbed
+    and the cocopp version. `inputs` may contain nested numbers,
+    strings, arrays, sequences, dictionaries, modules, of which the
+    public settings are used, objects with a ``fingerprint`` method like
+    `pproc.DataSet`, and other objects, which are hashed by class name
+    and attributes.
+
+    >>> from cocopp.toolsdivers import inputs_hash
+    >>> inputs_hash([1, 'a']) == inputs_hash([1, 'a'])
+    True
+    >>> inputs_hash([1, 'a']) == inputs_hash([1, 'b'])
+    False
+
+    """
+    return _inputs_hash(inputs)
+
+
+def _inputs_hash(inputs, folder=None):
+    """return `inputs_hash` of the sequence `inputs`, where the string
+    `folder` is replaced by a placeholder"""
+    if not _cocopp_version:
+        _cocopp_version.append(pkg_resources.require('cocopp')[0].version)
+    h = hashlib.sha1()
+    _update_hash(h, (_cocopp_version[0], genericsettings,
+                     testbedsettings.current_testbed, inputs), set(), folder)
+    return h.hexdigest()
+
+
+def output_record_key(filename, *inputs):
+    """return `inputs_hash` of `inputs` for output `filename` if
+    `genericsettings.skip_unchanged_outputs`, else `None`.
+
+    The folder of `filename` is not hashed, because the record is
+    written into this folder anyway, such that the key does not depend
+    on where the output folder is. Computing the hash costs time, hence
+    it is only computed when the output records are used.
+    """
+    if not genericsettings.skip_unchanged_outputs:
+        return None
+    return _inputs_hash(inputs, os.path.dirname(filename))
+
+
+def _output_record_filename(filename):
+    head, tail = os.path.split(filename)
+    return os.path.join(head, '.%s.inputs' % tail)
+
+
+def load_output_record(filename, key, outputs=()):
+    """return ``(True, value)`` if `filename` was recorded with inputs
+    hash `key` and all files in `outputs` exist, ``(False, None)``
+    otherwise.
+
+    `value` is the value passed to `save_output_record`, `key` is
+    usually computed with `output_record_key`. Outputs are never
+    considered unchanged if `key` is `None` or
+    `genericsettings.skip_unchanged_outputs` is `False`.
+    """
+    if key is None or not genericsettings.skip_unchanged_outputs:
+        return False, None
+    try:
+        with open(_output_record_filename(filename), 'rb') as f:
+            record = pickle.load(f)
+    except Exception:  # missing or unreadable record
+        return False, None
+    if (not isinstance(record, dict) or record.get('key') != key or
+            not all(os.path.exists(name) for name in outputs)):
+        return False, None
+    return True, record.get('value')
+
+
+def save_output_record(filename, key, value=None):
+    """record inputs hash `key` and `value` next to output `filename`,
+    see `load_output_record`. Nothing is written if `key` is `None` or
+    `genericsettings.skip_unchanged_outputs` is `False`."""
+    if key is None or not genericsettings.skip_unchanged_outputs:
+        return
+    try:
+        with open(_output_record_filename(filename), 'wb') as f:
+            pickle.dump(dict(key=key, value=value), f, protocol=2)
+    except (IOError, OSError, pickle.PicklingError) as e:
+        warnings.warn('could not record inputs of %s (%s)' % (filename, str(e)))
+
+
+def _init_parallel_worker(processing_context):
+    """set the state of a worker process started by `parallel_map` to
+    the `context.Context` of the calling process"""
+    processing_context.restore()
+    genericsettings.jobs = 1  # worker processes cannot start their own pool
+    # font objects inherited from a parent process which has drawn text are
+    # not usable, the cache only exists if matplotlib was imported before
+    font_manager = sys.modules.get('matplotlib.font_manager')
+    if hasattr(getattr(font_manager, '_get_font', None), 'cache_clear'):
+        font_manager._get_font.cache_clear()
+
+
+def parallel_map(function, iterable, jobs=None):
+    """return an iterator over ``function(x) for x in iterable``.
+
+    The results are computed with `jobs` processes, by default
+    `genericsettings.jobs`, where ``jobs < 1`` means the number of
+    cores. Results are returned in the order of `iterable` as soon as
+    they are available, hence they can be processed while later
+    results are still computed. With ``jobs == 1``, with
+    ``--cprofile`` and when not called from the main thread, everything
+    is computed lazily in the current process. In all other cases
+    `function` and the elements of `iterable` must be picklable, in
+    particular `function` must be defined at module level.
+
+    >>> from cocopp.toolsdivers import parallel_map
+    >>> list(parallel_map(abs, [-1, 2, -3], jobs=2))
+    [1, 2, 3]
+
+    """
+    if jobs is None:
+        jobs = genericsettings.jobs
+    if jobs < 1:
+        jobs = multiprocessing.cpu_count()
+    jobs = _serial_if_cprofile(jobs)
+    if jobs > 1:
+        iterable = list(iterable)
+        jobs = min((jobs, len(iterable)))
+    if jobs <= 1 or not _in_main_thread():
+        for x in iterable:
+            yield function(x)
+        return
+    pool = multiprocessing.Pool(jobs, _init_parallel_worker,
+                                (context.Context(), ))
+    try:
+        for res in pool.imap(function, iterable):
+            yield res
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _serial_if_cprofile(jobs):
+    """return 1 instead of `jobs` with ``--cprofile``, because `cProfile`
+    sees nothing of what is computed in worker processes"""
+    if jobs > 1 and genericsettings.profile > 1:
+        warnings.warn('--cprofile computes everything in a single process, '
+                      '--jobs and --stage-jobs are ignored')
+        return 1
+    return jobs
+
+
+def _in_main_thread():
+    """return whether the calling thread is the main thread. Worker
+    processes are only started from the main thread, because forking a
+    process with several threads, like in `serve`, is not safe."""
+    main_thread = getattr(threading, 'main_thread', None)
+    if main_thread is None:  # Python 2
+        return isinstance(threading.current_thread(), threading._MainThread)
+    return threading.current_thread() is main_thread()
+
+
+_stages = []  # stages of the current `run_stages` call, inherited by forked workers
+
+
+def _run_stage(index):
+    """run stage number `index` of `run_stages` in a worker process and
+    return its result and its deferred calls, see `defer_call`"""
+    global _deferred_calls
+    _deferred_calls = []
+    return _stages[index][1](), _deferred_calls
+
+
+def run_stages(stages, jobs=None):
+    """run `stages` and return a `dict` of their results by name.
+
+    `stages` is a list of ``(name, function, required_names)`` tuples,
+    where `function` is called without arguments after the stages
+    named in `required_names`, which must precede in the list, have
+    finished. With `jobs` processes, by default
+    `genericsettings.stage_jobs`, stages whose requirements are met run
+    concurrently in worker processes, where ``jobs < 1`` means the
+    number of cores. Changes of module attributes in a worker do not
+    reach the calling process. Writing files shared between stages,
+    like with `prepend_to_file`, is deferred with `defer_call` to the
+    end and done in the order of `stages`, such that the written files
+    do not depend on which stage finishes first. With ``jobs == 1`` the
+    stages run one after the other in the current process, like they
+    always do when `run_stages` is not called from the main thread,
+    under Python 2 and with ``--cprofile``.
+
+    >>> import os, time, tempfile
+    >>> from cocopp.toolsdivers import run_stages, prepend_to_file
+    >>> done = []
+    >>> res = run_stages([('a', lambda: done.append('a'), ()),
+    ...                   ('b', lambda: done.append('b'), ('a', ))], jobs=1)
+    >>> done
+    ['a', 'b']
+    >>> sorted(run_stages([('a', lambda: 1, ()), ('b', lambda: 2, ()),
+    ...                    ('c', lambda: 3, ('a', 'b'))], jobs=2).items())
+    [('a', 1), ('b', 2), ('c', 3)]
+
+    A stage starts only when its required stages have finished, and the
+    deferred writes are done in the order of `stages`:
+
+    >>> folder = tempfile.mkdtemp()
+    >>> filename = os.path.join(folder, 'a.txt')
+    >>> def a():
+    ...     time.sleep(0.3)
+    ...     open(filename, 'w').write('from a')
+    ...     prepend_to_file(os.path.join(folder, 'ab.txt'), ['a'])
+    >>> def b():
+    ...     prepend_to_file(os.path.join(folder, 'ab.txt'), ['b'])
+    >>> res = run_stages([('a', a, ()), ('b', b, ()),
+    ...                   ('c', lambda: open(filename).read(), ('a', ))], jobs=3)
+    >>> res['c']
+    'from a'
+    >>> open(os.path.join(folder, 'ab.txt')).read().split()
+    ['b', 'a']
+
+    """
+    global _stages
+    names = [stage[0] for stage in stages]
+    for i, (name, function, required_names) in enumerate(stages):
+        for required in required_names:
+            if required not in names[:i]:
+                raise ValueError('stage "%s" requires "%s" which is not an '
+                                 'earlier stage' % (name, required))
+    if jobs is None:
+        jobs = genericsettings.stage_jobs
+    if jobs < 1:
+        jobs = multiprocessing.cpu_count()
+    jobs = _serial_if_cprofile(min((jobs, len(stages))))
+    # stages are not picklable, hence workers must be forked, and Python 2
+    # has no error_callback to notice failed stages
+    if (jobs <= 1 or not hasattr(os, 'fork') or sys.version_info[0] < 3 or
+            not _in_main_thread()):
+        results = {}
+        for name, function, _ in stages:
+            with profiling.stage(name, dump=True):
+                results[name] = function()
+        return results
+    _stages = list(stages)
+    pool = multiprocessing.get_context('fork').Pool(
+        jobs, _init_parallel_worker, (context.Context(), ))
+    results, running = {}, set()
+    finished = queue.Queue()  # (name, result, exception) of finished stages
+    try:
+        with profiling.stage('concurrent stages'):
+            while len(results) < len(stages):
+                for i, (name, function, required_names) in enumerate(stages):
+                    if (name not in results and name not in running and
+                            all(required in results for required in required_names)):
+                        running.add(name)
+                        pool.apply_async(
+                            _run_stage, (i, ),
+                            callback=lambda res, name=name: finished.put((name, res, None)),
+                            error_callback=lambda e, name=name: finished.put((name, None, e)))
+                name, res, exception = finished.get()
+                if exception is not None:
+                    raise exception
+                running.remove(name)
+                results[name] = res
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        _stages = []
+    for name in names:
+        for function, args in results[name][1]:
+            function(*args)
+    return dict((name, results[name][0]) for name in names)
@@ -4,18 +4,78 @@
 """Bootstrapping and statistics routines."""
 
 from __future__ import absolute_import, print_function
+import numbers
 import warnings
+import zlib
 import numpy as np
-from . import genericsettings
+from . import genericsettings, profiling
 from pdb import set_trace
 
+_root_seed = None
+"""root seed of the per-task random states, see `set_seed`"""
+
 def _has_len(thing):
     try: len(thing)
     except TypeError: return False
     return True
 
+def set_seed(seed):
+    """set the root seed of all random states delivered by
+    `task_random_state` and seed the global `numpy.random` state.
+
+    ``set_seed(None)`` restores the default behavior, where all random
+    numbers are drawn from the global `numpy.random` state.
+    """
+    global _root_seed
+    _root_seed = seed
+    np.random.seed(seed)
+
+def _stable_hash(item):
+    """return a 32-bit integer from `item` which does not depend on the
+    process (unlike `hash`) nor on the `numpy` version"""
+    if isinstance(item, numbers.Integral):
+        item = int(item)
+    elif isinstance(item, numbers.Real):
+        item = float(item)
+    else:
+        item = str(item)
+    return zlib.crc32(repr(item).encode('utf-8')) & 0xffffffff
+
+def task_random_state(*key):
+    """return an independent `numpy.random.RandomState` for the task
+    identified by `key`, typically ``(algId, funcId, dim, target)``.
+
+    The random state is derived from the root seed given to `set_seed`
+    and from `key` only. Hence the drawn random numbers do not depend on
+    the order in which tasks are processed, which makes serial and
+    parallel post-processing give the same results.
+
+    Without a root seed, the `numpy.random` module itself is returned,
+    that is, the global random state is used as before.
+
+    >>> import numpy as np
+    >>> from cocopp.toolsstats import set_seed, task_random_state
+    >>> set_seed(3)
+    >>> r1 = task_random_state('alg', 1, 20, 1e-8).randint(1000, size=5)
+    >>> _ = np.random.rand(10)  # advancing the global state has no effect
+    >>> r2 = task_random_state('alg', 1, 20, 1e-8).randint(1000, size=5)
+    >>> assert all(r1 == r2)
+    >>> assert any(r1 != task_random_state('alg', 2, 20, 1e-8).randint(1000, size=5))
+    >>> set_seed(None)
+    >>> assert task_random_state('alg', 1, 20, 1e-8) is np.random
+
+    """
+    if _root_seed is None:
+        return np.random
+    spawn_key = tuple(_stable_hash(k) for k in key)
+    try:
+        seed_sequence = np.random.SeedSequence(_root_seed, spawn_key=spawn_key)
+    except AttributeError:  # numpy < 1.17
+        return np.random.RandomState([_stable_hash(_root_seed)] + list(spawn_key))
+    return np.random.RandomState(np.random.MT19937(seed_sequence))
+
 def fix_data_number(data, ndata=15,
-                       last_elements_randomized=True, warn=False):
+                       last_elements_randomized=True, warn=False, rng=None):
     """Obsolete and subject to removal. Use instead
     ``np.asarray(data)[randint_derandomized(0, len(data), ndata)]`` or
     ``[data[i] for i in randint_derandomized(0, len(data), ndata)]``.
@@ -26,6 +86,8 @@ def fix_data_number(data, ndata=15,
     Assures ``len(data) == ndata``.
 
     :param data: is a (row)-vector
+    :param rng: random state, see `task_random_state`, by default the
+        global `numpy.random` state
 
     >>> from cocopp.toolsstats import fix_data_number
     >>> data = [1,2,4]
@@ -41,13 +103,15 @@ def fix_data_number(data, ndata=15,
     """
     if len(data) == ndata:
         return data
+    if rng is None:
+        rng = np.random
     len_ = len(data)
     if warn:
         warnings.warn(str([len_, ndata]) +
                       ' actual and desired number of data disagree')
     if len_ > ndata:
         if last_elements_randomized:
-            return np.random.permutation(data)[:ndata]
+            return rng.permutation(data)[:ndata]
         else:
             return data[:ndata]
     if ndata >= 2 * len_:
@@ -55,7 +119,7 @@ def fix_data_number(data, ndata=15,
     if len(data) < ndata:
         # append some permuted original data
         if last_elements_randomized:
-            few_data = np.random.permutation(data[:len_])[:ndata-len(data)]
+            few_data = rng.permutation(data[:len_])[:ndata-len(data)]
         else:
             few_data = data[:ndata-len(data)]
         data = np.hstack([data, few_data])
@@ -115,6 +179,7 @@ def sp1(data, maxvalue=np.Inf, issuccessful=None):
     else:
         return (np.mean(dat) / succ, succ, len(dat))
 
+@profiling.profiled('aRT computation')
 def sp(data, maxvalue=np.Inf, issuccessful=None, allowinf=True):
     """sp(data, issuccessful=None) computes the sum of the function
     evaluations over all runs divided by the number of success,
@@ -176,7 +241,8 @@ def sp(data, maxvalue=np.Inf, issuccessful=None, allowinf=True):
 
     return (res, succ, len(succdat))
 
-def drawSP_from_dataset(data_set, ftarget, percentiles, samplesize=genericsettings.simulated_runlength_bootstrap_sample_size):
+def drawSP_from_dataset(data_set, ftarget, percentiles, samplesize=genericsettings.simulated_runlength_bootstrap_sample_size,
+                        rng=None):
     """returns ``(percentiles, all_sampled_values_sorted)`` of simulated 
     runlengths to reach ``ftarget`` based on a ``DataSet`` class instance, 
     specifically:: 
@@ -187,6 +253,9 @@ def drawSP_from_dataset(data_set, ftarget, percentiles, samplesize=genericsettin
     
     The expected value of ``all_sampled_values_sorted`` is the average 
     runtime aRT, as obtained by ``data_set.detERT([ftarget])[0]``. 
+
+    By default, `rng` is the `task_random_state` of ``(data_set.algId,
+    data_set.funcId, data_set.dim, ftarget)``.
     
     """
     try:
@@ -194,8 +263,12 @@ def drawSP_from_dataset(data_set, ftarget, percentiles, samplesize=genericsettin
     except AttributeError:
         print('drawSP_from_dataset expects a DataSet instance as first input, was: ' + str(type(data_set)))
         raise 
+    if rng is None:
+        rng = task_random_state(data_set.algId, data_set.funcId,
+                                data_set.dim, ftarget)
     nanidx = np.isnan(evals)
-    return drawSP(evals[~nanidx], data_set.maxevals[nanidx], percentiles, samplesize)
+    return drawSP(evals[~nanidx], data_set.maxevals[nanidx], percentiles, samplesize,
+                  rng=rng)
 
 def drawSP_from_dataset_new(data_set, ftarget, dummy,
                             samplesize=genericsettings.simulated_runlength_bootstrap_sample_size):
@@ -209,7 +282,8 @@ def drawSP_from_dataset_new(data_set, ftarget, dummy,
     return (None, data_set.evals_with_restarts([ftarget], sample_size_per_runtime)())
 
 def drawSP(runlengths_succ, runlengths_unsucc, percentiles,
-           samplesize=genericsettings.simulated_runlength_bootstrap_sample_size):
+           samplesize=genericsettings.simulated_runlength_bootstrap_sample_size,
+           rng=None):
     """Returns the percentiles of the bootstrapped distribution of
     'simulated' running lengths of successful runs.
 
@@ -217,6 +291,8 @@ def drawSP(runlengths_succ, runlengths_unsucc, percentiles,
       - *runlengths_succ* -- array of running lengths of successful runs
       - *runlengths_unsucc* -- array of running lengths of unsuccessful
                                runs
+      - *rng* -- random state, see `task_random_state`, by default the
+                 global `numpy.random` state
 
     Return:
        (percentiles, all_sampled_values_sorted)
@@ -227,6 +303,12 @@ def drawSP(runlengths_succ, runlengths_unsucc, percentiles,
        successful one is chosen. In case of no successful run an
        exception is raised.
 
+       The random indices are drawn in chunks. The returned values are
+       the same as when drawing the indices one by one, but usually
+       more random numbers are drawn. Hence the state of `rng` after
+       the call differs, and so do later draws from `rng` or from the
+       global `numpy.random` state.
+
     This implementation is depreciated and replaced by `simulated_evals`.
     The latter is also depreciated, see
     `DataSet.evals_with_simulated_restarts` instead.
@@ -237,6 +319,8 @@ def drawSP(runlengths_succ, runlengths_unsucc, percentiles,
     # TODO: for efficiency reasons a special treatment in the case, 
     #   where all runs are successful and all_sampled_values_sorted is not needed
 
+    if rng is None:
+        rng = np.random
     Nsucc = len(runlengths_succ)
     Nunsucc = len(runlengths_unsucc)
     
@@ -245,19 +329,19 @@ def drawSP(runlengths_succ, runlengths_unsucc, percentiles,
         # return (np.Inf*np.array(percentiles), )
         # TODO: the following line does not work because of the use of function sum which interface is different than that of sp or sp1
         return (draw(runlengths_unsucc, percentiles, samplesize=samplesize, 
-                     func=sum
+                     func=sum, rng=rng
                      # func=lambda x: [sum(x)]
                      ), sorted(runlengths_unsucc))
     # if Nunsucc == 0: # Special case: all success, how can we improve efficiency?
     #    return 
     if 11 < 3 and Nunsucc == 0:  # not tested yet: draw each once without replacement and repeat  
-        idx = np.random.shuffle(range(Nsucc))
+        idx = rng.shuffle(range(Nsucc))
         arrStats = [runlengths_succ[idx[i % Nsucc]] for i in range(int(samplesize))]
         arrStats.sort()  # could be avoided
         return (prctile(runlengths_succ, percentiles, issorted=False),
             arrStats)
     if 11 < 3 and Nunsucc == 0:  # not tested yet: bootstraps, but more efficient
-        arrStats = [runlengths_succ[np.random.randint(Nsucc)] 
+        arrStats = [runlengths_succ[rng.randint(Nsucc)] 
                       for i in range(int(samplesize))]
         arrStats.sort()  # could be avoided
         return (prctile(arrStats, percentiles, issorted=True), arrStats)
@@ -265,36 +349,44 @@ def drawSP(runlengths_succ, runlengths_unsucc, percentiles,
     # geometric distribution for number of unsuccessful runs
     # The samplesize depends on the number of unsuccessful runs?
 
-    arrStats = []
-    sdata = np.array(runlengths_succ)  # more efficient indexing
+    sdata = np.array(runlengths_succ, dtype=float)  # more efficient indexing
     sdata.sort()
-    udata = np.array(runlengths_unsucc)  # more efficient indexing
+    udata = np.array(runlengths_unsucc, dtype=float)  # more efficient indexing
     udata.sort()
     Nu = len(udata)
     Ns = len(sdata)
-    # data = np.r_[udata, sdata]
+    data = np.r_[udata, sdata]
     N = Ns + Nu
+    samplesize = int(samplesize)
 
-    for i in range(int(samplesize)):
-        # relying that idx<len(data)
-        sumdata = 0
-        idx = np.random.randint(N)
-        # set_trace()
-        while idx < Nu:
-            sumdata += udata[idx]
-            idx = np.random.randint(N)
-
-        sumdata += sdata[idx - Nu]
-
-        arrStats.append(sumdata)  # We know we have one success here.
-
-    arrStats.sort()
+    # draw all indices at once, a simulated run consists of indices
+    # < Nu (unsuccessful runs) ended by the first index >= Nu (a success),
+    # the used random numbers are the same as when drawn one by one, but
+    # the surplus of idx is drawn too and changes the state of rng
+    idx = rng.randint(N, size=samplesize * N // Ns + 1)
+    isucc = np.nonzero(idx >= Nu)[0]
+    while len(isucc) < samplesize:
+        more = rng.randint(N, size=(samplesize - len(isucc)) * N // Ns + 1)
+        isucc = np.r_[isucc, len(idx) + np.nonzero(more >= Nu)[0]]
+        idx = np.r_[idx, more]
+    isucc = isucc[:samplesize]
+    values = data[idx[:isucc[-1] + 1]] if samplesize else data[:0]
+    if len(values) == samplesize:  # no unsuccessful run was drawn
+        arrStats = values
+    else:  # sum up each run in the same order as in a loop
+        arrStats = np.zeros(samplesize)
+        iprev = np.r_[-1, isucc[:-1]]
+        for i in range(int(np.max(isucc - iprev))):
+            ivalues = iprev + 1 + i  # i-th value of each run
+            running = ivalues <= isucc
+            arrStats[running] += values[ivalues[running]]
+    arrStats = sorted(arrStats)
 
     return (prctile(arrStats, percentiles, issorted=True),
             arrStats)
 
 
-def randint_derandomized(low, high=None, size=None):
+def randint_derandomized(low, high=None, size=None, rng=None):
     """return a `numpy` array of derandomized random integers.
 
     The interface is the same as for `numpy.randint`, however the
@@ -303,7 +395,8 @@ def randint_derandomized(low, high=None, size=None):
     ``high-low``. (That is, by default a permutation is returned.)
 
     As for `numpy.randint`, the value range is [low, high-1] or [0, low-1]
-    if ``high is None``.
+    if ``high is None``. `rng` is the random state, by default the global
+    `numpy.random` state, see also `task_random_state`.
 
     >>> import numpy as np
     >>> from cocopp.toolsstats import randint_derandomized
@@ -318,17 +411,19 @@ def randint_derandomized(low, high=None, size=None):
         np.asarray(data)[randint_derandomized(0, len(data), ndata)]
 
     """
-    return np.asarray(list(_randint_derandomized_generator(low, high, size)))
+    return np.asarray(list(_randint_derandomized_generator(low, high, size, rng)))
 
-def _randint_derandomized_generator(low, high=None, size=None):
+def _randint_derandomized_generator(low, high=None, size=None, rng=None):
     """the generator for `randint_derandomized`"""
+    if rng is None:
+        rng = np.random
     if high is None:
         low, high = 0, low
     if size is None:
         size = high
     delivered = 0
     while delivered < size:
-        for randi in np.random.permutation(high - low):
+        for randi in rng.permutation(high - low):
             delivered += 1
             yield low + randi
             if delivered >= size:
@@ -336,7 +431,7 @@ def _randint_derandomized_generator(low, high=None, size=None):
 
 def simulated_evals(evals, nfails,
             samplesize=genericsettings.simulated_runlength_bootstrap_sample_size,
-            randint=randint_derandomized):
+            randint=randint_derandomized, rng=None):
     """Obsolete: see `DataSet.evals_with_simulated_restarts` instead.
 
     Return `samplesize` "simulated" run lengths (#evaluations), sorted.
@@ -346,6 +441,8 @@ def simulated_evals(evals, nfails,
       - *nfail* -- only the last `nfail` evaluations come from
                     unsuccessful runs
       - *randint* -- random integer index function of the first simulated run
+      - *rng* -- random state for the restarts, by default the global
+                 `numpy.random` state
 
     Return:
        all_sampled_runlengths_sorted
@@ -379,6 +476,8 @@ def simulated_evals(evals, nfails,
     runlengths are undefined from these data. A reasonable lower bound
     for a single measurement from these data is %d""" %
                          int(sum(evals)))
+    if rng is None:
+        rng = np.random
     samplesize = int(samplesize)
     evals = np.asarray(evals)
     evals.sort()
@@ -390,7 +489,7 @@ def simulated_evals(evals, nfails,
     failing = np.where(indices >= len(evals) - nfails)[0]
     assert len(evals) - nfails > 0  # prevent infinite loop
     while len(failing):
-        indices = np.random.randint(0, len(evals), len(failing))
+        indices = rng.randint(0, len(evals), len(failing))
         sums[failing] += evals[indices]
         # keep failing indices
         failing = [failing[i] for i in range(len(failing))
@@ -398,7 +497,7 @@ def simulated_evals(evals, nfails,
     return sorted(sums)
 
 
-def draw(data, percentiles, samplesize=1e3, func=sp1, args=()):
+def draw(data, percentiles, samplesize=1e3, func=sp1, args=(), rng=None):
     """Generates the empirical bootstrap distribution from a sample.
 
     Input:
@@ -415,6 +514,8 @@ def draw(data, percentiles, samplesize=1e3, func=sp1, args=()):
       - *samplesize* -- number of bootstraps drawn, default is 1e3,
         for more reliable values choose rather 1e4. 
         performance is linear in samplesize, 0.2s for samplesize=1000.
+      - *rng* -- random state, see `task_random_state`, by default the
+        global `numpy.random` state
 
     Return:
         (prctiles, all_samplesize_bootstrapped_values_sorted)
@@ -431,6 +532,8 @@ def draw(data, percentiles, samplesize=1e3, func=sp1, args=()):
        unexpected results.
 
     """
+    if rng is None:
+        rng = np.random
     arrStats = []
     N = len(data)
     adata = np.array(data)  # more efficient indexing
@@ -444,7 +547,7 @@ def draw(data, percentiles, samplesize=1e3, func=sp1, args=()):
     if 1 < 3:
         for i in range(int(samplesize)):
             # relying that idx<len(data)
-            idx = np.random.randint(N, size=N)
+            idx = rng.randint(N, size=N)
 
             # This part is specialized to conform with sp1 and sp.
             if len(args) > 1:
@@ -454,7 +557,7 @@ def draw(data, percentiles, samplesize=1e3, func=sp1, args=()):
 
             # arrStats = [data[i] for i in idx]  # efficient up to 50 data
     else:  # not more efficient
-        arrIdx = np.random.randint(N, size=N * samplesize)
+        arrIdx = rng.randint(N, size=N * samplesize)
         arrIdx.resize(samplesize, N)
         arrStats = [func(adata[np.r_[idx]], *args) for idx in arrIdx]
 
@@ -514,8 +617,83 @@ def prctile(x, arrprctiles, issorted=False, ignore_nan=True):
             res += [(ihigh - i) * x[ilow] + (i - ilow) * x[ihigh]]
     return res
 
-def randint(upper, n):
-    res = np.floor(upper * np.random.rand(n))
+def prctile_array(x, arrprctiles, issorted=False, ignore_nan=True, axis=-1):
+    """Computes percentiles along `axis` of `x` at once, like `prctile`
+    computes them for a single sequence.
+
+    :param x: array-like of data values or a list of sequences of
+        possibly different length, which are treated as rows.
+    :param arrprctiles: scalar or sequence of percentiles to be
+        calculated for each row.
+    :param issorted: indicate if the data are sorted along `axis`.
+    :param ignore_nan: disregard `np.nan` and ``None`` entries,
+        otherwise they are sorted to the end.
+    :param axis: axis of `x` along which the percentiles are computed.
+    :Return: array of shape ``x.shape`` without `axis` plus an additional
+        last dimension of length ``len(arrprctiles)``. The percentiles
+        of rows without any (non-NaN) data are `np.nan`.
+
+    The result for each row is the same as from `prctile`.
+
+    >>> import numpy as np
+    >>> from cocopp.toolsstats import prctile, prctile_array
+    >>> data = [[3, 1, np.nan, 2], [np.inf, 2, 10, 1], [np.nan, np.nan]]
+    >>> res = prctile_array(data, [0, 25, 50, 75, 100])
+    >>> res.shape
+    (3, 5)
+    >>> for row, line in zip(data, res):
+    ...     assert np.allclose(prctile(row, [0, 25, 50, 75, 100]), line,
+    ...                        equal_nan=True), (row, line)
+    >>> assert np.all(np.isnan(res[2]))
+    >>> prctile_array(np.arange(12).reshape(3, 4), 50, axis=0).tolist()
+    [[4.0], [5.0], [6.0], [7.0]]
+
+    """
+    if not getattr(arrprctiles, '__iter__', False):  # is not iterable
+        arrprctiles = (arrprctiles,)
+    arrprctiles = np.asarray(arrprctiles, dtype=float)
+    if (isinstance(x, np.ndarray) or not len(x) or not _has_len(x[0])
+            or len(set(map(len, x))) == 1):
+        x = np.array(x, dtype=float)  # makes a copy which is sorted below
+        x = np.moveaxis(x, axis, -1) if x.ndim > 1 else x[np.newaxis, :]
+        lengths = np.zeros(x.shape[:-1], dtype=int) + x.shape[-1]
+    else:  # rows of different length, pad with nan
+        lengths = np.array([len(row) for row in x], dtype=int)
+        padded = np.nan * np.ones((len(x), max(lengths)))
+        for i, row in enumerate(x):
+            padded[i, :lengths[i]] = np.asarray(row, dtype=float)
+        x = padded
+    outshape = x.shape[:-1]
+    if x.shape[-1] == 0:
+        return np.nan * np.ones(outshape + (len(arrprctiles),))
+    x = x.reshape(-1, x.shape[-1])
+    lengths = lengths.reshape(-1)
+    if not issorted or ignore_nan:
+        x.sort(axis=-1)  # moves nan to the end
+    N = (np.sum(~np.isnan(x), axis=-1) if ignore_nan else lengths)[:, np.newaxis]
+
+    i = -0.5 + (arrprctiles / 100.)[np.newaxis, :] * N
+    ilow = np.floor(i)
+    ihigh = np.ceil(i)
+    rows = np.arange(x.shape[0])[:, np.newaxis]
+    last = np.maximum(N - 1, 0)
+    xlow = x[rows, np.clip(ilow, 0, last).astype(int)]
+    xhigh = x[rows, np.clip(ihigh, 0, last).astype(int)]
+    with np.errstate(invalid='ignore'):
+        res = (ihigh - i) * xlow + (i - ilow) * xhigh
+    # the conditions are assigned in reverse order of precedence
+    res = np.where(np.isinf(xlow) & (i - ilow < 0.5), xlow, res)
+    res = np.where(np.isinf(xhigh) & (ihigh - i <= 0.5), xhigh, res)
+    res = np.where(ilow == ihigh, xlow, res)
+    res = np.where(i >= N - 1, x[rows, last], res)
+    res = np.where(i <= 0, x[:, :1], res)
+    res = np.where(N == 0, np.nan, res)
+    return res.reshape(outshape + (len(arrprctiles),))
+
+def randint(upper, n, rng=None):
+    if rng is None:
+        rng = np.random
+    res = np.floor(upper * rng.rand(n))
     if any(res >= upper):
         raise Exception('np.random.rand returned 1')
     return res